@@ -29,10 +29,12 @@ application = ProtocolTypeRouter({
     ),
 })
 
-from users.tasks import cleanup_offline_users
+from users.tasks import cleanup_offline_users, flush_last_seen
 
 def start_cleanup_loop():
     while True:
+        # Ghi last_seen từ Redis xuống DB trước khi xét user nào đã offline
+        flush_last_seen()
         cleanup_offline_users()
         time.sleep(10)
 
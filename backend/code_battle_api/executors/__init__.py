@@ -0,0 +1,25 @@
+from django.conf import settings
+
+from .base import BaseExecutor
+
+JUDGE_EXECUTOR = getattr(settings, "JUDGE_EXECUTOR", "judge0")
+
+_executor = None
+
+
+def get_executor():
+    """Backend chạy code được chọn bằng settings.JUDGE_EXECUTOR ("judge0" | "local")."""
+    global _executor
+    if _executor is None:
+        if JUDGE_EXECUTOR == "local":
+            from .local import LocalExecutor
+            _executor = LocalExecutor()
+        elif JUDGE_EXECUTOR == "judge0":
+            from .judge0 import Judge0Executor
+            _executor = Judge0Executor()
+        else:
+            raise ValueError(f"Unknown JUDGE_EXECUTOR '{JUDGE_EXECUTOR}'")
+    return _executor
+
+
+__all__ = ("BaseExecutor", "get_executor")
@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+
+
+class BaseExecutor:
+    """
+    Interface chung cho backend chạy code.
+
+    Mọi backend trả về result dict cùng format với Judge0:
+        {
+            "status": {"id": 3, "description": "Accepted"},
+            "stdout": "...", "stderr": "...", "compile_output": "...",
+            "time": "0.012",   # giây
+            "memory": 1024,    # KB
+        }
+    time_limit tính bằng ms, memory_limit tính bằng MB (giống Problem).
+    """
+
+    name = None
+
+    @contextmanager
+    def prepare(self, source_code, language):
+        """
+        Build chương trình một lần cho cả submission.
+        Yield result lỗi (Compilation Error...) nếu không build được, None nếu sẵn sàng;
+        các lần run / run_batch bên trong block dùng lại artifact đã build.
+        Mặc định không làm gì (backend tự build ở mỗi lần chạy).
+        """
+        yield None
+
+    def run(self, source_code, language, input_data, expected_output=None,
+            time_limit=None, memory_limit=None):
+        raise NotImplementedError
+
+    def run_batch(self, source_code, language, cases, time_limit=None, memory_limit=None):
+        """`cases` là list dict {"input_data", "expected_output"}; kết quả giữ đúng thứ tự."""
+        return [
+            self.run(
+                source_code, language, case["input_data"], case.get("expected_output"),
+                time_limit=time_limit, memory_limit=memory_limit,
+            )
+            for case in cases
+        ]
@@ -0,0 +1,19 @@
+from code_battle_api.judge0_service import run_code_with_judge0, run_batch_with_judge0
+
+from .base import BaseExecutor
+
+
+class Judge0Executor(BaseExecutor):
+    """
+    Chạy code trên Judge0 (JUDGE0_URLS, phân tải giữa các node).
+    Judge0 dùng limit mặc định của server nên time_limit / memory_limit được bỏ qua.
+    """
+
+    name = "judge0"
+
+    def run(self, source_code, language, input_data, expected_output=None,
+            time_limit=None, memory_limit=None):
+        return run_code_with_judge0(source_code, language, input_data, expected_output)
+
+    def run_batch(self, source_code, language, cases, time_limit=None, memory_limit=None):
+        return run_batch_with_judge0(source_code, language, cases)
@@ -0,0 +1,506 @@
+"""
+Backend chạy code ngay trên máy worker bằng subprocess + rlimit.
+
+Chương trình được build một lần cho mỗi source (artifact cache theo hash của source),
+dùng lại cho mọi test và xóa khi không còn ai dùng.
+Mỗi lần chạy dùng một thư mục tạm riêng, một session process riêng và các giới hạn:
+CPU time, address space (memory), số process, kích thước file / output.
+Giới hạn được đặt bởi một launcher Python nhỏ (LAUNCHER) ngay trước khi exec.
+
+RLIMIT_NPROC được kernel tính theo UID (mọi process / thread của user, kể cả worker
+và các lần chạy song song), không theo từng chương trình. Image Docker chạy mọi thứ
+bằng user `app` nên giới hạn này chỉ chặn fork bomb một cách gần đúng; JVM / node
+tự tạo nhiều thread nên không áp NPROC (limit_processes = False).
+LOCAL_EXECUTOR_MAX_PROCESSES = 0 để tắt hẳn.
+Đây là sandbox mức process: không cô lập network hay filesystem như Judge0 (isolate).
+Chạy bằng UID của worker thì chương trình đọc được .env, /proc/<pid>/environ của
+worker (SECRET_KEY, mật khẩu DB...) và in ra output, nên LocalExecutor chỉ khởi tạo
+khi DEBUG, khi LOCAL_EXECUTOR_ALLOW_UNTRUSTED = True (dev / benchmark), hoặc khi có
+LOCAL_EXECUTOR_USER: launcher (worker chạy bằng root) chuyển sang UID riêng đó
+ngay trước khi exec, NPROC khi đó cũng chỉ đếm process của user sandbox.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import pwd
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from code_battle_api import metrics
+from code_battle_api.judge0_service import LANGUAGES, resolve_language_id
+
+from .base import BaseExecutor
+
+logger = logging.getLogger(__name__)
+
+LOCAL_EXECUTOR_WORKERS = getattr(settings, "LOCAL_EXECUTOR_WORKERS", os.cpu_count() or 1)
+LOCAL_EXECUTOR_MAX_OUTPUT = getattr(settings, "LOCAL_EXECUTOR_MAX_OUTPUT", 16 * 1024 * 1024)
+LOCAL_EXECUTOR_MAX_PROCESSES = getattr(settings, "LOCAL_EXECUTOR_MAX_PROCESSES", 64)
+LOCAL_EXECUTOR_COMPILE_TIMEOUT = getattr(settings, "LOCAL_EXECUTOR_COMPILE_TIMEOUT", 30)
+LOCAL_EXECUTOR_USER = getattr(settings, "LOCAL_EXECUTOR_USER", "")
+LOCAL_EXECUTOR_ALLOW_UNTRUSTED = getattr(settings, "LOCAL_EXECUTOR_ALLOW_UNTRUSTED", False)
+
+DEFAULT_TIME_LIMIT = 5000     # ms
+DEFAULT_MEMORY_LIMIT = 256    # MB
+MAX_COMPILE_OUTPUT = 64 * 1024
+
+STATUSES = {
+    3: "Accepted",
+    4: "Wrong Answer",
+    5: "Time Limit Exceeded",
+    6: "Compilation Error",
+    7: "Runtime Error (SIGSEGV)",
+    8: "Runtime Error (SIGXFSZ)",
+    9: "Runtime Error (SIGFPE)",
+    10: "Runtime Error (SIGABRT)",
+    11: "Runtime Error (NZEC)",
+    12: "Runtime Error (Other)",
+    13: "Internal Error",
+    # Không có trong Judge0 (Judge0 báo Runtime Error); ngoài Accepted nên đi theo nhánh sai
+    15: "Memory Limit Exceeded",
+}
+
+MEMORY_LIMIT_EXCEEDED = 15
+
+# Dấu hiệu chương trình chết vì hết bộ nhớ (cấp phát thất bại do RLIMIT_AS / -Xmx / heap của node)
+MEMORY_ERRORS = (
+    b"MemoryError",
+    b"std::bad_alloc",
+    b"java.lang.OutOfMemoryError",
+    b"JavaScript heap out of memory",
+)
+
+SIGNAL_STATUS = {
+    signal.SIGSEGV: 7,
+    signal.SIGXFSZ: 8,
+    signal.SIGFPE: 9,
+    signal.SIGABRT: 10,
+}
+
+# Lệnh build / run theo "key" trong config/languages.json.
+# Build chạy trong thư mục artifact; "{artifact}" là đường dẫn thư mục đó.
+# "{memory}" được thay bằng memory limit (MB) cho các runtime tự quản lý heap;
+# các runtime này không chịu được RLIMIT_AS nên tắt limit_address_space, và tạo
+# nhiều thread (bị RLIMIT_NPROC đếm theo UID) nên tắt limit_processes.
+LANGUAGE_COMMANDS = {
+    "c": {
+        "source": "main.c",
+        "compile": ["gcc", "-O2", "-std=c11", "-o", "main", "main.c", "-lm"],
+        "run": ["{artifact}/main"],
+    },
+    "cpp": {
+        "source": "main.cpp",
+        "compile": ["g++", "-O2", "-std=c++17", "-o", "main", "main.cpp"],
+        "run": ["{artifact}/main"],
+    },
+    "java": {
+        "source": "Main.java",
+        "compile": ["javac", "-encoding", "UTF-8", "Main.java"],
+        "run": ["java", "-Xmx{memory}m", "-Xss64m", "-cp", "{artifact}", "Main"],
+        "limit_address_space": False,
+        "limit_processes": False,
+    },
+    "python": {
+        "source": "main.py",
+        "run": ["python3", "{artifact}/main.py"],
+    },
+    "javascript": {
+        "source": "main.js",
+        "run": ["node", "--max-old-space-size={memory}", "{artifact}/main.js"],
+        "limit_address_space": False,
+        "limit_processes": False,
+    },
+}
+
+LANGUAGE_KEYS = {lang["id"]: lang["key"] for lang in LANGUAGES}
+
+
+def _result(status_id, stdout="", stderr="", compile_output="", cpu_time=0.0, memory=0, message=None):
+    return {
+        "status": {"id": status_id, "description": STATUSES[status_id]},
+        "stdout": stdout,
+        "stderr": stderr,
+        "compile_output": compile_output,
+        "message": message,
+        "time": f"{cpu_time:.3f}",
+        "memory": memory,
+    }
+
+
+# Process trung gian: đặt rlimit (và đổi sang UID sandbox nếu có) rồi exec chương
+# trình, chờ bằng wait4 và ghi (wait status, CPU time, max RSS) ra pipe report. Nhờ vậy:
+#   - worker (nhiều thread) không phải dùng preexec_fn sau fork,
+#   - max RSS đo được là của chương trình, không lẫn RSS của worker Django.
+LAUNCHER = r"""
+import json, os, resource, shutil, sys
+report_fd, limits, credentials, cmd = int(sys.argv[1]), json.loads(sys.argv[2]), json.loads(sys.argv[3]), sys.argv[4:]
+# Tìm chương trình trước khi đổi UID (sau đó có thể không đọc được thư viện của interpreter)
+program = shutil.which(cmd[0]) or cmd[0]
+pid = os.fork()
+if pid == 0:
+    try:
+        for name, value in limits:
+            resource.setrlimit(getattr(resource, name), (value, value))
+        os.close(report_fd)
+        if credentials:
+            os.setgroups([])
+            os.setgid(credentials[1])
+            os.setuid(credentials[0])
+        os.execv(program, cmd)
+    finally:
+        os._exit(127)
+_, status, usage = os.wait4(pid, 0)
+os.write(report_fd, json.dumps([status, usage.ru_utime + usage.ru_stime, usage.ru_maxrss]).encode())
+"""
+
+
+def _sandbox_credentials():
+    """(uid, gid) của LOCAL_EXECUTOR_USER, None nếu không cấu hình."""
+    if not LOCAL_EXECUTOR_USER:
+        return None
+    try:
+        entry = pwd.getpwnam(LOCAL_EXECUTOR_USER)
+    except KeyError:
+        raise ImproperlyConfigured(f"LOCAL_EXECUTOR_USER '{LOCAL_EXECUTOR_USER}' does not exist")
+    if entry.pw_uid == os.geteuid():
+        raise ImproperlyConfigured("LOCAL_EXECUTOR_USER must differ from the user running the worker")
+    if os.geteuid() != 0:
+        raise ImproperlyConfigured("LOCAL_EXECUTOR_USER requires the worker to run as root")
+    return entry.pw_uid, entry.pw_gid
+
+
+def _clamp(name, value):
+    _, hard = resource.getrlimit(getattr(resource, name))
+    if hard == resource.RLIM_INFINITY:
+        return value
+    return min(value, hard)
+
+
+def _make_limits(cpu_seconds=None, memory_bytes=None, limit_processes=True):
+    limits = [
+        ("RLIMIT_CORE", 0),
+        ("RLIMIT_FSIZE", _clamp("RLIMIT_FSIZE", LOCAL_EXECUTOR_MAX_OUTPUT)),
+    ]
+    if limit_processes and LOCAL_EXECUTOR_MAX_PROCESSES > 0:
+        limits.append(("RLIMIT_NPROC", _clamp("RLIMIT_NPROC", LOCAL_EXECUTOR_MAX_PROCESSES)))
+    if cpu_seconds:
+        limits.append(("RLIMIT_CPU", _clamp("RLIMIT_CPU", cpu_seconds)))
+    if memory_bytes:
+        limits.append(("RLIMIT_AS", _clamp("RLIMIT_AS", memory_bytes)))
+    return limits
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _read_limited(pipe, limit, chunks, overflow, pid):
+    size = 0
+    while True:
+        data = pipe.read1(65536)
+        if not data:
+            break
+        size += len(data)
+        if size > limit:
+            overflow.set()
+            _kill_group(pid)
+            break
+        chunks.append(data)
+    pipe.close()
+
+
+def _write_stdin(pipe, data):
+    try:
+        pipe.write(data)
+    except (BrokenPipeError, OSError):
+        pass
+    finally:
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+
+def _spawn(cmd, cwd, stdin_data, wall_timeout, output_limit, limits, credentials=None):
+    """
+    Chạy `cmd` qua LAUNCHER với các rlimit đã cho, bằng (uid, gid) `credentials` nếu có.
+    Trả về (report, stdout, stderr, timed_out, output_exceeded);
+    report là [wait status, cpu time, max RSS KB] hoặc None nếu launcher bị kill.
+    """
+    env = {"PATH": os.environ.get("PATH", "/usr/bin:/bin"), "LANG": "C.UTF-8", "HOME": cwd}
+    report_read, report_write = os.pipe()
+    try:
+        proc = subprocess.Popen(
+            [
+                sys.executable, "-S", "-E", "-c", LAUNCHER,
+                str(report_write), json.dumps(limits), json.dumps(credentials), *cmd,
+            ],
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=(report_write,),
+            start_new_session=True,
+        )
+    finally:
+        os.close(report_write)
+
+    stdout_chunks, stderr_chunks = [], []
+    overflow = threading.Event()
+    timed_out = threading.Event()
+
+    def on_timeout():
+        timed_out.set()
+        _kill_group(proc.pid)
+
+    threads = [
+        threading.Thread(target=_write_stdin, args=(proc.stdin, stdin_data)),
+        threading.Thread(target=_read_limited,
+                         args=(proc.stdout, output_limit, stdout_chunks, overflow, proc.pid)),
+        threading.Thread(target=_read_limited,
+                         args=(proc.stderr, output_limit, stderr_chunks, overflow, proc.pid)),
+    ]
+    for t in threads:
+        t.start()
+
+    timer = threading.Timer(wall_timeout, on_timeout)
+    timer.start()
+    try:
+        with os.fdopen(report_read, "rb") as f:
+            raw = f.read()
+        proc.wait()
+    finally:
+        timer.cancel()
+        # Dọn các process con còn sót lại trong session
+        _kill_group(proc.pid)
+
+    for t in threads:
+        t.join()
+
+    return (
+        json.loads(raw) if raw else None,
+        b"".join(stdout_chunks),
+        b"".join(stderr_chunks),
+        timed_out.is_set(),
+        overflow.is_set(),
+    )
+
+
+def _decode(data):
+    return data.decode("utf-8", errors="replace")
+
+
+class _Artifact:
+    """Thư mục chứa source + bản build, dùng chung bởi mọi lần chạy cùng source."""
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+        self.refs = 0
+        self.error = None
+        self.ready = threading.Event()
+
+
+class LocalExecutor(BaseExecutor):
+    name = "local"
+
+    def __init__(self):
+        self.credentials = _sandbox_credentials()
+        if self.credentials is None and not (settings.DEBUG or LOCAL_EXECUTOR_ALLOW_UNTRUSTED):
+            raise ImproperlyConfigured(
+                "JUDGE_EXECUTOR=local runs untrusted code as the worker user; set LOCAL_EXECUTOR_USER "
+                "to a dedicated sandbox user, or LOCAL_EXECUTOR_ALLOW_UNTRUSTED=True for dev / benchmarks"
+            )
+        self.pool = ThreadPoolExecutor(max_workers=LOCAL_EXECUTOR_WORKERS)
+        self.artifacts = {}
+        self.lock = threading.Lock()
+
+    # ------------------------------
+    # Helpers
+    # ------------------------------
+    def _spec(self, language):
+        key = LANGUAGE_KEYS.get(resolve_language_id(language))
+        return LANGUAGE_COMMANDS.get(key)
+
+    def _give(self, path):
+        """Cho user sandbox quyền ghi thư mục `path` (không làm gì nếu chạy bằng UID của worker)."""
+        if self.credentials:
+            os.chown(path, *self.credentials)
+
+    def _seal(self, path):
+        """Sau khi build: lấy lại quyền sở hữu artifact, user sandbox chỉ còn đọc / chạy."""
+        if not self.credentials:
+            return
+        os.chmod(path, 0o755)
+        for root, dirs, files in os.walk(path):
+            for name in [root, *(os.path.join(root, entry) for entry in dirs + files)]:
+                os.lchown(name, os.geteuid(), os.getegid())
+
+    def _compile(self, spec, workdir):
+        """Trả về result Compilation Error nếu build lỗi, None nếu build thành công."""
+        report, stdout, stderr, timed_out, _ = _spawn(
+            spec["compile"], workdir, b"", LOCAL_EXECUTOR_COMPILE_TIMEOUT,
+            MAX_COMPILE_OUTPUT, _make_limits(), self.credentials,
+        )
+        if timed_out or report is None:
+            return _result(6, compile_output="Compilation timed out")
+        if os.waitstatus_to_exitcode(report[0]) != 0:
+            return _result(6, compile_output=_decode(stdout + stderr))
+        return None
+
+    def _acquire(self, spec, source_code):
+        """
+        Lấy artifact của source (build nếu chưa có). Các lần gọi đồng thời
+        cùng source chờ một lần build duy nhất. Phải gọi _release khi xong.
+        """
+        digest = hashlib.sha256(f"{spec['source']}\0{source_code}".encode("utf-8")).hexdigest()
+
+        with self.lock:
+            artifact = self.artifacts.get(digest)
+            is_builder = artifact is None
+            if is_builder:
+                artifact = self.artifacts[digest] = _Artifact(tempfile.mkdtemp(prefix="judge-build-"))
+            artifact.refs += 1
+
+        if not is_builder:
+            artifact.ready.wait()
+            return digest, artifact
+
+        try:
+            with open(os.path.join(artifact.workdir, spec["source"]), "w", encoding="utf-8") as f:
+                f.write(source_code)
+            if "compile" in spec:
+                metrics.incr("judge.local.compiles")
+                self._give(artifact.workdir)
+                artifact.error = self._compile(spec, artifact.workdir)
+            self._seal(artifact.workdir)
+        except OSError as e:
+            logger.error(f"❌ [LOCAL] Build failed: {e}", exc_info=True)
+            artifact.error = _result(13, message=str(e))
+        finally:
+            artifact.ready.set()
+
+        return digest, artifact
+
+    def _release(self, digest):
+        with self.lock:
+            artifact = self.artifacts[digest]
+            artifact.refs -= 1
+            if artifact.refs > 0:
+                return
+            del self.artifacts[digest]
+        shutil.rmtree(artifact.workdir, ignore_errors=True)
+
+    def _execute(self, spec, artifact_dir, workdir, input_data, expected_output,
+                 time_limit, memory_limit):
+        time_limit = time_limit or DEFAULT_TIME_LIMIT
+        memory_limit = memory_limit or DEFAULT_MEMORY_LIMIT
+
+        limit_seconds = time_limit / 1000
+        cmd = [part.format(memory=memory_limit, artifact=artifact_dir) for part in spec["run"]]
+        memory_bytes = memory_limit * 1024 * 1024 if spec.get("limit_address_space", True) else None
+        limits = _make_limits(
+            cpu_seconds=math.ceil(limit_seconds) + 1,
+            memory_bytes=memory_bytes,
+            limit_processes=spec.get("limit_processes", True),
+        )
+
+        report, stdout, stderr, timed_out, overflow = _spawn(
+            cmd, workdir, (input_data or "").encode("utf-8"),
+            limit_seconds * 3 + 1, LOCAL_EXECUTOR_MAX_OUTPUT, limits, self.credentials,
+        )
+
+        out_of_memory = any(marker in stderr for marker in MEMORY_ERRORS)
+        stdout, stderr = _decode(stdout), _decode(stderr)
+
+        if overflow:
+            return _result(12, stdout, stderr, message="Output Limit Exceeded")
+        if timed_out or report is None:
+            return _result(5, stdout, stderr, cpu_time=limit_seconds)
+
+        status, cpu_time, memory = report
+        stats = {"stdout": stdout, "stderr": stderr, "cpu_time": cpu_time, "memory": memory}
+
+        if cpu_time > limit_seconds or (
+            os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXCPU
+        ):
+            return _result(5, **stats)
+
+        exited_ok = os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+        if not exited_ok and (out_of_memory or memory >= memory_limit * 1024):
+            return _result(MEMORY_LIMIT_EXCEEDED, **stats)
+
+        if os.WIFSIGNALED(status):
+            return _result(SIGNAL_STATUS.get(os.WTERMSIG(status), 12), **stats)
+
+        if os.waitstatus_to_exitcode(status) != 0:
+            return _result(11, **stats)
+
+        if expected_output is not None and stdout.strip() != expected_output.strip():
+            return _result(4, **stats)
+
+        return _result(3, **stats)
+
+    # ------------------------------
+    # BaseExecutor
+    # ------------------------------
+    @contextmanager
+    def prepare(self, source_code, language):
+        spec = self._spec(language)
+        if spec is None:
+            yield None
+            return
+
+        digest, artifact = self._acquire(spec, source_code)
+        try:
+            yield artifact.error
+        finally:
+            self._release(digest)
+
+    def run(self, source_code, language, input_data, expected_output=None,
+            time_limit=None, memory_limit=None):
+        spec = self._spec(language)
+        if spec is None:
+            return _result(13, message=f"Language '{language}' is not supported by the local executor")
+
+        digest, artifact = self._acquire(spec, source_code)
+        try:
+            if artifact.error:
+                return artifact.error
+
+            with tempfile.TemporaryDirectory(prefix="judge-") as workdir:
+                self._give(workdir)
+                return self._execute(spec, artifact.workdir, workdir, input_data,
+                                     expected_output, time_limit, memory_limit)
+        except OSError as e:
+            logger.error(f"❌ [LOCAL] Execution failed: {e}", exc_info=True)
+            return _result(13, message=str(e))
+        finally:
+            self._release(digest)
+
+    def run_batch(self, source_code, language, cases, time_limit=None, memory_limit=None):
+        # Giữ artifact trong suốt batch để chỉ build một lần
+        with self.prepare(source_code, language):
+            futures = [
+                self.pool.submit(
+                    self.run, source_code, language, case["input_data"], case.get("expected_output"),
+                    time_limit, memory_limit,
+                )
+                for case in cases
+            ]
+            return [future.result() for future in futures]
@@ -0,0 +1,274 @@
+"""
+Fake Judge0 server chạy local để test judge mà không cần Judge0 thật.
+
+Hỗ trợ các endpoint mà judge0_service dùng:
+    POST /submissions[?wait=true]
+    GET  /submissions/<token>
+    POST /submissions/batch
+    GET  /submissions/batch?tokens=a,b,c
+    GET  /about
+    GET  /fake/stats          (số request đã nhận, để đo lượng HTTP call)
+
+Cách chạy:
+    python code_battle_api/fake_judge0.py --port 2358 --latency 0.3
+    JUDGE0_URL=http://localhost:2358
+
+Nhiều node (test cân bằng tải / circuit breaker): chạy thêm instance ở port khác,
+    JUDGE0_URLS=http://localhost:2358,http://localhost:2359
+
+Code Python (language_id 71) được chạy thật bằng interpreter hiện tại.
+Các ngôn ngữ khác ở chế độ "echo": stdout = expected_output.
+
+Submission có "callback_url" được chạy ngay trong background và result được
+PUT tới callback_url (giống Judge0 thật), để test JUDGE_MODE=callback.
+"""
+import argparse
+import base64
+import json
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PYTHON_LANGUAGE_ID = 71
+
+STATUSES = {
+    1: "In Queue",
+    3: "Accepted",
+    4: "Wrong Answer",
+    5: "Time Limit Exceeded",
+    11: "Runtime Error (NZEC)",
+}
+
+
+class FakeJudge0:
+    def __init__(self, latency=0.0, run_timeout=5.0):
+        self.latency = latency
+        self.run_timeout = run_timeout
+        self.submissions = {}
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    # ------------------------------
+    # Execution
+    # ------------------------------
+    def _execute(self, data):
+        source = data.get("source_code") or ""
+        stdin = data.get("stdin") or ""
+        expected = data.get("expected_output")
+
+        if data.get("language_id") != PYTHON_LANGUAGE_ID:
+            return 3, expected or "", "", 0.001
+
+        started = time.monotonic()
+        try:
+            proc = subprocess.run(
+                [sys.executable, "-c", source],
+                input=stdin,
+                capture_output=True,
+                text=True,
+                timeout=self.run_timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return 5, "", "", self.run_timeout
+
+        elapsed = round(time.monotonic() - started, 3)
+        if proc.returncode != 0:
+            return 11, proc.stdout, proc.stderr, elapsed
+
+        if expected is not None and proc.stdout.strip() != expected.strip():
+            return 4, proc.stdout, proc.stderr, elapsed
+        return 3, proc.stdout, proc.stderr, elapsed
+
+    def _finish(self, token):
+        with self.lock:
+            data = self.submissions[token]
+        status_id, stdout, stderr, elapsed = self._execute(data["request"])
+        with self.lock:
+            data["result"] = {
+                "token": token,
+                "status": {"id": status_id, "description": STATUSES[status_id]},
+                "stdout": stdout,
+                "stderr": stderr,
+                "compile_output": "",
+                "message": None,
+                "time": str(elapsed),
+                "memory": 1024,
+            }
+
+    def _callback(self, token, url, b64):
+        time.sleep(self.latency)
+        self._finish(token)
+        body = json.dumps(_encode_result(self.submissions[token]["result"], b64)).encode("utf-8")
+        request = urllib.request.Request(
+            url, data=body, method="PUT", headers={"Content-Type": "application/json"}
+        )
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+            self.stats["callbacks"] += 1
+        except OSError as e:
+            self.stats["callback_errors"] += 1
+            print(f"callback to {url} failed: {e}", file=sys.stderr)
+
+    def create(self, request, wait=False, b64=False):
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.submissions[token] = {
+                "request": request,
+                "ready_at": time.monotonic() + self.latency,
+                "result": None,
+            }
+
+        if request.get("callback_url"):
+            threading.Thread(
+                target=self._callback, args=(token, request["callback_url"], b64), daemon=True
+            ).start()
+
+        if wait:
+            time.sleep(self.latency)
+            self._finish(token)
+            return self.submissions[token]["result"]
+
+        return {"token": token}
+
+    def get(self, token):
+        with self.lock:
+            data = self.submissions.get(token)
+        if data is None:
+            return None
+
+        if data["result"] is None:
+            if time.monotonic() < data["ready_at"]:
+                return {"token": token, "status": {"id": 1, "description": STATUSES[1]}}
+            self._finish(token)
+
+        return data["result"]
+
+
+def _decode(value):
+    if value is None:
+        return None
+    return base64.b64decode(value).decode("utf-8")
+
+
+def _encode(value):
+    if value is None:
+        return None
+    return base64.b64encode(value.encode("utf-8")).decode("utf-8")
+
+
+def _encode_result(result, b64):
+    if not b64 or result is None or "stdout" not in result:
+        return result
+    result = dict(result)
+    for field in ("stdout", "stderr", "compile_output"):
+        result[field] = _encode(result.get(field))
+    return result
+
+
+def _route(method, path):
+    if path.startswith("/submissions/") and path != "/submissions/batch":
+        path = "/submissions/<token>"
+    return f"{method} {path}"
+
+
+def make_handler(judge):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, code, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _decode_request(self, data, b64):
+            if not b64:
+                return data
+            data = dict(data)
+            for field in ("source_code", "stdin", "expected_output"):
+                data[field] = _decode(data.get(field))
+            return data
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            b64 = query.get("base64_encoded", ["false"])[0] == "true"
+            judge.stats[_route("GET", url.path)] += 1
+            judge.stats["requests"] += 1
+
+            if url.path == "/about":
+                return self._send(200, {"version": "fake"})
+
+            if url.path == "/fake/stats":
+                return self._send(200, dict(judge.stats))
+
+            if url.path == "/submissions/batch":
+                tokens = query.get("tokens", [""])[0].split(",")
+                return self._send(200, {
+                    "submissions": [_encode_result(judge.get(t), b64) for t in tokens]
+                })
+
+            if url.path.startswith("/submissions/"):
+                result = judge.get(url.path.rsplit("/", 1)[-1])
+                if result is None:
+                    return self._send(404, {"error": "not found"})
+                return self._send(200, _encode_result(result, b64))
+
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            b64 = query.get("base64_encoded", ["false"])[0] == "true"
+            wait = query.get("wait", ["false"])[0] == "true"
+            judge.stats[_route("POST", url.path)] += 1
+            judge.stats["requests"] += 1
+
+            data = self._read_json()
+
+            if url.path == "/submissions/batch":
+                return self._send(201, [
+                    judge.create(self._decode_request(item, b64), b64=b64)
+                    for item in data.get("submissions", [])
+                ])
+
+            if url.path == "/submissions":
+                result = judge.create(self._decode_request(data, b64), wait=wait, b64=b64)
+                return self._send(201, _encode_result(result, b64))
+
+            self._send(404, {"error": "not found"})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Judge0 server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2358)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Số giây một submission ở trạng thái In Queue")
+    args = parser.parse_args()
+
+    judge = FakeJudge0(latency=args.latency)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(judge))
+    print(f"Fake Judge0 listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
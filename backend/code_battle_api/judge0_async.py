@@ -0,0 +1,132 @@
+"""
+Client Judge0 bất đồng bộ (aiohttp) cho judge worker asyncio.
+
+Một ClientSession keep-alive dùng chung cho các Judge0 node, số request đồng
+thời tới mỗi node bị chặn bởi semaphore (JUDGE0_ASYNC_HOST_CONCURRENCY).
+Node được chọn qua Judge0Pool của judge0_service (least outstanding requests,
+circuit breaker, health probe), lỗi kết nối thì thử lại một lần trên node khác.
+Payload và result dùng chung format với judge0_service (base64, cùng dict result).
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+
+import aiohttp
+from django.conf import settings
+
+from code_battle_api import judge0_service
+from code_battle_api.judge0_pool import Judge0Pool
+from code_battle_api.judge0_service import (
+    _build_headers,
+    _build_submission,
+    _decode_result,
+    _host_options,
+    resolve_language_id,
+)
+
+logger = logging.getLogger(__name__)
+
+JUDGE0_ASYNC_HOST_CONCURRENCY = getattr(settings, "JUDGE0_ASYNC_HOST_CONCURRENCY", 50)
+
+
+class AsyncJudge0Client:
+    """
+    Dùng trong một event loop:
+
+        async with AsyncJudge0Client() as client:
+            result = await client.run(source_code, "python", "1 2", "3")
+    """
+
+    def __init__(self, base_url=None, concurrency=None):
+        # Mặc định dùng chung pool (JUDGE0_URLS) với judge0_service
+        self.pool = Judge0Pool([base_url]) if base_url else judge0_service.pool
+        self.concurrency = concurrency or JUDGE0_ASYNC_HOST_CONCURRENCY
+        self.options = _host_options(self.pool.nodes[0].url)
+        self.semaphores = {}
+        self.session = None
+        # Counter trong process, worker định kỳ đẩy vào metrics (không gọi Redis trong event loop)
+        self.stats = Counter()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        self.semaphores = {node.url: asyncio.Semaphore(self.concurrency) for node in self.pool.nodes}
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency * len(self.pool.nodes),
+            limit_per_host=self.concurrency,
+            keepalive_timeout=30,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=_build_headers(),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=self.options["connect_timeout"],
+                sock_read=self.options["read_timeout"],
+            ),
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _post(self, node, submission):
+        ok = False
+        started = time.monotonic()
+        try:
+            async with self.semaphores[node.url]:
+                self.stats["judge0.http.requests"] += 1
+                started = time.monotonic()
+                async with self.session.post(
+                    f"{node.url}/submissions",
+                    params={"base64_encoded": "true", "wait": "true"},
+                    json=submission,
+                ) as response:
+                    ok = response.status < 500
+                    response.raise_for_status()
+                    return await response.json()
+        finally:
+            self.pool.release(node, ok, time.monotonic() - started)
+
+    async def _post_with_failover(self, submission):
+        node = self.pool.acquire()
+        try:
+            return await self._post(node, submission)
+        except aiohttp.ClientError as e:
+            # Chỉ gửi lại khi không kết nối được: 5xx / timeout đọc nghĩa là node có thể
+            # đã nhận job, POST lại sẽ chạy code hai lần
+            connect_failed = isinstance(e, aiohttp.ClientConnectorError)
+            backup = self.pool.acquire(exclude=[node]) if connect_failed else None
+            if backup is None:
+                raise
+            logger.warning(f"🔁 [JUDGE0] {node.url} failed ({e}), retrying on {backup.url}")
+            self.stats["judge0.failover"] += 1
+            return await self._post(backup, submission)
+
+    async def run(self, source_code, language, input_data, expected_output=None):
+        """Tương đương run_code_with_judge0 (wait=true) nhưng không block thread."""
+        language_id = resolve_language_id(language)
+        submission = _build_submission(source_code, language_id, input_data, expected_output)
+
+        try:
+            result = await self._post_with_failover(submission)
+
+            if "error" in result:
+                logger.error(f"❌ [JUDGE0] Error: {result['error']}")
+                return {"status": {"description": f"Judge0 Error: {result['error']}"}}
+
+            return _decode_result(result)
+
+        except asyncio.TimeoutError:
+            logger.error(f"⏱️ [JUDGE0] Timeout after {self.options['read_timeout']}s")
+            return {"status": {"description": "Time Limit Exceeded (Gateway Timeout)"}}
+
+        except aiohttp.ClientError as e:
+            logger.error(f"❌ [JUDGE0] Request failed: {e}")
+            return {"status": {"description": f"Error submitting to Judge0: {e}"}}
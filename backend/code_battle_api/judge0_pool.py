@@ -0,0 +1,212 @@
+"""
+Cân bằng tải giữa nhiều Judge0 node (JUDGE0_URLS).
+
+- Least outstanding requests: request mới đi tới node có ít request đang chờ
+  nhất trong process, hòa thì chọn node có latency trung bình thấp hơn.
+- Circuit breaker: node lỗi JUDGE0_BREAKER_THRESHOLD lần liên tiếp bị loại trong
+  JUDGE0_BREAKER_COOLDOWN giây. Hết cooldown node nhận lại request, lỗi tiếp thì bị loại tiếp.
+- Health probe: thread nền gọi probe (GET /about) mỗi JUDGE0_HEALTH_INTERVAL giây,
+  loại node hỏng trước khi request thật bị lỗi và đưa node hồi phục trở lại ngay.
+- Metrics theo node (và counter khác của đường request, xem count()) được gom
+  trong process (không gọi Redis trên đường request) và đẩy vào
+  code_battle_api.metrics mỗi chu kỳ probe:
+      judge0.node.<name>.requests / .errors / .latency.sum / .latency.count / .healthy
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from code_battle_api import metrics
+
+logger = logging.getLogger(__name__)
+
+JUDGE0_HEALTH_INTERVAL = getattr(settings, "JUDGE0_HEALTH_INTERVAL", 5)
+JUDGE0_BREAKER_THRESHOLD = getattr(settings, "JUDGE0_BREAKER_THRESHOLD", 3)
+JUDGE0_BREAKER_COOLDOWN = getattr(settings, "JUDGE0_BREAKER_COOLDOWN", 30)
+
+# Trọng số của request mới nhất trong latency trung bình (EWMA)
+LATENCY_ALPHA = 0.2
+
+
+class Judge0Node:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        # Tên dùng trong metric: "judge0-1:2358" -> "judge0-1_2358"
+        self.name = re.sub(r"[^A-Za-z0-9-]", "_", urlsplit(self.url).netloc or self.url)
+        self.outstanding = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.latency = 0.0
+
+    def available(self, now):
+        return self.open_until <= now
+
+    def __repr__(self):
+        return f"<Judge0Node {self.url}>"
+
+
+class Judge0Pool:
+    """
+    Mỗi request: node = pool.acquire() ... pool.release(node, ok, elapsed).
+    acquire / attach tăng số request đang chờ của node, release giảm lại.
+    """
+
+    def __init__(self, urls, probe=None):
+        self.nodes = [Judge0Node(url) for url in urls]
+        self.probe = probe
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.timings = defaultdict(lambda: [0.0, 0])
+        self.monitor = None
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Process con (Celery prefork) tự chạy thread probe và đếm request của riêng nó
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.timings.clear()
+        self.monitor = None
+        for node in self.nodes:
+            node.outstanding = 0
+
+    # ------------------------------
+    # Chọn node
+    # ------------------------------
+    def acquire(self, exclude=()):
+        """
+        Chọn node cho một request mới. Nếu mọi node đều đang bị loại thì vẫn trả về
+        node sắp hết cooldown nhất (còn hơn không chấm được); riêng khi có `exclude`
+        (retry / hedge sang node khác) thì trả về None.
+        """
+        self._ensure_monitor()
+        now = time.monotonic()
+
+        with self.lock:
+            candidates = [n for n in self.nodes if n not in exclude]
+            healthy = [n for n in candidates if n.available(now)]
+            if healthy:
+                node = min(healthy, key=lambda n: (n.outstanding, n.latency))
+            elif candidates and not exclude:
+                node = min(candidates, key=lambda n: n.open_until)
+            else:
+                return None
+            node.outstanding += 1
+        return node
+
+    def attach(self, node):
+        """Request tới đúng `node` (vd. poll batch trên node đã nhận batch đó)."""
+        with self.lock:
+            node.outstanding += 1
+        return node
+
+    def count(self, name, amount=1):
+        """Cộng counter trong process, đẩy vào metrics ở lần flush_metrics kế tiếp."""
+        with self.lock:
+            self.counters[name] += amount
+
+    def release(self, node, ok, elapsed):
+        with self.lock:
+            node.outstanding -= 1
+            self.counters[f"judge0.node.{node.name}.requests"] += 1
+
+            if ok:
+                node.failures = 0
+                node.latency = elapsed if not node.latency else (
+                    node.latency + LATENCY_ALPHA * (elapsed - node.latency)
+                )
+                timing = self.timings[node.name]
+                timing[0] += elapsed
+                timing[1] += 1
+                return
+
+            self.counters[f"judge0.node.{node.name}.errors"] += 1
+            node.failures += 1
+            if node.failures < JUDGE0_BREAKER_THRESHOLD:
+                return
+            node.open_until = time.monotonic() + JUDGE0_BREAKER_COOLDOWN
+            failures = node.failures
+
+        logger.warning(
+            f"🔌 [JUDGE0] {node.url} ejected for {JUDGE0_BREAKER_COOLDOWN}s "
+            f"after {failures} consecutive failures"
+        )
+
+    # ------------------------------
+    # Health probe + metrics
+    # ------------------------------
+    def _ensure_monitor(self):
+        if self.monitor is not None:
+            return
+        with self.lock:
+            if self.monitor is None:
+                self.monitor = threading.Thread(target=self._monitor_loop, name="judge0-health", daemon=True)
+                self.monitor.start()
+
+    def _monitor_loop(self):
+        while True:
+            time.sleep(JUDGE0_HEALTH_INTERVAL)
+            try:
+                # Một node thì không có chỗ để chuyển request, khỏi probe
+                if self.probe is not None and len(self.nodes) > 1:
+                    for node in self.nodes:
+                        self.check(node)
+                self.flush_metrics()
+            except Exception as e:
+                logger.warning(f"⚠️ [JUDGE0] Health monitor error: {e}")
+
+    def check(self, node):
+        try:
+            healthy = bool(self.probe(node))
+        except Exception as e:
+            logger.debug(f"Probe {node.url} failed: {e}")
+            healthy = False
+
+        now = time.monotonic()
+        with self.lock:
+            was_available = node.available(now)
+            if healthy:
+                node.failures = 0
+                node.open_until = 0.0
+            else:
+                node.failures = max(node.failures, JUDGE0_BREAKER_THRESHOLD)
+                node.open_until = now + JUDGE0_BREAKER_COOLDOWN
+
+        if healthy and not was_available:
+            logger.info(f"✅ [JUDGE0] {node.url} is healthy again")
+        elif not healthy and was_available:
+            logger.warning(f"🔌 [JUDGE0] {node.url} failed health probe, ejected")
+
+        metrics.gauge(f"judge0.node.{node.name}.healthy", int(healthy))
+        return healthy
+
+    def flush_metrics(self):
+        with self.lock:
+            counters, self.counters = self.counters, Counter()
+            timings = dict(self.timings)
+            self.timings.clear()
+
+        for name, value in counters.items():
+            metrics.incr(name, value)
+        for node_name, (total, count) in timings.items():
+            metrics.observe(f"judge0.node.{node_name}.latency", total, count)
+
+    def snapshot(self):
+        """Trạng thái các node trong process này."""
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {
+                    "url": node.url,
+                    "available": node.available(now),
+                    "outstanding": node.outstanding,
+                    "failures": node.failures,
+                    "latency": round(node.latency, 3),
+                }
+                for node in self.nodes
+            ]
@@ -1,7 +1,17 @@
 from django.conf import settings
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.retry import Retry
 import logging
 import base64
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from code_battle_api import metrics
+from code_battle_api.judge0_pool import Judge0Pool
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +19,7 @@ logger = logging.getLogger(__name__)
 # ⚙️ Cấu hình từ Django settings
 # ==================================
 JUDGE0_URL = settings.JUDGE0_URL
+JUDGE0_URLS = getattr(settings, "JUDGE0_URLS", None) or [JUDGE0_URL]
 JUDGE0_API_KEY = getattr(settings, "JUDGE0_API_KEY", None)
 
 # ==================================
@@ -20,6 +31,225 @@ LANGUAGES = load_languages_config()
 LANGUAGE_MAP = {lang["key"]: lang["id"] for lang in LANGUAGES}
 
 
+# ==================================
+# 🔌 HTTP connection pool (keep-alive)
+# ==================================
+JUDGE0_POOL_SIZE = getattr(settings, "JUDGE0_POOL_SIZE", 10)
+JUDGE0_RETRIES = getattr(settings, "JUDGE0_RETRIES", 2)
+JUDGE0_CONNECT_TIMEOUT = getattr(settings, "JUDGE0_CONNECT_TIMEOUT", 3.05)
+JUDGE0_READ_TIMEOUT = getattr(settings, "JUDGE0_READ_TIMEOUT", 30)
+# Override theo từng host: {"http://judge0:2358": {"pool_size": 20, "read_timeout": 60}}
+JUDGE0_HOST_OPTIONS = getattr(settings, "JUDGE0_HOST_OPTIONS", {})
+
+_sessions = {}
+_opened_connections = {}
+_sessions_lock = threading.Lock()
+
+
+def _reset_sessions():
+    # Socket không được dùng chung giữa các process sau khi fork (Celery prefork)
+    global _sessions_lock, _hedge_executor
+    _sessions.clear()
+    _opened_connections.clear()
+    _sessions_lock = threading.Lock()
+    _hedge_executor = None
+
+
+os.register_at_fork(after_in_child=_reset_sessions)
+
+
+def _host_options(base_url):
+    options = {
+        "pool_size": JUDGE0_POOL_SIZE,
+        "retries": JUDGE0_RETRIES,
+        "connect_timeout": JUDGE0_CONNECT_TIMEOUT,
+        "read_timeout": JUDGE0_READ_TIMEOUT,
+    }
+    options.update(JUDGE0_HOST_OPTIONS.get(base_url, {}))
+    return options
+
+
+def _get_session(base_url):
+    """Session keep-alive dùng chung cho mọi request tới một Judge0 host trong process."""
+    session = _sessions.get(base_url)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        if base_url not in _sessions:
+            options = _host_options(base_url)
+            # POST /submissions(/batch) không idempotent: 5xx từ proxy có thể đến sau khi
+            # Judge0 đã nhận job, retry sẽ chạy code hai lần. POST chỉ được retry khi lỗi
+            # kết nối (request chưa tới server); retry theo status chỉ áp dụng cho GET (poll).
+            retry = Retry(
+                total=options["retries"],
+                connect=options["retries"],
+                read=0,
+                status=options["retries"],
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({"GET"}),
+                backoff_factor=0.2,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=options["pool_size"],
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(_build_headers())
+            _sessions[base_url] = session
+            _opened_connections[base_url] = 0
+    return _sessions[base_url]
+
+
+def _count_connections(session):
+    pools = session.get_adapter("http://").poolmanager.pools
+    return sum(pools[key].num_connections for key in list(pools.keys()))
+
+
+def _request(method, node, path, **kwargs):
+    """
+    Gửi request tới `node` (đã acquire / attach từ pool) qua connection pool của host,
+    báo kết quả cho pool (latency, circuit breaker) và cập nhật counter
+    judge0.http.requests / judge0.http.connections_opened (gom trong process).
+    """
+    session = _get_session(node.url)
+    options = _host_options(node.url)
+    kwargs.setdefault("timeout", (options["connect_timeout"], options["read_timeout"]))
+
+    ok = False
+    started = time.monotonic()
+    try:
+        response = session.request(method, f"{node.url}{path}", **kwargs)
+        ok = response.status_code < 500
+        return response
+    finally:
+        pool.release(node, ok, time.monotonic() - started)
+
+        with _sessions_lock:
+            opened = _count_connections(session)
+            new_connections = opened - _opened_connections.get(node.url, 0)
+            _opened_connections[node.url] = opened
+
+        # Gom trong process, pool đẩy vào Redis mỗi chu kỳ health monitor
+        pool.count("judge0.http.requests")
+        if new_connections > 0:
+            pool.count("judge0.http.connections_opened", new_connections)
+
+
+def get_http_stats():
+    """Số connection TCP đã mở trong process này, theo từng Judge0 host."""
+    return dict(_opened_connections)
+
+
+# ==================================
+# ⚖️ Nhiều Judge0 node (JUDGE0_URLS)
+# ==================================
+JUDGE0_HEALTH_TIMEOUT = getattr(settings, "JUDGE0_HEALTH_TIMEOUT", 2)
+# Chưa có kết quả sau JUDGE0_HEDGE_DELAY giây thì gửi thêm một bản tới node khác (0 = tắt)
+JUDGE0_HEDGE_DELAY = getattr(settings, "JUDGE0_HEDGE_DELAY", 0)
+
+_hedge_executor = None
+
+
+def _probe(node):
+    # Request riêng, không retry: probe phải trả lời nhanh kể cả khi node treo
+    response = requests.get(f"{node.url}/about", headers=_build_headers(), timeout=JUDGE0_HEALTH_TIMEOUT)
+    return response.ok
+
+
+pool = Judge0Pool(JUDGE0_URLS, probe=_probe)
+
+
+def _can_failover(error):
+    """
+    Chỉ gửi lại POST sang node khác khi chắc chắn request chưa tới node cũ (không mở
+    được kết nối). 5xx hoặc read timeout nghĩa là node có thể đã nhận job, gửi lại
+    sẽ chạy code hai lần.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    reason = getattr(error.args[0] if error.args else None, "reason", None)
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def _with_failover(call):
+    """
+    Gọi call(node) trên node tốt nhất; không kết nối được thì thử lại một lần
+    trên node khác. Trả về (node, kết quả).
+    """
+    node = pool.acquire()
+    try:
+        return node, call(node)
+    except requests.exceptions.RequestException as e:
+        backup = pool.acquire(exclude=[node]) if _can_failover(e) else None
+        if backup is None:
+            raise
+        logger.warning(f"🔁 [JUDGE0] {node.url} failed ({e}), retrying on {backup.url}")
+        metrics.incr("judge0.failover")
+        return backup, call(backup)
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _sessions_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=2 * JUDGE0_POOL_SIZE * len(pool.nodes),
+                    thread_name_prefix="judge0-hedge",
+                )
+    return _hedge_executor
+
+
+def _hedged(call):
+    """
+    Như _with_failover, thêm hedging: request đầu chưa xong sau JUDGE0_HEDGE_DELAY giây
+    thì gửi thêm một bản tới node khác và lấy kết quả về trước. Request thua vẫn chạy
+    nốt trong background (Judge0 không hủy được submission đang chạy).
+    """
+    if JUDGE0_HEDGE_DELAY <= 0 or len(pool.nodes) < 2:
+        return _with_failover(call)
+
+    executor = _get_hedge_executor()
+    primary = pool.acquire()
+    futures = {executor.submit(call, primary): primary}
+    hedged = False
+    error = None
+
+    while futures:
+        done, _ = wait(futures, timeout=None if hedged else JUDGE0_HEDGE_DELAY, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            node = futures.pop(future)
+            try:
+                result = future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+                continue
+            if node is not primary:
+                metrics.incr("judge0.hedge.won")
+            return node, result
+
+        if hedged:
+            continue
+
+        # Request đầu chậm (straggler) hoặc lỗi: thử thêm một node khác
+        hedged = True
+        if error is not None and not _can_failover(error):
+            break
+        backup = pool.acquire(exclude=[primary])
+        if backup is not None:
+            metrics.incr("judge0.hedge.sent" if error is None else "judge0.failover")
+            futures[executor.submit(call, backup)] = backup
+
+    raise error
+
+
 def _encode_base64(text):
     if text is None:
         return None
@@ -38,11 +268,7 @@ def _decode_base64(text):
         return text
 
 
-def run_code_with_judge0(source_code, language, input_data, expected_output=None):
-    """
-    Gửi code lên Judge0 để chạy và nhận kết quả (wait=true).
-    Dùng base64 để tránh lỗi UTF-8 và logging chi tiết để debug.
-    """
+def resolve_language_id(language):
     try:
         language_id = int(language)
     except (ValueError, TypeError):
@@ -52,48 +278,218 @@ def run_code_with_judge0(source_code, language, input_data, expected_output=None
         logger.warning(f"⚠️ Unknown language '{language}', fallback to C++ (52)")
         language_id = 52
 
-    submission = {
+    return language_id
+
+
+def _build_headers():
+    headers = {"Content-Type": "application/json"}
+    if JUDGE0_API_KEY:
+        headers["X-RapidAPI-Key"] = JUDGE0_API_KEY
+    return headers
+
+
+def _build_submission(source_code, language_id, input_data, expected_output):
+    return {
         "source_code": _encode_base64(source_code),
         "language_id": language_id,
         "stdin": _encode_base64(input_data) if input_data else None,
         "expected_output": _encode_base64(expected_output) if expected_output else None,
     }
 
-    headers = {"Content-Type": "application/json"}
-    if JUDGE0_API_KEY:
-        headers["X-RapidAPI-Key"] = JUDGE0_API_KEY
 
-    logger.info(f"🚀 [JUDGE0] POST {JUDGE0_URL}/submissions?base64_encoded=true&wait=true")
+def _decode_result(result):
+    result["stdout"] = _decode_base64(result.get("stdout")) or ""
+    result["stderr"] = _decode_base64(result.get("stderr")) or ""
+    result["compile_output"] = _decode_base64(result.get("compile_output")) or ""
+    return result
+
+
+def _post_wait(submission):
+    def call(node):
+        response = _request("POST", node, "/submissions?base64_encoded=true&wait=true", json=submission)
+        response.raise_for_status()
+        return response.json()
+
+    return _hedged(call)
+
+
+def run_code_with_judge0(source_code, language, input_data, expected_output=None):
+    """
+    Gửi code lên Judge0 để chạy và nhận kết quả (wait=true).
+    Dùng base64 để tránh lỗi UTF-8 và logging chi tiết để debug.
+    """
+    language_id = resolve_language_id(language)
+    submission = _build_submission(source_code, language_id, input_data, expected_output)
+
+    logger.info("🚀 [JUDGE0] POST /submissions?base64_encoded=true&wait=true")
     logger.info(f"   Language ID: {language_id} ({language})")
     logger.info(f"   Code length: {len(source_code)} chars")
 
     try:
-        response = requests.post(
-            f"{JUDGE0_URL}/submissions?base64_encoded=true&wait=true",
-            json=submission,
-            headers=headers,
-            timeout=30,
-        )
-        response.raise_for_status()
-        result = response.json()
+        node, result = _post_wait(submission)
 
         if "error" in result:
             logger.error(f"❌ [JUDGE0] Error: {result['error']}")
             return {"status": {"description": f"Judge0 Error: {result['error']}"}}
 
-        result["stdout"] = _decode_base64(result.get("stdout")) or ""
-        result["stderr"] = _decode_base64(result.get("stderr")) or ""
-        result["compile_output"] = _decode_base64(result.get("compile_output")) or ""
+        _decode_result(result)
 
         logger.info(f"✅ [JUDGE0] Status: {result.get('status', {}).get('description', 'Unknown')} | "
-                    f"Time {result.get('time', 0)}ms | Mem {result.get('memory', 0)}KB")
+                    f"Time {result.get('time', 0)}ms | Mem {result.get('memory', 0)}KB | {node.url}")
 
         return result
 
     except requests.exceptions.Timeout:
-        logger.error("⏱️ [JUDGE0] Timeout after 30s")
+        logger.error(f"⏱️ [JUDGE0] Timeout after {JUDGE0_READ_TIMEOUT}s")
         return {"status": {"description": "Time Limit Exceeded (Gateway Timeout)"}}
 
     except requests.exceptions.RequestException as e:
         logger.error(f"❌ [JUDGE0] Request failed: {e}")
         return {"status": {"description": f"Error submitting to Judge0: {e}"}}
+
+
+# ==================================
+# 📦 Batch API (/submissions/batch)
+# ==================================
+JUDGE0_BATCH_SIZE = getattr(settings, "JUDGE0_BATCH_SIZE", 20)
+JUDGE0_BATCH_TIMEOUT = getattr(settings, "JUDGE0_BATCH_TIMEOUT", 60)
+JUDGE0_POLL_INITIAL_DELAY = getattr(settings, "JUDGE0_POLL_INITIAL_DELAY", 0.2)
+JUDGE0_POLL_MAX_DELAY = getattr(settings, "JUDGE0_POLL_MAX_DELAY", 2.0)
+
+# Status 1 = In Queue, 2 = Processing
+PENDING_STATUS_IDS = (1, 2)
+BATCH_RESULT_FIELDS = "token,stdout,stderr,compile_output,message,status,time,memory"
+
+
+def _submit_batch(submissions):
+    """
+    POST một batch, trả về (node, list token) (token None nếu Judge0 từ chối submission đó).
+    Token chỉ có trên node đã nhận batch nên phải poll đúng node đó.
+    """
+    def call(node):
+        response = _request(
+            "POST", node, "/submissions/batch?base64_encoded=true",
+            json={"submissions": submissions},
+        )
+        response.raise_for_status()
+        return [item.get("token") for item in response.json()]
+
+    return _with_failover(call)
+
+
+def _poll_batch(node, tokens):
+    """Poll các token trên `node` cho tới khi không còn test nào In Queue / Processing."""
+    results = {}
+    pending = [t for t in tokens if t]
+    delay = JUDGE0_POLL_INITIAL_DELAY
+    deadline = time.monotonic() + JUDGE0_BATCH_TIMEOUT
+
+    while pending:
+        if time.monotonic() >= deadline:
+            logger.error(f"⏱️ [JUDGE0] Batch polling timeout, {len(pending)} tests still pending")
+            for token in pending:
+                results[token] = {"status": {"description": "Time Limit Exceeded (Gateway Timeout)"}}
+            break
+
+        time.sleep(delay)
+        delay = min(delay * 2, JUDGE0_POLL_MAX_DELAY)
+
+        response = _request(
+            "GET",
+            pool.attach(node),
+            "/submissions/batch",
+            params={
+                "tokens": ",".join(pending),
+                "base64_encoded": "true",
+                "fields": BATCH_RESULT_FIELDS,
+            },
+        )
+        response.raise_for_status()
+
+        for item in response.json().get("submissions", []):
+            if not item:
+                continue
+            status_id = (item.get("status") or {}).get("id")
+            if status_id in PENDING_STATUS_IDS:
+                continue
+            results[item["token"]] = _decode_result(item)
+
+        pending = [t for t in pending if t not in results]
+
+    return results
+
+
+def run_batch_with_judge0(source_code, language, cases):
+    """
+    Chạy nhiều test case của cùng một source bằng Judge0 batch API.
+
+    `cases` là list dict {"input_data", "expected_output"}.
+    Gửi tối đa JUDGE0_BATCH_SIZE test trong một POST /submissions/batch,
+    sau đó poll GET /submissions/batch?tokens=... với backoff tăng dần.
+    Trả về list result (cùng format với run_code_with_judge0) theo đúng thứ tự `cases`.
+    """
+    language_id = resolve_language_id(language)
+    results = []
+
+    for start in range(0, len(cases), JUDGE0_BATCH_SIZE):
+        chunk = cases[start:start + JUDGE0_BATCH_SIZE]
+        submissions = [
+            _build_submission(source_code, language_id, c["input_data"], c.get("expected_output"))
+            for c in chunk
+        ]
+
+        try:
+            node, tokens = _submit_batch(submissions)
+            logger.info(f"🚀 [JUDGE0] POST {node.url}/submissions/batch ({len(chunk)} tests)")
+            by_token = _poll_batch(node, tokens)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"❌ [JUDGE0] Batch request failed: {e}")
+            results.extend(
+                {"status": {"description": f"Error submitting to Judge0: {e}"}} for _ in chunk
+            )
+            continue
+
+        for token in tokens:
+            if token is None:
+                results.append({"status": {"description": "Judge0 Error: submission rejected"}})
+            else:
+                results.append(by_token[token])
+
+    return results
+
+
+def submit_with_callbacks(source_code, language, cases):
+    """
+    Gửi test lên Judge0 kèm callback_url và trả về ngay (không chờ kết quả).
+
+    `cases` là list dict {"input_data", "expected_output", "callback_url"};
+    Judge0 PUT result của từng test tới callback_url khi chạy xong.
+    Trả về list token theo thứ tự `cases` (None nếu test đó không gửi được).
+    """
+    language_id = resolve_language_id(language)
+    tokens = []
+
+    for start in range(0, len(cases), JUDGE0_BATCH_SIZE):
+        chunk = cases[start:start + JUDGE0_BATCH_SIZE]
+        submissions = [
+            {
+                **_build_submission(source_code, language_id, c["input_data"], c.get("expected_output")),
+                "callback_url": c["callback_url"],
+            }
+            for c in chunk
+        ]
+
+        try:
+            node, chunk_tokens = _submit_batch(submissions)
+            logger.info(f"🚀 [JUDGE0] POST {node.url}/submissions/batch ({len(chunk)} tests, callback)")
+            tokens.extend(chunk_tokens)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"❌ [JUDGE0] Batch request failed: {e}")
+            tokens.extend(None for _ in chunk)
+
+    return tokens
+
+
+def parse_callback(payload):
+    """Result Judge0 PUT về callback_url (base64 như lúc gửi), cùng format với run_code_with_judge0."""
+    return _decode_result(dict(payload))
@@ -0,0 +1,54 @@
+import logging
+
+import redis
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Tất cả counter nằm trong một Redis hash để mọi process
+# (daphne, celery worker...) cùng cộng dồn vào một chỗ.
+METRICS_KEY = "metrics"
+
+
+def incr(name, amount=1):
+    try:
+        get_redis().hincrby(METRICS_KEY, name, amount)
+    except redis.RedisError as e:
+        logger.debug(f"metrics.incr({name}) failed: {e}")
+
+
+def observe(name, value, count=1):
+    """
+    Ghi nhận một giá trị (latency, wait time...) dưới dạng <name>.sum / <name>.count.
+    Nếu đã cộng dồn sẵn trong process thì `value` là tổng của `count` giá trị.
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrbyfloat(METRICS_KEY, f"{name}.sum", value)
+        pipe.hincrby(METRICS_KEY, f"{name}.count", count)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug(f"metrics.observe({name}) failed: {e}")
+
+
+def gauge(name, value):
+    try:
+        get_redis().hset(METRICS_KEY, name, value)
+    except redis.RedisError as e:
+        logger.debug(f"metrics.gauge({name}) failed: {e}")
+
+
+def snapshot():
+    """Trả về dict {metric: số} của toàn hệ thống."""
+    try:
+        raw = get_redis().hgetall(METRICS_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"metrics.snapshot failed: {e}")
+        return {}
+
+    data = {}
+    for name, value in sorted(raw.items()):
+        number = float(value)
+        data[name] = int(number) if number.is_integer() else number
+    return data
@@ -0,0 +1,33 @@
+import asyncio
+import weakref
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis():
+    """
+    Redis client dùng chung trong process (metrics, cache của judge, presence...).
+    ConnectionPool của redis-py tự tạo lại kết nối sau khi fork (Celery prefork).
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def get_async_redis():
+    """
+    Redis client asyncio cho code chạy trong event loop (consumer Channels).
+    Kết nối asyncio gắn với event loop tạo ra nó nên mỗi loop có client riêng.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        _async_clients[loop] = client
+    return client
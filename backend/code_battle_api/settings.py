@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 import environ
@@ -91,6 +92,12 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Test case có input / output từ ngưỡng này (byte) trở lên được lưu thành file
+# content-addressed trong MEDIA_ROOT/testcases thay vì cột TEXT (0 = luôn lưu trong DB)
+TESTCASE_FILE_THRESHOLD = env.int("TESTCASE_FILE_THRESHOLD", default=64 * 1024)
+# File test không còn test nào dùng chỉ bị xoá sau từng này giây (judge đang chấm vẫn đọc được)
+TESTCASE_GC_GRACE = env.int("TESTCASE_GC_GRACE", default=3600)
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
@@ -107,11 +114,15 @@ SIMPLE_JWT = {
 CORS_ALLOWED_ORIGINS = env.list("CORS_ALLOWED_ORIGINS", default=[])
 CORS_ALLOW_CREDENTIALS = True
 
+REDIS_HOST = env("REDIS_HOST")
+REDIS_PORT = env.int("REDIS_PORT")
+REDIS_URL = env("REDIS_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/1")
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [(env("REDIS_HOST"), env.int("REDIS_PORT"))],
+            "hosts": [(REDIS_HOST, REDIS_PORT)],
         },
     }
 }
@@ -120,8 +131,27 @@ CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         "LOCATION": "default",
-    }
+    },
+    # Cache dùng chung giữa các process (đề bài đã render, ...)
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "shared",
+    },
 }
+PROBLEM_STATEMENT_TTL = env.int("PROBLEM_STATEMENT_TTL", default=24 * 3600)
+
+# Presence của trận (matches/presence.py): kết nối không được gia hạn sau TTL giây
+# (ASGI process chết) thì coi như đã rời trận
+MATCH_PRESENCE_TTL = env.int("MATCH_PRESENCE_TTL", default=60)
+MATCH_PRESENCE_REFRESH = env.float("MATCH_PRESENCE_REFRESH", default=20.0)
+# Cửa sổ (giây) gom thay đổi online / offline trước khi gửi tới dashboard (users/presence.py)
+PRESENCE_BROADCAST_WINDOW = env.float("PRESENCE_BROADCAST_WINDOW", default=0.25)
+# User không có heartbeat / request trong USER_ONLINE_TIMEOUT giây bị coi là offline.
+# last_seen nằm trong Redis và được flush xuống DB mỗi chu kỳ cleanup (10 giây) nên
+# giá trị này phải lớn hơn chu kỳ heartbeat của client (10 giây) + chu kỳ flush
+USER_ONLINE_TIMEOUT = env.int("USER_ONLINE_TIMEOUT", default=30)
+LAST_SEEN_FLUSH_BATCH = env.int("LAST_SEEN_FLUSH_BATCH", default=500)
 
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_RESULT_BACKEND = "redis://redis:6379/0"
@@ -129,8 +159,82 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 
-JUDGE0_URL = env("JUDGE0_URL")
+# Lớp ưu tiên chấm (xem submissions/scheduler.py): mỗi lớp một queue riêng,
+# worker Celery và judge worker asyncio consume theo đúng thứ tự ưu tiên này
+JUDGE_QUEUES = {
+    "live": env("JUDGE_QUEUE_LIVE", default="judge.live"),
+    "practice": env("JUDGE_QUEUE_PRACTICE", default="judge.practice"),
+    "rejudge": env("JUDGE_QUEUE_REJUDGE", default="judge.rejudge"),
+}
+CELERY_TASK_ROUTES = {"submissions.tasks.judge_task": {"queue": JUDGE_QUEUES["live"]}}
+# Redis broker: worker consume nhiều queue thì luôn lấy queue đứng trước trong -Q trước
+CELERY_BROKER_TRANSPORT_OPTIONS = {"queue_order_strategy": "priority"}
+# Mỗi worker process chỉ giữ một task, submission live không bị kẹt sau task đã prefetch
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Số submission live / practice của một user được nằm trong queue hoặc đang chấm cùng lúc
+JUDGE_USER_MAX_INFLIGHT = env.int("JUDGE_USER_MAX_INFLIGHT", default=2)
+JUDGE_INFLIGHT_TTL = env.int("JUDGE_INFLIGHT_TTL", default=600)
+# Admission control cho submit_code (submissions/admission.py):
+# token bucket theo user + giới hạn backlog của user + giới hạn tổng số submission chờ chấm
+JUDGE_SUBMIT_RATE = env.float("JUDGE_SUBMIT_RATE", default=0.5)
+JUDGE_SUBMIT_BURST = env.int("JUDGE_SUBMIT_BURST", default=5)
+JUDGE_USER_MAX_QUEUED = env.int("JUDGE_USER_MAX_QUEUED", default=3)
+JUDGE_MAX_PENDING = env.int("JUDGE_MAX_PENDING", default=500)
+JUDGE_BACKPRESSURE_RETRY_AFTER = env.int("JUDGE_BACKPRESSURE_RETRY_AFTER", default=5)
+JUDGE_ASYNC_MAX_SUBMISSIONS = env.int("JUDGE_ASYNC_MAX_SUBMISSIONS", default=100)
+JUDGE_ASYNC_PER_USER = env.int("JUDGE_ASYNC_PER_USER", default=2)
+
+# Nhiều Judge0 node (phân tải, loại node hỏng): JUDGE0_URLS=http://judge0-1:2358,http://judge0-2:2358
+JUDGE0_URLS = [url.rstrip("/") for url in env.list("JUDGE0_URLS", default=[])] or [env("JUDGE0_URL")]
+JUDGE0_URL = JUDGE0_URLS[0]
 JUDGE0_API_KEY = env("JUDGE0_API_KEY", default="")
+JUDGE0_POOL_SIZE = env.int("JUDGE0_POOL_SIZE", default=10)
+JUDGE0_RETRIES = env.int("JUDGE0_RETRIES", default=2)
+JUDGE0_CONNECT_TIMEOUT = env.float("JUDGE0_CONNECT_TIMEOUT", default=3.05)
+JUDGE0_READ_TIMEOUT = env.float("JUDGE0_READ_TIMEOUT", default=30)
+JUDGE0_HOST_OPTIONS = env.json("JUDGE0_HOST_OPTIONS", default={})
+JUDGE0_ASYNC_HOST_CONCURRENCY = env.int("JUDGE0_ASYNC_HOST_CONCURRENCY", default=50)
+JUDGE0_HEALTH_INTERVAL = env.float("JUDGE0_HEALTH_INTERVAL", default=5)
+JUDGE0_HEALTH_TIMEOUT = env.float("JUDGE0_HEALTH_TIMEOUT", default=2)
+# Node lỗi JUDGE0_BREAKER_THRESHOLD lần liên tiếp bị loại trong JUDGE0_BREAKER_COOLDOWN giây
+JUDGE0_BREAKER_THRESHOLD = env.int("JUDGE0_BREAKER_THRESHOLD", default=3)
+JUDGE0_BREAKER_COOLDOWN = env.float("JUDGE0_BREAKER_COOLDOWN", default=30)
+# Gửi thêm bản sao tới node khác nếu sau JUDGE0_HEDGE_DELAY giây chưa có kết quả (0 = tắt)
+JUDGE0_HEDGE_DELAY = env.float("JUDGE0_HEDGE_DELAY", default=0)
+
+# Backend chạy code: "judge0" | "local" (subprocess + rlimit trên máy worker)
+JUDGE_EXECUTOR = env("JUDGE_EXECUTOR", default="judge0")
+LOCAL_EXECUTOR_WORKERS = env.int("LOCAL_EXECUTOR_WORKERS", default=os.cpu_count() or 1)
+LOCAL_EXECUTOR_MAX_OUTPUT = env.int("LOCAL_EXECUTOR_MAX_OUTPUT", default=16 * 1024 * 1024)
+# RLIMIT_NPROC tính theo UID chạy worker, không theo từng chương trình; 0 = tắt
+LOCAL_EXECUTOR_MAX_PROCESSES = env.int("LOCAL_EXECUTOR_MAX_PROCESSES", default=64)
+LOCAL_EXECUTOR_COMPILE_TIMEOUT = env.int("LOCAL_EXECUTOR_COMPILE_TIMEOUT", default=30)
+# Executor local chạy code của thí sinh: chuyển sang user sandbox riêng (worker chạy bằng root),
+# hoặc cho phép chạy bằng user của worker (chỉ dev / benchmark; mặc định chỉ khi DEBUG)
+LOCAL_EXECUTOR_USER = env("LOCAL_EXECUTOR_USER", default="")
+LOCAL_EXECUTOR_ALLOW_UNTRUSTED = env.bool("LOCAL_EXECUTOR_ALLOW_UNTRUSTED", default=False)
+
+# "sequential" | "parallel" | "batch" | "callback"
+JUDGE_MODE = env("JUDGE_MODE", default="sequential")
+# Mode callback: URL backend mà Judge0 gọi tới được, và thời gian chờ callback tối đa
+JUDGE0_CALLBACK_BASE_URL = env("JUDGE0_CALLBACK_BASE_URL", default="http://backend:8000")
+JUDGE_CALLBACK_TIMEOUT = env.int("JUDGE_CALLBACK_TIMEOUT", default=120)
+JUDGE_MAX_PARALLEL_TESTS = env.int("JUDGE_MAX_PARALLEL_TESTS", default=4)
+# Dừng chấm ở test sai đầu tiên cho mọi trận (hoặc bật riêng từng bài qua Problem.fail_fast)
+JUDGE_FAIL_FAST = env.bool("JUDGE_FAIL_FAST", default=False)
+# Gửi tiến độ chấm (submission_progress) tối đa một lần mỗi JUDGE_PROGRESS_INTERVAL giây
+JUDGE_PROGRESS_INTERVAL = env.float("JUDGE_PROGRESS_INTERVAL", default=0.3)
+# Submission.detailed_results: số ký tự stdout được giữ lại cho mỗi test,
+# kết quả có JSON dài từ JUDGE_RESULT_COMPRESS_MIN byte được nén zlib
+JUDGE_RESULT_OUTPUT_PREFIX = env.int("JUDGE_RESULT_OUTPUT_PREFIX", default=1024)
+JUDGE_RESULT_COMPRESS_MIN = env.int("JUDGE_RESULT_COMPRESS_MIN", default=2048)
+JUDGE_CACHE_ENABLED = env.bool("JUDGE_CACHE_ENABLED", default=True)
+JUDGE_CACHE_TTL = env.int("JUDGE_CACHE_TTL", default=3600)
+JUDGE_CACHE_MAX_ENTRIES = env.int("JUDGE_CACHE_MAX_ENTRIES", default=50000)
+JUDGE0_BATCH_SIZE = env.int("JUDGE0_BATCH_SIZE", default=20)
+JUDGE0_BATCH_TIMEOUT = env.float("JUDGE0_BATCH_TIMEOUT", default=60)
+JUDGE0_POLL_INITIAL_DELAY = env.float("JUDGE0_POLL_INITIAL_DELAY", default=0.2)
+JUDGE0_POLL_MAX_DELAY = env.float("JUDGE0_POLL_MAX_DELAY", default=2.0)
 GEMINI_API_KEY = env("GEMINI_API_KEY", default="")
 
 LOGGING = {
@@ -0,0 +1,253 @@
+import os
+import pwd
+import shutil
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+from unittest import mock, skipUnless
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from . import judge0_pool, judge0_service
+from .executors import local
+from .fake_judge0 import FakeJudge0, make_handler
+from .judge0_pool import Judge0Pool
+
+CPP = "cpp"
+PYTHON = "python"
+ADD = "print(sum(map(int, input().split())))"
+
+
+class FakeJudge0Mixin:
+    """Một fake Judge0 chạy trong process cho cả class; judge0_service dùng pool chỉ có node đó."""
+
+    latency = 0.05
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.judge = FakeJudge0(latency=cls.latency)
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(cls.judge))
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.judge.stats.clear()
+        judge0_service._reset_sessions()
+        for patcher in (
+            mock.patch.object(judge0_service, "pool", Judge0Pool(self.urls())),
+            mock.patch.object(judge0_service, "JUDGE0_POLL_INITIAL_DELAY", 0.02),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def urls(self):
+        return [self.url]
+
+
+class Judge0BatchTests(FakeJudge0Mixin, SimpleTestCase):
+    def cases(self, n):
+        return [{"input_data": f"{i} {i}", "expected_output": str(2 * i)} for i in range(n)]
+
+    def test_results_in_case_order(self):
+        cases = self.cases(5)
+        cases[3]["expected_output"] = "wrong"
+        results = judge0_service.run_batch_with_judge0(ADD, PYTHON, cases)
+
+        self.assertEqual([r["status"]["id"] for r in results], [3, 3, 3, 4, 3])
+        self.assertEqual(results[2]["stdout"].strip(), "4")
+        self.assertEqual(self.judge.stats["POST /submissions/batch"], 1)
+        self.assertEqual(self.judge.stats["POST /submissions"], 0)
+
+    def test_large_input_split_into_batches(self):
+        with mock.patch.object(judge0_service, "JUDGE0_BATCH_SIZE", 2):
+            results = judge0_service.run_batch_with_judge0(ADD, PYTHON, self.cases(5))
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.judge.stats["POST /submissions/batch"], 3)
+
+    def test_unreachable_judge0_reports_every_case(self):
+        with mock.patch.object(judge0_service, "pool", Judge0Pool(["http://127.0.0.1:9"])):
+            results = judge0_service.run_batch_with_judge0(ADD, PYTHON, self.cases(2))
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all("Error submitting to Judge0" in r["status"]["description"] for r in results))
+
+
+class LocalExecutorTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with mock.patch.object(local, "LOCAL_EXECUTOR_ALLOW_UNTRUSTED", True):
+            cls.executor = local.LocalExecutor()
+
+    def run_code(self, language, source, input_data="", **kwargs):
+        return self.executor.run(source, language, input_data, **kwargs)
+
+    def test_accepted_and_wrong_answer(self):
+        source = "print(sum(map(int, input().split())))"
+        self.assertEqual(self.run_code(PYTHON, source, "1 2", expected_output="3")["status"]["id"], 3)
+        self.assertEqual(self.run_code(PYTHON, source, "1 2", expected_output="4")["status"]["id"], 4)
+
+    def test_runtime_error(self):
+        self.assertEqual(self.run_code(PYTHON, "raise SystemExit(3)")["status"]["id"], 11)
+
+    def test_time_limit(self):
+        result = self.run_code(PYTHON, "while True: pass", time_limit=500)
+        self.assertEqual(result["status"]["id"], 5)
+
+    def test_memory_limit_is_not_runtime_error(self):
+        result = self.run_code(PYTHON, "x = bytearray(512 * 1024 * 1024)", memory_limit=64)
+        self.assertEqual(result["status"]["id"], local.MEMORY_LIMIT_EXCEEDED)
+
+    @skipUnless(shutil.which("g++"), "g++ not installed")
+    def test_compile_once_and_compilation_error(self):
+        source = "#include <cstdio>\nint main(){int a,b;scanf(\"%d %d\",&a,&b);printf(\"%d\",a+b);}"
+        results = self.executor.run_batch(source, CPP, [
+            {"input_data": "1 2", "expected_output": "3"},
+            {"input_data": "2 2", "expected_output": "4"},
+        ])
+        self.assertEqual([r["status"]["id"] for r in results], [3, 3])
+        self.assertEqual(self.run_code(CPP, "int main( {")["status"]["id"], 6)
+        self.assertEqual(self.executor.artifacts, {})
+
+    @skipUnless(shutil.which("g++"), "g++ not installed")
+    def test_source_compiled_once_per_batch(self):
+        source = "#include <cstdio>\nint main(){int a;scanf(\"%d\",&a);printf(\"%d\",a*2);}"
+        cases = [{"input_data": str(i), "expected_output": str(2 * i)} for i in range(6)]
+        with mock.patch.object(local.metrics, "incr") as incr:
+            results = self.executor.run_batch(source, CPP, cases)
+        self.assertEqual([r["status"]["id"] for r in results], [3] * 6)
+        # Thread health monitor của Judge0Pool cũng gọi metrics.incr, chỉ đếm lần build
+        compiles = [call for call in incr.call_args_list if call.args[0] == "judge.local.compiles"]
+        self.assertEqual(compiles, [mock.call("judge.local.compiles")])
+
+    @skipUnless(shutil.which("g++"), "g++ not installed")
+    def test_cpp_bad_alloc_is_memory_limit(self):
+        source = "#include <vector>\nint main(){std::vector<char> v(1ull << 31); return v[0];}"
+        self.assertEqual(self.run_code(CPP, source, memory_limit=64)["status"]["id"], local.MEMORY_LIMIT_EXCEEDED)
+
+    def test_process_limit_only_for_languages_that_allow_it(self):
+        names = lambda limits: [name for name, _ in limits]
+        self.assertIn("RLIMIT_NPROC", names(local._make_limits()))
+        self.assertNotIn("RLIMIT_NPROC", names(local._make_limits(limit_processes=False)))
+        self.assertFalse(local.LANGUAGE_COMMANDS["java"]["limit_processes"])
+
+
+class LocalExecutorSandboxTests(SimpleTestCase):
+    def test_refuses_to_run_as_worker_user_by_default(self):
+        with self.assertRaises(ImproperlyConfigured):
+            local.LocalExecutor()
+        with override_settings(DEBUG=True):
+            self.assertIsNone(local.LocalExecutor().credentials)
+
+    def test_unknown_sandbox_user(self):
+        with mock.patch.object(local, "LOCAL_EXECUTOR_USER", "no-such-judge-user"):
+            with self.assertRaises(ImproperlyConfigured):
+                local.LocalExecutor()
+
+    @skipUnless(os.geteuid() == 0, "switching users requires root")
+    @skipUnless(os.path.exists("/usr/bin/python3"), "needs a python3 readable by the sandbox user")
+    def test_runs_as_sandbox_user(self):
+        nobody = pwd.getpwnam("nobody")
+        with mock.patch.object(local, "LOCAL_EXECUTOR_USER", "nobody"):
+            executor = local.LocalExecutor()
+        self.assertEqual(executor.credentials, (nobody.pw_uid, nobody.pw_gid))
+
+        secret = tempfile.NamedTemporaryFile("w")
+        self.addCleanup(secret.close)
+        os.chmod(secret.name, 0o600)
+
+        with mock.patch.dict(os.environ, {"PATH": "/usr/bin:/bin"}):
+            result = executor.run("import os; print(os.getuid())", PYTHON, "", expected_output=str(nobody.pw_uid))
+            self.assertEqual(result["status"]["id"], 3)
+            # File chỉ worker đọc được (vd. .env) thì chương trình không đọc được
+            result = executor.run(f"open({secret.name!r}).read()", PYTHON, "")
+        self.assertIn("PermissionError", result["stderr"])
+
+
+class Judge0SessionTests(FakeJudge0Mixin, SimpleTestCase):
+    latency = 0
+
+    def test_requests_reuse_one_connection(self):
+        with mock.patch.object(judge0_service.metrics, "incr") as incr:
+            for i in range(5):
+                result = judge0_service.run_code_with_judge0(ADD, PYTHON, f"{i} 1", str(i + 1))
+                self.assertEqual(result["status"]["id"], 3)
+        # Counter gom trong process, không ghi Redis trên đường request
+        incr.assert_not_called()
+        self.assertEqual(judge0_service.get_http_stats(), {self.url: 1})
+
+        with mock.patch.object(judge0_service.metrics, "incr") as incr:
+            judge0_service.pool.flush_metrics()
+        flushed = {call.args[0]: call.args[1] for call in incr.call_args_list}
+        self.assertEqual(flushed["judge0.http.requests"], 5)
+        self.assertEqual(flushed["judge0.http.connections_opened"], 1)
+
+    def test_post_is_not_retried_on_status(self):
+        retry = judge0_service._get_session(self.url).get_adapter(self.url).max_retries
+        self.assertNotIn("POST", retry.allowed_methods)
+        self.assertIn("GET", retry.allowed_methods)
+        self.assertEqual(retry.read, 0)
+
+    def test_failover_only_when_connection_failed(self):
+        requests = judge0_service.requests
+        try:
+            requests.post("http://127.0.0.1:9", timeout=1)
+        except requests.exceptions.ConnectionError as e:
+            refused = e
+        self.assertTrue(judge0_service._can_failover(refused))
+        self.assertTrue(judge0_service._can_failover(requests.exceptions.ConnectTimeout()))
+        self.assertFalse(judge0_service._can_failover(requests.exceptions.ReadTimeout()))
+        self.assertFalse(judge0_service._can_failover(requests.exceptions.HTTPError("503")))
+
+
+class Judge0PoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = Judge0Pool(["http://a:2358", "http://b:2358"])
+        self.pool.monitor = threading.current_thread()  # không chạy thread probe trong test
+        self.a, self.b = self.pool.nodes
+
+    def test_least_outstanding_node_is_chosen(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.assertNotEqual(first, second)
+        self.pool.release(first, True, 0.1)
+        self.assertIs(self.pool.acquire(), first)
+
+    def test_breaker_ejects_failing_node(self):
+        for _ in range(judge0_pool.JUDGE0_BREAKER_THRESHOLD):
+            self.pool.release(self.pool.attach(self.a), False, 0.1)
+        self.assertEqual({self.pool.acquire().url for _ in range(4)}, {self.b.url})
+        self.assertIsNone(self.pool.acquire(exclude=[self.b]))
+
+    def test_probe_restores_node(self):
+        self.pool.probe = lambda node: True
+        self.a.open_until = float("inf")
+        self.assertTrue(self.pool.check(self.a))
+        self.assertTrue(self.a.available(0))
+
+    def test_all_nodes_down_still_returns_a_node(self):
+        self.a.open_until, self.b.open_until = 1e12, 1e11
+        self.assertIs(self.pool.acquire(), self.b)
+
+
+class Judge0FailoverTests(FakeJudge0Mixin, SimpleTestCase):
+    latency = 0
+
+    def urls(self):
+        # Node đầu không nhận kết nối (cổng đóng)
+        return ["http://127.0.0.1:9", self.url]
+
+    def test_connection_failure_moves_to_next_node(self):
+        with mock.patch.object(judge0_service.pool, "acquire", wraps=judge0_service.pool.acquire) as acquire:
+            results = [judge0_service.run_code_with_judge0(ADD, PYTHON, "1 2", "3") for _ in range(3)]
+        self.assertEqual([r["status"]["id"] for r in results], [3] * 3)
+        self.assertGreaterEqual(acquire.call_count, 3)
+        self.assertEqual(self.judge.stats["POST /submissions"], 3)
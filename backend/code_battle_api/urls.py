@@ -8,6 +8,7 @@ from users.views import (
     admin_get_stats,
     logout_user,
     admin_get_monitor_stats, 
+    admin_get_metrics,
     admin_get_activity_log,
     admin_get_activity_chart,
     admin_get_user_activity_chart,
@@ -30,6 +31,7 @@ urlpatterns = [
     path('api/logout/', logout_user, name='logout'),
     path("api/anti-cheat/", include("anti_ai.urls")),
     path('api/admin/monitor-stats/', admin_get_monitor_stats, name='admin-monitor-stats'),
+    path('api/admin/metrics/', admin_get_metrics, name='admin-metrics'),
     path('api/admin/activity-log/', admin_get_activity_log, name='admin-activity-log'),
     path('api/admin/top-players/', admin_get_top_players, name='admin-top-players'),
     path('api/admin/users/<int:user_id>/', admin_delete_user, name='admin-delete-user'),
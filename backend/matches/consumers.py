@@ -1,15 +1,19 @@
+import asyncio
 import json
 import logging
+
+import redis
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.utils import timezone
 
+from matches import presence
+from users import last_seen, presence as dashboard_presence
 from matches.models import Match
 from submissions.models import Submission
-from submissions.tasks import judge_task
+from submissions import admission, scheduler
 from matches.utils import apply_cheat_penalty, apply_normal_match_result
 
 logger = logging.getLogger(__name__)
@@ -34,25 +38,36 @@ class MatchConsumer(AsyncWebsocketConsumer):
         await self.accept()
         await self.channel_layer.group_add(self.group_name, self.channel_name)
 
-        # Track user join
-        await self._update_connection_status(is_connecting=True)
+        # Track user join (presence trong Redis, dùng chung mọi ASGI process)
+        users = await self._update_connection_status(is_connecting=True)
 
         # If both players are now connected → START THE MATCH
-        if await self._are_both_players_connected():
+        if len(users) == 2:
             await self._activate_match()  # 🔥 CRITICAL FIX
             match_data = await self._get_serialized_match_data()
             await self._broadcast_event("match.start", match_data)
 
     async def disconnect(self, close_code):
-        await self._update_connection_status(is_connecting=False)
+        # Kết nối bị từ chối trong connect() (hoặc presence.add lỗi) chưa từng vào presence
+        if not hasattr(self, "presence_task"):
+            return
+
+        self.presence_task.cancel()
+        users = await self._update_connection_status(is_connecting=False)
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
-        await self._handle_disconnect_auto_lose()
+        await self._handle_disconnect_auto_lose(users)
         logger.info(f"{self.user.username} disconnected match {self.match_id}")
 
     async def receive(self, text_data):
         try:
             data = json.loads(text_data)
+
+            # Heartbeat của client: chỉ cập nhật last_seen (Redis, users/last_seen.py)
+            if data.get("type") == "ping":
+                await last_seen.atouch(self.user.id)
+                return
+
             action = data.get("action")
 
             handler = getattr(self, f"handle_{action}", None)
@@ -88,13 +103,7 @@ class MatchConsumer(AsyncWebsocketConsumer):
         if loser_reason == "cheating":
             await self._finalize_cheat_loss(loser_username)
 
-        await self.channel_layer.group_send(
-            "dashboard_global",
-            {
-                "type": "event_user_update",
-                "payload": await self._get_dashboard_profile(self.user.id)
-            }
-        )
+        await dashboard_presence.apublish([self.user.id], dashboard_presence.UPDATE)
     # ======================================================
     # GENERIC GROUP SEND HANDLER
     # ======================================================
@@ -123,6 +132,12 @@ class MatchConsumer(AsyncWebsocketConsumer):
             await self._send_event("error", {"message": "Missing code or language"})
             return
 
+        # Hệ thống chấm / backlog của user đầy hoặc nộp quá nhanh: không tạo submission
+        rejection = await database_sync_to_async(admission.admit)(self.user.id)
+        if rejection:
+            await self._send_event("submission.throttled", rejection.payload())
+            return
+
         submission = await database_sync_to_async(Submission.objects.create)(
             match_id=self.match_id,
             user=self.user,
@@ -139,7 +154,15 @@ class MatchConsumer(AsyncWebsocketConsumer):
 
         await self._broadcast_event("opponent_submitted", {"username": self.user.username})
 
-        judge_task.delay(submission.id)
+        position = await database_sync_to_async(scheduler.enqueue)(submission)
+        if position:
+            await self._send_event(
+                "submission.queued",
+                {"submission_id": submission.id, "position": position},
+            )
+
+    async def submission_progress(self, event):
+        await self._send_event("submission_progress", event["payload"])
 
     async def submission_update(self, event):
         await self._send_event("submission_update", event["payload"])
@@ -147,15 +170,17 @@ class MatchConsumer(AsyncWebsocketConsumer):
     # ======================================================
     # AUTO LOSE ON DISCONNECT
     # ======================================================
-    async def _handle_disconnect_auto_lose(self):
-        users = cache.get(self._cache_key) or []
+    async def _handle_disconnect_auto_lose(self, users):
+        # users: user còn kết nối sau khi kết nối này rời đi
         if len(users) == 0:
             return
 
-        remaining_user_id = list(users)[0]
-        if remaining_user_id == self.user.id:
+        # User vẫn còn kết nối khác (tab khác) tới trận
+        if self.user.id in users:
             return
 
+        remaining_user_id = next(iter(users))
+
         if not await self._is_match_active():
             return
 
@@ -226,28 +251,31 @@ class MatchConsumer(AsyncWebsocketConsumer):
     async def _send_event(self, event_type, payload):
         await self.send(text_data=json.dumps({"type": event_type, "payload": payload}))
 
-    @property
-    def _cache_key(self):
-        return f"match_{self.match_id}_users"
-
     async def _update_connection_status(self, is_connecting):
-        users = set(cache.get(self._cache_key) or [])
-
+        """Thêm / bỏ kết nối này khỏi presence, trả về tập user_id đang kết nối."""
         if is_connecting:
-            users.add(self.user.id)
+            member = presence.member(self.user.id, self.channel_name)
+            users = await presence.add(self.match_id, member)
+            # Chỉ gán sau khi add thành công: disconnect dựa vào presence_task để dọn
+            self.presence_member = member
+            self.presence_task = asyncio.create_task(self._refresh_presence())
         else:
-            users.discard(self.user.id)
-
-        cache.set(self._cache_key, list(users), timeout=3600)
+            users = await presence.remove(self.match_id, self.presence_member)
 
         await self._broadcast_event(
             "player.event",
             {"event": "joined" if is_connecting else "left", "username": self.user.username},
         )
+        return users
 
-    async def _are_both_players_connected(self):
-        users = cache.get(self._cache_key) or []
-        return len(users) == 2
+    async def _refresh_presence(self):
+        """Gia hạn kết nối trong presence tới khi disconnect (process chết thì tự hết hạn)."""
+        while True:
+            await asyncio.sleep(presence.MATCH_PRESENCE_REFRESH)
+            try:
+                await presence.refresh(self.match_id, self.presence_member)
+            except redis.RedisError as e:
+                logger.warning(f"presence refresh failed for match {self.match_id}: {e}")
 
     @database_sync_to_async
     def _is_user_in_match(self):
@@ -257,7 +285,12 @@ class MatchConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def _get_serialized_match_data(self):
-        m = Match.objects.select_related("player1", "player2", "problem").get(pk=self.match_id)
+        # Đề bài không gửi kèm: client lấy qua /api/problems/<id>/statement/ (cache + ETag)
+        m = (
+            Match.objects.select_related("player1", "player2", "problem")
+            .defer("problem__description")
+            .get(pk=self.match_id)
+        )
 
         return {
             "id": m.id,
@@ -272,16 +305,11 @@ class MatchConsumer(AsyncWebsocketConsumer):
                 "rating": m.player2.userprofile.rating,
             },
             "problem": {
+                "id": m.problem.id,
                 "title": m.problem.title,
-                "description": m.problem.description,
+                "version": m.problem.version,
                 "difficulty": m.problem.difficulty,
                 "timeLimit": m.problem.time_limit,
                 "memoryLimit": m.problem.memory_limit,
             },
         }
-
-    @database_sync_to_async
-    def _get_dashboard_profile(self, user_id):
-        user = User.objects.get(id=user_id)
-        from users.serializers import UserProfileSerializer
-        return UserProfileSerializer(user).data
\ No newline at end of file
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.db.models import Q, F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from problems.models import Problem
 
 class Match(models.Model):
@@ -44,4 +46,39 @@ class Match(models.Model):
         ]
 
     def __str__(self):
-        return f"Match {self.id}: {self.player1.username} vs {self.player2.username}"
\ No newline at end of file
+        return f"Match {self.id}: {self.player1.username} vs {self.player2.username}"
+
+    # Status lúc đọc từ DB / save gần nhất (None với trận mới hoặc status bị defer),
+    # để post_save biết trận vừa đổi status mà không phải query lại
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get("status")
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._saved_status = self.__dict__.get("status")
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_status = self.status
+
+
+# ======================================================
+# SIGNALS
+# ======================================================
+
+@receiver(post_save, sender=Match)
+def cancel_judging_on_match_decided(sender, instance, **kwargs):
+    """
+    Trận vừa được phân định (chuyển sang COMPLETED / CANCELLED / CHEATING) → dừng
+    chấm các submission live / practice còn lại của trận, không tốn thêm judge.
+    Chỉ chạy khi status thay đổi: save sau đó của trận đã kết thúc (admin sửa,
+    rejudge...) không hủy gì.
+    """
+    from submissions import scheduler
+
+    previous = getattr(instance, "_saved_status", None)
+    if instance.status in scheduler.DECIDED_STATUSES and previous not in scheduler.DECIDED_STATUSES:
+        transaction.on_commit(lambda: scheduler.cancel_match(instance))
\ No newline at end of file
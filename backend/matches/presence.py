@@ -0,0 +1,84 @@
+"""
+Presence của trận đấu: user nào đang có kết nối websocket tới match_{id}.
+
+Lưu trong Redis nên mọi ASGI process (daphne trên nhiều core / node) thấy cùng
+một trạng thái:
+
+    match:{id}:presence   zset "{user_id}:{channel_name}" -> thời điểm hết hạn
+
+Mỗi kết nối là một member riêng (một user mở hai tab là hai member) với TTL
+MATCH_PRESENCE_TTL giây, được consumer gia hạn định kỳ (refresh). Process chết thì
+kết nối của nó không được gia hạn nữa và tự hết hạn. Thêm / bớt kết nối chạy bằng
+Lua script: dọn member hết hạn, sửa zset và đếm user trong cùng một thao tác atomic,
+nên hai người vào trận cùng lúc trên hai process chỉ có đúng một người thấy đủ 2.
+"""
+import time
+
+from django.conf import settings
+
+from code_battle_api.redis_client import get_async_redis
+
+MATCH_PRESENCE_TTL = getattr(settings, "MATCH_PRESENCE_TTL", 60)
+# Consumer gia hạn kết nối sau mỗi khoảng này (giây)
+MATCH_PRESENCE_REFRESH = getattr(settings, "MATCH_PRESENCE_REFRESH", MATCH_PRESENCE_TTL / 3)
+
+# KEYS: presence | ARGV: now, member hoặc '' (chỉ đọc), expire_at hoặc '' (xoá member), ttl
+# Trả về danh sách user_id (không trùng) còn kết nối
+UPDATE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if ARGV[2] ~= '' then
+    if ARGV[3] ~= '' then
+        redis.call('ZADD', KEYS[1], ARGV[3], ARGV[2])
+    else
+        redis.call('ZREM', KEYS[1], ARGV[2])
+    end
+end
+local members = redis.call('ZRANGE', KEYS[1], 0, -1)
+if #members == 0 then
+    return {}
+end
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[4])))
+local seen, users = {}, {}
+for _, member in ipairs(members) do
+    local user = string.match(member, '^(%d+):')
+    if user and not seen[user] then
+        seen[user] = true
+        table.insert(users, user)
+    end
+end
+return users
+"""
+
+
+def _key(match_id):
+    return f"match:{match_id}:presence"
+
+
+def member(user_id, channel_name):
+    return f"{user_id}:{channel_name}"
+
+
+async def _update(match_id, member_name="", expire_at=""):
+    script = get_async_redis().register_script(UPDATE_SCRIPT)
+    users = await script(
+        keys=[_key(match_id)],
+        args=[time.time(), member_name, expire_at, MATCH_PRESENCE_TTL],
+    )
+    return {int(user_id) for user_id in users}
+
+
+async def add(match_id, member_name):
+    """Thêm (hoặc gia hạn) một kết nối, trả về tập user_id đang kết nối."""
+    return await _update(match_id, member_name, time.time() + MATCH_PRESENCE_TTL)
+
+
+refresh = add
+
+
+async def remove(match_id, member_name):
+    """Bỏ một kết nối, trả về tập user_id còn kết nối."""
+    return await _update(match_id, member_name)
+
+
+async def users(match_id):
+    return await _update(match_id)
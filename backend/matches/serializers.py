@@ -21,12 +21,13 @@ class PlayerSerializer(serializers.ModelSerializer):
         ]
 
 class ProblemSerializer(serializers.ModelSerializer):
+    # Không kèm description: đề bài lấy qua /api/problems/<id>/statement/ (cache + ETag)
     class Meta:
         model = Problem
         fields = [
             "id",
             "title",
-            "description",
+            "version",
             "difficulty",
             "time_limit",
             "memory_limit",
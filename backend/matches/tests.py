@@ -0,0 +1,126 @@
+from unittest import mock
+
+import fakeredis
+import redis
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from code_battle_api import redis_client
+from problems.models import Problem
+from submissions import admission
+from submissions.models import Submission
+
+from . import consumers, presence
+from .models import Match
+from .routing import websocket_urlpatterns
+
+IN_MEMORY_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class FakeAsyncRedisMixin:
+    """Redis của presence / scheduler là fakeredis; client async tạo mới mỗi lần gọi (gắn với event loop hiện tại)."""
+
+    def setUp(self):
+        super().setUp()
+        server = fakeredis.FakeServer()
+        for patcher in (
+            mock.patch.object(
+                presence, "get_async_redis",
+                lambda: fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+            ),
+            mock.patch.object(redis_client, "_client", fakeredis.FakeRedis(server=server, decode_responses=True)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class PresenceTests(FakeAsyncRedisMixin, SimpleTestCase):
+    def test_counts_users_not_connections(self):
+        async def scenario():
+            await presence.add(1, presence.member(10, "a"))
+            await presence.add(1, presence.member(10, "b"))
+            users = await presence.add(1, presence.member(20, "c"))
+            after_tab_closed = await presence.remove(1, presence.member(10, "a"))
+            after_user_left = await presence.remove(1, presence.member(10, "b"))
+            return users, after_tab_closed, after_user_left
+
+        users, after_tab_closed, after_user_left = async_to_sync(scenario)()
+        self.assertEqual(users, {10, 20})
+        self.assertEqual(after_tab_closed, {10, 20})
+        self.assertEqual(after_user_left, {20})
+
+    def test_expired_connections_are_dropped(self):
+        async def scenario():
+            with mock.patch.object(presence, "MATCH_PRESENCE_TTL", -1):
+                await presence.add(1, presence.member(10, "a"))
+            return await presence.add(1, presence.member(20, "b"))
+
+        self.assertEqual(async_to_sync(scenario)(), {20})
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class MatchConsumerTests(FakeAsyncRedisMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.player1 = User.objects.create_user("p1", password="x")
+        self.player2 = User.objects.create_user("p2", password="x")
+        problem = Problem.objects.create(title="A + B", description="-")
+        self.match = Match.objects.create(player1=self.player1, player2=self.player2, problem=problem)
+
+    def communicator(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/matches/{self.match.id}/")
+        communicator.scope["user"] = user
+        return communicator
+
+    def test_match_starts_when_both_players_connect_and_leaver_loses(self):
+        async def scenario():
+            first, second = self.communicator(self.player1), self.communicator(self.player2)
+            self.assertTrue((await first.connect())[0])
+            self.assertTrue((await second.connect())[0])
+            events = [(await first.receive_json_from())["type"] for _ in range(3)]
+            await first.disconnect()
+            await second.disconnect()
+            return events
+
+        self.assertIn("match.start", async_to_sync(scenario)())
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.status, Match.MatchStatus.COMPLETED)
+        self.assertEqual(self.match.winner, self.player2)
+
+    def test_disconnect_after_failed_presence_add(self):
+        consumer = consumers.MatchConsumer()
+        consumer.user, consumer.match_id, consumer.channel_name = self.player1, self.match.id, "c"
+
+        async def scenario():
+            with mock.patch.object(presence, "add", side_effect=redis.RedisError("down")):
+                with self.assertRaises(redis.RedisError):
+                    await consumer._update_connection_status(is_connecting=True)
+            await consumer.disconnect(1006)
+
+        async_to_sync(scenario)()
+        self.assertFalse(hasattr(consumer, "presence_member"))
+
+    def test_throttled_submission_is_not_created(self):
+        rejection = admission.Rejection(admission.RATE_LIMITED, 1.5)
+
+        async def scenario():
+            communicator = self.communicator(self.player1)
+            await communicator.connect()
+            await communicator.receive_json_from()  # player.event joined
+            with mock.patch.object(admission, "admit", return_value=rejection):
+                await communicator.send_json_to({
+                    "action": "submit_code", "code": "print(1)", "language": "python",
+                    "problem_id": self.match.problem_id,
+                })
+                event = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return event
+
+        event = async_to_sync(scenario)()
+        self.assertEqual(event["type"], "submission.throttled")
+        self.assertEqual(event["payload"]["reason"], admission.RATE_LIMITED)
+        self.assertEqual(event["payload"]["retry_after"], 1.5)
+        self.assertFalse(Submission.objects.exists())
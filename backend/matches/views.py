@@ -14,7 +14,7 @@ class MatchDetailView(generics.RetrieveAPIView):
         "player2",
         "player2__userprofile",
         "problem"
-    )
+    ).defer("problem__description")
     serializer_class = MatchDetailSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = "id"
@@ -6,6 +6,7 @@ import google.generativeai as genai
 import json
 
 from .models import Problem, TestCase
+from . import statements
 
 
 # =====================================================
@@ -58,18 +59,33 @@ def analyze_difficulty(description: str):
 # =====================================================
 @admin.register(Problem)
 class ProblemAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "difficulty", "created_by")
+    list_display = ("id", "title", "difficulty", "fail_fast", "created_by")
 
     def save_model(self, request, obj, form, change):
         # Khi admin sửa mô tả hoặc tạo mới → auto đánh giá difficulty
         if "description" in form.changed_data:
             obj.difficulty = analyze_difficulty(obj.description)
 
+        statement_changed = change and {"title", "description"} & set(form.changed_data)
+        if statement_changed:
+            obj.version += 1
+
         super().save_model(request, obj, form, change)
 
+        if statement_changed:
+            statements.refresh(obj)
+
 
 @admin.register(TestCase)
 class TestCaseAdmin(admin.ModelAdmin):
-    list_display = ("id", "problem", "ignore_trailing_whitespace")
-    list_filter = ("ignore_trailing_whitespace",)
-    fields = ("problem", "input_data", "expected_output", "ignore_trailing_whitespace")
+    list_display = (
+        "id", "problem", "compare_mode", "ignore_trailing_whitespace",
+        "stored_on_disk", "input_size", "output_size",
+    )
+    list_filter = ("compare_mode", "ignore_trailing_whitespace", "stored_on_disk")
+    fields = (
+        "problem", "input_data", "expected_output",
+        "compare_mode", "ignore_trailing_whitespace", "float_tolerance",
+        "stored_on_disk", "input_size", "output_size",
+    )
+    readonly_fields = ("stored_on_disk", "input_size", "output_size")
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from problems import testdata
+from problems.models import TestCase
+
+
+class Command(BaseCommand):
+    help = (
+        "Tính hash / size cho test case cũ và chuyển test lớn hơn "
+        "TESTCASE_FILE_THRESHOLD ra file trong MEDIA_ROOT. "
+        "--gc: xoá file test không còn test case nào dùng (sau TESTCASE_GC_GRACE giây)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--gc", action="store_true",
+            help="Chỉ xoá file trong TESTCASE_ROOT không còn được tham chiếu",
+        )
+        parser.add_argument(
+            "--grace", type=int, default=None,
+            help="Chỉ xoá file không được lưu / nhả trong từng này giây (mặc định TESTCASE_GC_GRACE)",
+        )
+
+    def handle(self, *args, **options):
+        if options["gc"]:
+            removed = TestCase.remove_unused_files(grace=options["grace"])
+            self.stdout.write(self.style.SUCCESS(f"Đã xoá {removed} file test không còn được dùng"))
+            return
+
+        # Row tạo trước khi có hash, hoặc đủ lớn theo ngưỡng hiện tại
+        condition = Q(input_hash="") | Q(output_hash="")
+        if testdata.TESTCASE_FILE_THRESHOLD > 0:
+            threshold = testdata.TESTCASE_FILE_THRESHOLD
+            condition |= Q(input_size__gte=threshold) | Q(output_size__gte=threshold)
+
+        pending = TestCase.objects.filter(condition, stored_on_disk=False)
+        ids = list(pending.order_by("pk").values_list("pk", flat=True))
+
+        stored = 0
+        # Từng row một: không giữ nhiều test lớn trong bộ nhớ cùng lúc
+        for pk in ids:
+            tc = TestCase.objects.get(pk=pk)
+            tc.save()
+            stored += tc.stored_on_disk
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã cập nhật {len(ids)} test case, {stored} test được lưu ra file"
+        ))
+
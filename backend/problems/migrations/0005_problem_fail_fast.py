@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0004_alter_problem_difficulty_alter_problem_memory_limit_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='fail_fast',
+            field=models.BooleanField(default=False, help_text='Stop judging at the first failing test case; remaining tests are SKIPPED.'),
+        ),
+    ]
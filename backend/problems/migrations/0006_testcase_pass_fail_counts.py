@@ -0,0 +1,23 @@
+# Generated by Django 4.2.15 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0005_problem_fail_fast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='fail_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='pass_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
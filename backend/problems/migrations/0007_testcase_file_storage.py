@@ -0,0 +1,48 @@
+# Generated by Django 4.2.15 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0006_testcase_pass_fail_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='input_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='input_size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='output_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='output_size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='stored_on_disk',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='testcase',
+            name='expected_output',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='testcase',
+            name='input_data',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.15 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0007_testcase_file_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='compare_mode',
+            field=models.CharField(choices=[('exact', 'Exact'), ('whitespace', 'Ignore whitespace'), ('float', 'Float tolerance')], default='exact', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='float_tolerance',
+            field=models.FloatField(default=1e-06, help_text='Float mode: maximum absolute or relative error.'),
+        ),
+        migrations.AlterField(
+            model_name='testcase',
+            name='ignore_trailing_whitespace',
+            field=models.BooleanField(default=True, help_text='Exact mode: ignore trailing whitespace on each line and trailing blank lines.'),
+        ),
+    ]
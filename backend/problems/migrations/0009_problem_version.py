@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0008_testcase_compare_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -1,6 +1,15 @@
-from django.db import models
+import logging
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 
+from . import testdata
+
+logger = logging.getLogger(__name__)
+
 
 class Problem(models.Model):
 
@@ -34,6 +43,14 @@ class Problem(models.Model):
 
     is_active = models.BooleanField(default=True)
 
+    fail_fast = models.BooleanField(
+        default=False,
+        help_text="Stop judging at the first failing test case; remaining tests are SKIPPED."
+    )
+
+    # Tăng mỗi khi title / description đổi; khóa cache đề bài + ETag (problems/statements.py)
+    version = models.PositiveIntegerField(default=1)
+
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(
         User,
@@ -47,13 +64,27 @@ class Problem(models.Model):
 
 
 class TestCase(models.Model):
+
+    # Cách so output, xem submissions/comparator.py
+    class CompareMode(models.TextChoices):
+        EXACT = 'exact', 'Exact'
+        WHITESPACE = 'whitespace', 'Ignore whitespace'
+        FLOAT = 'float', 'Float tolerance'
+
     problem = models.ForeignKey(
         Problem,
         on_delete=models.CASCADE,
         related_name='testcases'
     )
-    input_data = models.TextField()
-    expected_output = models.TextField()
+    # Để trống khi dữ liệu nằm trên đĩa (stored_on_disk), xem problems/testdata.py
+    input_data = models.TextField(blank=True)
+    expected_output = models.TextField(blank=True)
+
+    stored_on_disk = models.BooleanField(default=False)
+    input_hash = models.CharField(max_length=64, blank=True, default="")
+    input_size = models.PositiveBigIntegerField(default=0)
+    output_hash = models.CharField(max_length=64, blank=True, default="")
+    output_size = models.PositiveBigIntegerField(default=0)
 
     is_hidden = models.BooleanField(
         default=True,
@@ -62,8 +93,119 @@ class TestCase(models.Model):
 
     ignore_trailing_whitespace = models.BooleanField(
         default=True,
-        help_text="If true, trims whitespace before comparing outputs."
+        help_text="Exact mode: ignore trailing whitespace on each line and trailing blank lines."
+    )
+
+    compare_mode = models.CharField(
+        max_length=16,
+        choices=CompareMode.choices,
+        default=CompareMode.EXACT
+    )
+    float_tolerance = models.FloatField(
+        default=1e-6,
+        help_text="Float mode: maximum absolute or relative error."
     )
 
+    # Thống kê chấm, dùng để chạy test hay fail trước (fail-fast)
+    pass_count = models.PositiveIntegerField(default=0)
+    fail_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Test Case {self.id} for Problem '{self.problem.title}'"
+
+    def save(self, *args, **kwargs):
+        # File cũ có thể không còn ai dùng sau khi dữ liệu test được sửa
+        previous = {self.input_hash, self.output_hash} if self.stored_on_disk else set()
+        if not {"input_data", "expected_output"} & self.get_deferred_fields():
+            if self.stored_on_disk and (self.input_data or self.expected_output):
+                # Sửa dữ liệu của test đang nằm trên đĩa (vd. qua admin): phần để trống giữ nguyên
+                self.input_data = self.input_data or self.read_input()
+                self.expected_output = self.expected_output or self.read_output()
+                self.stored_on_disk = False
+            if not self.stored_on_disk:
+                self._store_data()
+        super().save(*args, **kwargs)
+
+        unused = previous - {self.input_hash, self.output_hash} if self.stored_on_disk else previous
+        if unused:
+            TestCase.release_files(unused)
+
+    @staticmethod
+    def release_files(hashes):
+        """
+        Sau khi transaction commit: bắt đầu thời gian chờ của các file vừa mất một tham
+        chiếu và hẹn xoá sau TESTCASE_GC_GRACE giây nếu khi đó vẫn không còn test nào dùng.
+        """
+        hashes = sorted({h for h in hashes if h})
+
+        def schedule_removal():
+            from .tasks import remove_unused_testcase_files
+
+            for content_hash in hashes:
+                testdata.touch(content_hash)
+            try:
+                remove_unused_testcase_files.apply_async((hashes,), countdown=testdata.TESTCASE_GC_GRACE)
+            except Exception as e:
+                # `store_testcases --gc` dọn lại sau
+                logger.warning(f"⚠️ [PROBLEMS] Scheduling removal of {len(hashes)} test files failed: {e}")
+
+        if hashes:
+            transaction.on_commit(schedule_removal)
+
+    @staticmethod
+    def remove_unused_files(hashes=None, grace=None):
+        """
+        Xoá file của `hashes` (None: mọi file trong TESTCASE_ROOT) không còn test lưu trên
+        đĩa nào dùng và đã chờ đủ `grace` giây (testdata.remove_if_idle). Trả về số file đã xoá.
+        """
+        used_rows = TestCase.objects.filter(stored_on_disk=True)
+        if hashes is None:
+            hashes = set(testdata.stored_hashes())
+        else:
+            hashes = set(hashes)
+            used_rows = used_rows.filter(Q(input_hash__in=hashes) | Q(output_hash__in=hashes))
+
+        used = {h for pair in used_rows.values_list("input_hash", "output_hash") for h in pair}
+        return sum(testdata.remove_if_idle(content_hash, grace) for content_hash in hashes - used)
+
+    def _store_data(self):
+        """Tính hash / size; test lớn hơn TESTCASE_FILE_THRESHOLD được chuyển ra file."""
+        input_bytes = testdata.encode(self.input_data)
+        output_bytes = testdata.encode(self.expected_output)
+        self.input_size, self.output_size = len(input_bytes), len(output_bytes)
+
+        if testdata.should_store(self.input_size, self.output_size):
+            self.input_hash = testdata.store(input_bytes)
+            self.output_hash = testdata.store(output_bytes)
+            self.input_data = self.expected_output = ""
+            self.stored_on_disk = True
+        else:
+            self.input_hash = testdata.digest(input_bytes)
+            self.output_hash = testdata.digest(output_bytes)
+
+    # Đọc dữ liệu test: từ file (mmap) nếu stored_on_disk, ngược lại từ row
+    def read_input(self):
+        if self.stored_on_disk:
+            return testdata.read_text(self.input_hash)
+        return self.input_data or ""
+
+    def read_output(self):
+        if self.stored_on_disk:
+            return testdata.read_text(self.output_hash)
+        return self.expected_output or ""
+
+    def preview_input(self):
+        if self.stored_on_disk:
+            return testdata.preview(self.input_hash)
+        return self.input_data
+
+    def preview_output(self):
+        if self.stored_on_disk:
+            return testdata.preview(self.output_hash).strip()
+        return (self.expected_output or "").strip()
+
+
+@receiver(post_delete, sender=TestCase)
+def remove_testcase_files(sender, instance, **kwargs):
+    if instance.stored_on_disk:
+        TestCase.release_files({instance.input_hash, instance.output_hash})
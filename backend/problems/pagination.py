@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProblemCursorPagination(CursorPagination):
+    """Cursor theo id giảm dần: số query không đổi dù ngân hàng đề lớn tới đâu."""
+    ordering = "-id"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+class TestCaseCursorPagination(CursorPagination):
+    ordering = "id"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
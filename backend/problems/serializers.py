@@ -1,11 +1,60 @@
 from rest_framework import serializers
+from submissions import result_cache
 from .models import Problem, TestCase
+from . import statements
+
+
+class ProblemSummarySerializer(serializers.ModelSerializer):
+    """Danh sách bài: chỉ field tóm tắt, không description / testcases."""
+    created_by = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = Problem
+        fields = [
+            'id',
+            'title',
+            'difficulty',
+            'time_limit',
+            'memory_limit',
+            'is_active',
+            'fail_fast',
+            'version',
+            'created_at',
+            'created_by',
+        ]
+
+
+class TestCaseSerializer(serializers.ModelSerializer):
+    """Testcase của một bài (GET /api/problems/<id>/testcases/, chỉ admin)."""
+    input = serializers.SerializerMethodField()
+    output = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TestCase
+        fields = [
+            'id',
+            'input',
+            'output',
+            'is_hidden',
+            'compare_mode',
+            'ignore_trailing_whitespace',
+            'float_tolerance',
+            'stored_on_disk',
+            'input_size',
+            'output_size',
+        ]
+
+    def get_input(self, obj):
+        return obj.read_input()
+
+    def get_output(self, obj):
+        return obj.read_output()
 
 
 class ProblemSerializer(serializers.ModelSerializer):
     created_by = serializers.StringRelatedField(read_only=True)
 
-    # FE gửi test_cases khi tạo / update
+    # FE gửi test_cases khi tạo / update; đọc lại qua /api/problems/<id>/testcases/
     test_cases = serializers.ListField(
         child=serializers.DictField(),
         write_only=True,
@@ -24,28 +73,13 @@ class ProblemSerializer(serializers.ModelSerializer):
             'time_limit',
             'memory_limit',
             'is_active',
+            'fail_fast',
+            'version',
             'created_at',
             'created_by',
-            'test_cases',     # write_only + sẽ override lại ở to_representation
+            'test_cases',     # write_only
         ]
-        read_only_fields = ['created_at', 'created_by']
-
-    # -----------------------------------------------------
-    # ⭐ OUTPUT FORMAT – luôn trả testcases cho FE
-    # -----------------------------------------------------
-    def to_representation(self, instance):
-        rep = super().to_representation(instance)
-
-        rep['test_cases'] = [
-            {
-                "input": tc.input_data,
-                "output": tc.expected_output,
-                "is_hidden": tc.is_hidden,
-            }
-            for tc in instance.testcases.all()
-        ]
-
-        return rep
+        read_only_fields = ['version', 'created_at', 'created_by']
 
     # -----------------------------------------------------
     # ⭐ CREATE Problem + Testcases
@@ -55,13 +89,7 @@ class ProblemSerializer(serializers.ModelSerializer):
 
         problem = Problem.objects.create(**validated_data)
 
-        for tc in test_cases_data:
-            TestCase.objects.create(
-                problem=problem,
-                input_data=tc.get("input", ""),
-                expected_output=tc.get("output", ""),
-                is_hidden=tc.get("is_hidden", True),
-            )
+        self._create_testcases(problem, test_cases_data)
 
         return problem
 
@@ -70,22 +98,56 @@ class ProblemSerializer(serializers.ModelSerializer):
     # -----------------------------------------------------
     def update(self, instance, validated_data):
         test_cases_data = validated_data.pop('test_cases', None)
+        limits_changed = any(
+            field in validated_data and validated_data[field] != getattr(instance, field)
+            for field in ('time_limit', 'memory_limit')
+        )
+        statement_changed = any(
+            field in validated_data and validated_data[field] != getattr(instance, field)
+            for field in ('title', 'description')
+        )
 
         # Cập nhật các field cơ bản
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
+        if statement_changed:
+            instance.version += 1
         instance.save()
 
+        # Đề đã cache (HTML + ETag) chuyển sang version mới
+        if statement_changed:
+            statements.refresh(instance)
+
         # Nếu FE gửi test_cases → xoá hết và tạo lại
         if test_cases_data is not None:
             instance.testcases.all().delete()
+            self._create_testcases(instance, test_cases_data)
 
-            for tc in test_cases_data:
-                TestCase.objects.create(
-                    problem=instance,
-                    input_data=tc.get("input", ""),
-                    expected_output=tc.get("output", ""),
-                    is_hidden=tc.get("is_hidden", True),
-                )
+        # Kết quả chấm đã cache không còn đúng với test / limit mới
+        if test_cases_data is not None or limits_changed:
+            result_cache.invalidate_problem(instance.id)
 
         return instance
+
+    # -----------------------------------------------------
+    # ⭐ Testcases (chế độ so output: exact / whitespace / float)
+    # -----------------------------------------------------
+    def validate_test_cases(self, value):
+        for tc in value:
+            mode = tc.get("compare_mode", TestCase.CompareMode.EXACT)
+            if mode not in TestCase.CompareMode.values:
+                raise serializers.ValidationError(f"compare_mode không hợp lệ: {mode}")
+        return value
+
+    def _create_testcases(self, problem, test_cases_data):
+        for tc in test_cases_data:
+            TestCase.objects.create(
+                problem=problem,
+                # FE admin gửi input_data / expected_output, AI / import gửi input / output
+                input_data=tc.get("input", tc.get("input_data", "")),
+                expected_output=tc.get("output", tc.get("expected_output", "")),
+                is_hidden=tc.get("is_hidden", True),
+                compare_mode=tc.get("compare_mode", TestCase.CompareMode.EXACT),
+                ignore_trailing_whitespace=tc.get("ignore_trailing_whitespace", True),
+                float_tolerance=tc.get("float_tolerance", 1e-6),
+            )
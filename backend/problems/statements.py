@@ -0,0 +1,86 @@
+"""
+Cache đề bài (Markdown gốc + HTML đã render) theo problem id và version.
+
+    problem:{id}:version              version hiện tại của đề
+    problem:{id}:statement:{version}  {"id", "version", "title", "markdown", "html", "etag"}
+
+Nằm trong cache "shared" (Redis) nên mọi process dùng chung; đề đã có trong cache
+được phục vụ không cần query DB. Sửa title / description (ProblemSerializer.update,
+admin) tăng Problem.version và ghi lại cache (refresh), ETag đổi theo version.
+
+Render Markdown bằng thư viện `markdown` nếu đã cài, nếu không thì escape HTML và
+giữ nguyên xuống dòng.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.html import escape, linebreaks
+
+from .models import Problem
+
+try:
+    import markdown
+except ImportError:  # pragma: no cover - optional dependency
+    markdown = None
+
+PROBLEM_STATEMENT_TTL = getattr(settings, "PROBLEM_STATEMENT_TTL", 24 * 3600)
+MARKDOWN_EXTENSIONS = ["fenced_code", "tables"]
+
+
+def _cache():
+    return caches["shared"]
+
+
+def _version_key(problem_id):
+    return f"problem:{problem_id}:version"
+
+
+def _statement_key(problem_id, version):
+    return f"problem:{problem_id}:statement:{version}"
+
+
+def render_markdown(text):
+    if markdown is None:
+        return linebreaks(escape(text or ""))
+    return markdown.markdown(text or "", extensions=MARKDOWN_EXTENSIONS)
+
+
+def etag(problem_id, version):
+    return f'"p{problem_id}-v{version}"'
+
+
+def refresh(problem):
+    """Render lại đề của `problem` và ghi vào cache (gọi sau khi version tăng)."""
+    statement = {
+        "id": problem.id,
+        "version": problem.version,
+        "title": problem.title,
+        "markdown": problem.description,
+        "html": render_markdown(problem.description),
+        "etag": etag(problem.id, problem.version),
+    }
+    _cache().set_many({
+        _version_key(problem.id): problem.version,
+        _statement_key(problem.id, problem.version): statement,
+    }, PROBLEM_STATEMENT_TTL)
+    return statement
+
+
+def get(problem_id, version=None):
+    """
+    Đề bài của problem (version=None: version mới nhất).
+    Chỉ query DB khi cache chưa có; Problem.DoesNotExist nếu không có bài.
+    """
+    cache = _cache()
+    if version is None:
+        version = cache.get(_version_key(problem_id))
+    if version is not None:
+        statement = cache.get(_statement_key(problem_id, version))
+        if statement is not None:
+            return statement
+
+    problem = Problem.objects.only("id", "title", "description", "version").get(pk=problem_id)
+    return refresh(problem)
+
+
+def forget(problem_id):
+    _cache().delete(_version_key(problem_id))
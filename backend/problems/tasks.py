@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .models import TestCase
+
+
+@shared_task
+def remove_unused_testcase_files(hashes):
+    """Xoá file test đã hết thời gian chờ mà vẫn không còn test case nào dùng (xem problems/testdata.py)."""
+    return TestCase.remove_unused_files(hashes)
@@ -0,0 +1,145 @@
+"""
+Lưu dữ liệu test case lớn trên đĩa thay vì trong cột TEXT.
+
+File được đặt tên theo sha256 của nội dung (content-addressed) trong
+MEDIA_ROOT/testcases/<2 ký tự đầu>/<sha256>, nên hai test giống nhau dùng chung
+một file và file đã ghi không bao giờ bị sửa. Row TestCase chỉ giữ hash + size.
+
+File không bị xoá ngay khi row cuối cùng dùng nó bị xoá / sửa: judge đang chấm có
+thể đã đọc row cũ, và admin có thể đang lưu một test cùng nội dung. store() và
+touch() (gọi khi một row nhả hash) cập nhật mtime của file; file chỉ bị xoá khi
+không còn row nào tham chiếu và mtime đã cũ hơn TESTCASE_GC_GRACE giây
+(TestCase.remove_unused_files, hẹn giờ bởi TestCase.release_files và chạy bởi
+`store_testcases --gc`). Bước kiểm tra mtime + xoá và bước store dùng chung một
+flock trong TESTCASE_ROOT nên không chen vào nhau.
+
+Đọc qua mmap: trang file nằm trong page cache của OS, được chia sẻ giữa các
+worker process, và so sánh output không cần copy cả file vào bộ nhớ.
+"""
+import codecs
+import fcntl
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+# Test case có input hoặc output từ ngưỡng này (byte) trở lên được lưu ra file; 0 = tắt
+TESTCASE_FILE_THRESHOLD = getattr(settings, "TESTCASE_FILE_THRESHOLD", 64 * 1024)
+TESTCASE_ROOT = Path(getattr(settings, "TESTCASE_ROOT", Path(settings.MEDIA_ROOT) / "testcases"))
+# Số ký tự đầu của test lưu trên đĩa được đưa vào kết quả chấm chi tiết
+TESTCASE_PREVIEW_CHARS = getattr(settings, "TESTCASE_PREVIEW_CHARS", 1024)
+# File không còn được tham chiếu chỉ bị xoá sau từng này giây kể từ lần store / touch cuối
+TESTCASE_GC_GRACE = getattr(settings, "TESTCASE_GC_GRACE", 3600)
+
+
+def encode(text):
+    return (text or "").encode("utf-8")
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def should_store(*sizes):
+    return TESTCASE_FILE_THRESHOLD > 0 and max(sizes) >= TESTCASE_FILE_THRESHOLD
+
+
+def path_for(content_hash):
+    return TESTCASE_ROOT / content_hash[:2] / content_hash
+
+
+@contextmanager
+def _locked():
+    """flock dùng chung giữa store và remove_if_idle của mọi process."""
+    TESTCASE_ROOT.mkdir(parents=True, exist_ok=True)
+    with open(TESTCASE_ROOT / ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def store(data):
+    """Ghi `data` (bytes) nếu chưa có file cùng nội dung, trả về hash."""
+    content_hash = digest(data)
+    path = path_for(content_hash)
+
+    with _locked():
+        if path.exists():
+            # File đang chờ xoá được dùng lại: làm mới mtime để GC không xoá trước khi row commit
+            os.utime(path)
+            return content_hash
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Ghi ra file tạm rồi rename: worker khác không bao giờ đọc phải file ghi dở
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    return content_hash
+
+
+def touch(content_hash):
+    """Bắt đầu thời gian chờ xoá của file (gọi khi một row vừa nhả hash)."""
+    try:
+        os.utime(path_for(content_hash))
+    except FileNotFoundError:
+        pass
+
+
+def remove_if_idle(content_hash, grace=None):
+    """
+    Xoá file của hash nếu không được store / touch trong `grace` giây gần nhất.
+    Chỉ gọi khi đã thấy không còn row nào dùng; trả về True nếu đã xoá.
+    """
+    grace = TESTCASE_GC_GRACE if grace is None else grace
+    path = path_for(content_hash)
+    with _locked():
+        try:
+            if time.time() - path.stat().st_mtime < grace:
+                return False
+            path.unlink()
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def stored_hashes():
+    """Hash của mọi file đang có trong TESTCASE_ROOT (bỏ qua file tạm đang ghi)."""
+    if not TESTCASE_ROOT.is_dir():
+        return
+    for path in TESTCASE_ROOT.glob("*/*"):
+        if not path.name.startswith(".tmp-"):
+            yield path.name
+
+
+@contextmanager
+def open_mapped(content_hash):
+    """mmap chỉ đọc của file test (file rỗng không mmap được → b"")."""
+    with open(path_for(content_hash), "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def read_text(content_hash):
+    with open_mapped(content_hash) as data:
+        return codecs.utf_8_decode(data, "replace", True)[0]
+
+
+def preview(content_hash, chars=None):
+    """Phần đầu của file, không đọc cả file."""
+    chars = chars or TESTCASE_PREVIEW_CHARS
+    with open_mapped(content_hash) as data:
+        # Mỗi ký tự UTF-8 tối đa 4 byte
+        return codecs.utf_8_decode(data[:chars * 4], "replace", False)[0][:chars]
+
@@ -0,0 +1,231 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from submissions import services
+
+from . import statements, tasks, testdata
+from .models import Problem, TestCase as ProblemTestCase
+from .serializers import ProblemSerializer
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "shared"},
+}
+
+
+class TestDataStorageTests(TestCase):
+    def setUp(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(testdata, "TESTCASE_ROOT", root),
+            mock.patch.object(testdata, "TESTCASE_FILE_THRESHOLD", 16),
+            mock.patch.object(testdata, "TESTCASE_GC_GRACE", 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.scheduled = []
+        patcher = mock.patch.object(
+            tasks.remove_unused_testcase_files, "apply_async",
+            side_effect=lambda args, countdown: self.scheduled.append(args[0]),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.problem = Problem.objects.create(title="Big", description="-")
+
+    def create(self, input_data, output):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProblemTestCase.objects.create(
+                problem=self.problem, input_data=input_data, expected_output=output,
+            )
+
+    def run_scheduled(self):
+        """Chạy các task xoá đã hẹn (như khi hết TESTCASE_GC_GRACE)."""
+        scheduled, self.scheduled = self.scheduled, []
+        for hashes in scheduled:
+            tasks.remove_unused_testcase_files(hashes)
+
+    def exists(self, content_hash):
+        return testdata.path_for(content_hash).exists()
+
+    def test_large_testcase_is_stored_on_disk(self):
+        tc = self.create("1 " * 20, "small")
+        self.assertTrue(tc.stored_on_disk)
+        self.assertEqual(tc.input_data, "")
+        self.assertEqual(tc.read_input(), "1 " * 20)
+        self.assertEqual(tc.read_output(), "small")
+        self.assertTrue(self.exists(tc.input_hash))
+
+    def test_small_testcase_stays_in_row(self):
+        tc = self.create("1 2", "3")
+        self.assertFalse(tc.stored_on_disk)
+        self.assertEqual(tc.input_hash, testdata.digest(b"1 2"))
+        self.assertFalse(self.exists(tc.input_hash))
+
+    def test_shared_file_removed_with_last_reference(self):
+        first = self.create("x" * 32, "out")
+        second = self.create("x" * 32, "other")
+        self.assertEqual(first.input_hash, second.input_hash)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        # Chưa xoá ngay: judge đang chấm có thể vẫn đọc file
+        self.assertTrue(self.exists(first.output_hash))
+        self.run_scheduled()
+        self.assertTrue(self.exists(second.input_hash))
+        self.assertFalse(self.exists(first.output_hash))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.run_scheduled()
+        self.assertFalse(self.exists(second.input_hash))
+
+    def test_editing_data_releases_old_file(self):
+        tc = self.create("y" * 32, "out")
+        old_hash = tc.input_hash
+        with self.captureOnCommitCallbacks(execute=True):
+            tc.input_data = "z" * 32
+            tc.save()
+        self.run_scheduled()
+        self.assertNotEqual(tc.input_hash, old_hash)
+        self.assertFalse(self.exists(old_hash))
+        self.assertTrue(self.exists(tc.input_hash))
+
+    def test_released_file_kept_during_grace_period(self):
+        tc = self.create("v" * 32, "out")
+        with self.captureOnCommitCallbacks(execute=True):
+            tc.delete()
+        with mock.patch.object(testdata, "TESTCASE_GC_GRACE", 60):
+            self.run_scheduled()
+            # Judge đã đọc row trước khi xoá vẫn đọc được dữ liệu
+            self.assertEqual(tc.read_input(), "v" * 32)
+            call_command("store_testcases", gc=True, stdout=StringIO())
+            self.assertTrue(self.exists(tc.input_hash))
+
+    def test_storing_same_content_again_restarts_grace_period(self):
+        tc = self.create("u" * 32, "out")
+        with self.captureOnCommitCallbacks(execute=True):
+            tc.delete()
+        old = time.time() - 120
+        os.utime(testdata.path_for(tc.input_hash), (old, old))
+
+        # Admin lưu test cùng nội dung, row chưa commit khi task xoá chạy
+        self.assertEqual(testdata.store(testdata.encode("u" * 32)), tc.input_hash)
+        with mock.patch.object(testdata, "TESTCASE_GC_GRACE", 60):
+            self.run_scheduled()
+        self.assertTrue(self.exists(tc.input_hash))
+
+    def test_gc_removes_orphans(self):
+        tc = self.create("w" * 32, "out")
+        orphan = testdata.store(b"orphan" * 10)
+        call_command("store_testcases", gc=True, stdout=StringIO())
+        self.assertFalse(self.exists(orphan))
+        self.assertTrue(self.exists(tc.input_hash))
+
+    def test_output_compared_and_previewed_from_disk(self):
+        tc = self.create("1\n", "line\n" * 10)
+        self.assertTrue(tc.stored_on_disk)
+        self.assertTrue(services.output_matches(tc, "line\n" * 10))
+        self.assertFalse(services.output_matches(tc, "line\n" * 9))
+        self.assertEqual(services.case_payload(tc), {"input_data": "1\n\n", "expected_output": None})
+        with mock.patch.object(testdata, "TESTCASE_PREVIEW_CHARS", 9):
+            self.assertEqual(tc.preview_output(), "line\nline")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProblemStatementTests(TestCase):
+    def setUp(self):
+        self.problem = Problem.objects.create(title="A + B", description="Tính **a + b**.")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("u", password="x"))
+        self.url = f"/api/problems/{self.problem.id}/statement/"
+
+    def test_cached_statement_skips_database(self):
+        first = statements.get(self.problem.id)
+        with self.assertNumQueries(0):
+            second = statements.get(self.problem.id)
+        self.assertEqual(first, second)
+        self.assertEqual(second["markdown"], "Tính **a + b**.")
+        self.assertEqual(second["etag"], statements.etag(self.problem.id, self.problem.version))
+
+    def test_statement_change_bumps_version_and_etag(self):
+        old = statements.get(self.problem.id)
+        serializer = ProblemSerializer(self.problem, data={"description": "Tính a - b."}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        new = statements.get(self.problem.id)
+        self.assertEqual(new["version"], old["version"] + 1)
+        self.assertNotEqual(new["etag"], old["etag"])
+        self.assertEqual(new["markdown"], "Tính a - b.")
+        # Version cũ vẫn lấy được theo id + version
+        self.assertEqual(statements.get(self.problem.id, old["version"])["markdown"], "Tính **a + b**.")
+
+    def test_if_none_match_returns_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["title"], "A + B")
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"p0-v0"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_problem_returns_not_found(self):
+        self.assertEqual(self.client.get("/api/problems/999999/statement/").status_code, 404)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user("admin", password="x", is_staff=True)
+        self.client.force_authenticate(self.admin)
+
+    def collect(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [item["id"] for item in response.data["results"]]
+            url, pages = response.data["next"], pages + 1
+        return ids, pages
+
+    def test_problem_list_walks_newest_first(self):
+        problems = [Problem.objects.create(title=f"P{i}", description="-") for i in range(5)]
+        ids, pages = self.collect("/api/problems/?page_size=2")
+        self.assertEqual(ids, [p.id for p in reversed(problems)])
+        self.assertEqual(pages, 3)
+
+    def test_problem_list_query_count_does_not_depend_on_position(self):
+        for i in range(6):
+            Problem.objects.create(title=f"P{i}", description="-", created_by=self.admin)
+        first = self.client.get("/api/problems/?page_size=2")
+        self.assertNotIn("description", first.data["results"][0])
+        with self.assertNumQueries(1):
+            self.client.get(first.data["next"])
+
+    def test_testcases_are_paginated_for_admin_only(self):
+        problem = Problem.objects.create(title="A + B", description="-")
+        cases = [
+            ProblemTestCase.objects.create(problem=problem, input_data=f"{i}", expected_output=f"{i}")
+            for i in range(3)
+        ]
+        url = f"/api/problems/{problem.id}/testcases/?page_size=2"
+        ids, pages = self.collect(url)
+        self.assertEqual(ids, [tc.id for tc in cases])
+        self.assertEqual(pages, 2)
+
+        self.client.force_authenticate(User.objects.create_user("player", password="x"))
+        self.assertEqual(self.client.get(url).status_code, 403)
@@ -2,6 +2,8 @@ from django.urls import path
 from .views import (
     ProblemListCreateView, 
     ProblemDetailView,
+    ProblemStatementView,
+    ProblemTestCaseListView,
     GenerateTestCasesView,
     ImportProblemPDFView  # <-- Import view gọi AI
 )
@@ -15,6 +17,12 @@ urlpatterns = [
     # (GET, PUT, PATCH, DELETE /api/problems/1/)
     path('problems/<int:pk>/', ProblemDetailView.as_view(), name='problem-detail'),
 
+    # Đề bài đã render, có ETag (GET /api/problems/1/statement/)
+    path('problems/<int:pk>/statement/', ProblemStatementView.as_view(), name='problem-statement'),
+
+    # Testcase của bài, phân trang (GET /api/problems/1/testcases/?cursor=...)
+    path('problems/<int:pk>/testcases/', ProblemTestCaseListView.as_view(), name='problem-testcases'),
+
     # --- URL MỚI CHO CHỨC NĂNG AI ---
     # Frontend sẽ POST (description) đến URL này
     path('generate-testcases/', GenerateTestCasesView.as_view(), name='generate-testcases'),
@@ -8,9 +8,15 @@ from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from django.utils.http import parse_etags
+from rest_framework.exceptions import ValidationError
+from django.shortcuts import get_object_or_404
 from .models import Problem
-from .serializers import ProblemSerializer
+from .pagination import ProblemCursorPagination, TestCaseCursorPagination
+from .serializers import ProblemSerializer, ProblemSummarySerializer, TestCaseSerializer
 from .models import Problem, TestCase
+from . import statements
 
 
 # ===================================================================
@@ -18,8 +24,36 @@ from .models import Problem, TestCase
 # ===================================================================
 
 class ProblemListCreateView(generics.ListCreateAPIView):
-    queryset = Problem.objects.all()   # Admin cần thấy cả Active + Locked
-    serializer_class = ProblemSerializer
+    """
+    GET: danh sách tóm tắt, cursor pagination, lọc ?difficulty=1,2 & ?is_active=true.
+    POST: tạo bài kèm test_cases.
+    """
+    pagination_class = ProblemCursorPagination
+
+    def get_queryset(self):
+        # Admin cần thấy cả Active + Locked
+        queryset = Problem.objects.select_related("created_by").defer("description")
+
+        difficulty = self.request.query_params.get("difficulty")
+        if difficulty:
+            try:
+                levels = [int(level) for level in difficulty.split(",")]
+            except ValueError:
+                raise ValidationError({"difficulty": "Phải là số (vd. 1 hoặc 1,2)."})
+            queryset = queryset.filter(difficulty__in=levels)
+
+        is_active = self.request.query_params.get("is_active")
+        if is_active is not None:
+            if is_active.lower() not in ("true", "false", "1", "0"):
+                raise ValidationError({"is_active": "Phải là true hoặc false."})
+            queryset = queryset.filter(is_active=is_active.lower() in ("true", "1"))
+
+        return queryset
+
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return ProblemSerializer
+        return ProblemSummarySerializer
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -35,6 +69,11 @@ class ProblemDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Problem.objects.all()
     serializer_class = ProblemSerializer
 
+    def perform_destroy(self, instance):
+        problem_id = instance.id
+        super().perform_destroy(instance)
+        statements.forget(problem_id)
+
     def get(self, request, *args, **kwargs):
         try:
             problem = self.get_object()
@@ -48,6 +87,44 @@ class ProblemDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 
+class ProblemTestCaseListView(generics.ListAPIView):
+    """Testcase của một bài (kể cả test ẩn), phân trang theo cursor, chỉ admin."""
+    serializer_class = TestCaseSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = TestCaseCursorPagination
+
+    def get_queryset(self):
+        problem = get_object_or_404(Problem.objects.only("id"), pk=self.kwargs["pk"])
+        return TestCase.objects.filter(problem=problem)
+
+
+# ===================================================================
+#  STATEMENT (cache + ETag)
+# ===================================================================
+
+class ProblemStatementView(APIView):
+    """
+    Đề bài đã render (HTML + Markdown gốc) từ cache dùng chung.
+    Client gửi lại ETag qua If-None-Match → 304, không truyền lại đề.
+    Xác thực JWT không cần query user, đề đã cache thì không chạm DB.
+    """
+    authentication_classes = [JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            statement = statements.get(pk)
+        except Problem.DoesNotExist:
+            return Response({"error": "Problem not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        headers = {"ETag": statement["etag"], "Cache-Control": "private, no-cache"}
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if statement["etag"] in if_none_match or "*" in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = {key: statement[key] for key in ("id", "version", "title", "markdown", "html")}
+        return Response(data, headers=headers)
+
 
 # ===================================================================
 #  AI – GENERATE TEST CASES
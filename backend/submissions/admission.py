@@ -0,0 +1,121 @@
+"""
+Admission control cho submit_code: quyết định có nhận submission mới hay không
+trước khi tạo Submission, để backlog chấm luôn bị chặn trên khi có traffic spike.
+
+Thứ tự kiểm tra (nhận thì mới tốn token):
+    1. saturated      tổng submission live / practice đang chờ (Celery queue + backlog
+                      của scheduler) >= JUDGE_MAX_PENDING
+    2. too_many_queued user đã có >= JUDGE_USER_MAX_QUEUED submission nằm trong backlog
+    3. rate_limited   token bucket của user hết token (JUDGE_SUBMIT_RATE token/giây,
+                      tối đa JUDGE_SUBMIT_BURST)
+
+Token bucket nằm trong Redis (judge:bucket:{user}) nên mọi ASGI process dùng chung,
+thời gian lấy từ Redis TIME để không phụ thuộc đồng hồ từng máy.
+Redis lỗi thì vẫn nhận submission (fail open), chỉ mất giới hạn.
+
+Metrics: judge.admission.accepted / .saturated / .too_many_queued / .rate_limited
+"""
+import logging
+from dataclasses import dataclass
+
+import redis
+from django.conf import settings
+
+from code_battle_api import metrics
+
+from . import scheduler
+
+logger = logging.getLogger(__name__)
+
+JUDGE_SUBMIT_RATE = getattr(settings, "JUDGE_SUBMIT_RATE", 0.5)
+JUDGE_SUBMIT_BURST = getattr(settings, "JUDGE_SUBMIT_BURST", 5)
+JUDGE_USER_MAX_QUEUED = getattr(settings, "JUDGE_USER_MAX_QUEUED", 3)
+JUDGE_MAX_PENDING = getattr(settings, "JUDGE_MAX_PENDING", 500)
+# Client được báo thử lại sau bao nhiêu giây khi hệ thống / backlog của user đầy
+JUDGE_BACKPRESSURE_RETRY_AFTER = getattr(settings, "JUDGE_BACKPRESSURE_RETRY_AFTER", 5)
+
+SATURATED = "saturated"
+TOO_MANY_QUEUED = "too_many_queued"
+RATE_LIMITED = "rate_limited"
+
+# KEYS: bucket, backlog live, backlog practice | ARGV: rate, burst, max queued
+# Trả về {0, ''} nếu nhận, {1, ''} nếu backlog của user đầy, {2, retry_after} nếu hết token
+ADMIT_SCRIPT = """
+if redis.call('LLEN', KEYS[2]) + redis.call('LLEN', KEYS[3]) >= tonumber(ARGV[3]) then
+    return {1, ''}
+end
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate)
+local result = {0, ''}
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    result = {2, tostring((1 - tokens) / rate)}
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return result
+"""
+
+MESSAGES = {
+    SATURATED: "Hệ thống chấm đang quá tải, vui lòng nộp lại sau.",
+    TOO_MANY_QUEUED: "Bạn còn quá nhiều bài nộp đang chờ chấm.",
+    RATE_LIMITED: "Bạn nộp bài quá nhanh.",
+}
+
+
+@dataclass
+class Rejection:
+    reason: str
+    retry_after: float
+
+    def payload(self):
+        return {
+            "reason": self.reason,
+            "retry_after": round(self.retry_after, 1),
+            "message": MESSAGES[self.reason],
+        }
+
+
+def _bucket_key(user_id):
+    return f"judge:bucket:{user_id}"
+
+
+def admit(user_id):
+    """Trả về None nếu nhận submission của user, ngược lại là Rejection."""
+    rejection = _check(user_id)
+    metrics.incr(f"judge.admission.{rejection.reason if rejection else 'accepted'}")
+    if rejection:
+        logger.info(f"🚦 [JUDGE] Submit from user {user_id} rejected: {rejection.reason}")
+    return rejection
+
+
+def _check(user_id):
+    if scheduler.pending_depth() >= JUDGE_MAX_PENDING:
+        return Rejection(SATURATED, JUDGE_BACKPRESSURE_RETRY_AFTER)
+
+    try:
+        code, retry_after = scheduler.run_script(
+            ADMIT_SCRIPT,
+            keys=[
+                _bucket_key(user_id),
+                scheduler.backlog_key(user_id, scheduler.LIVE),
+                scheduler.backlog_key(user_id, scheduler.PRACTICE),
+            ],
+            args=[JUDGE_SUBMIT_RATE, JUDGE_SUBMIT_BURST, JUDGE_USER_MAX_QUEUED],
+        )
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ [JUDGE] Admission check unavailable for user {user_id}: {e}")
+        return None
+
+    if code == 1:
+        return Rejection(TOO_MANY_QUEUED, JUDGE_BACKPRESSURE_RETRY_AFTER)
+    if code == 2:
+        return Rejection(RATE_LIMITED, float(retry_after))
+    return None
@@ -0,0 +1,220 @@
+"""
+Judge worker asyncio: một process chấm nhiều submission (và test của chúng) cùng lúc.
+
+Worker đọc message judge_task từ các queue JUDGE_QUEUES của Celery bằng kombu
+(theo thứ tự ưu tiên live > practice > rejudge), chấm bằng AsyncJudge0Client và
+chỉ ack message khi submission đã chấm xong (worker chết giữa chừng thì broker giao lại message).
+
+Giới hạn:
+    - JUDGE_ASYNC_MAX_SUBMISSIONS: số submission đang chấm trong process (prefetch).
+    - JUDGE_ASYNC_PER_USER: số submission của cùng một user chấm đồng thời.
+    - JUDGE0_ASYNC_HOST_CONCURRENCY: số request đồng thời tới một Judge0 host.
+"""
+import asyncio
+import logging
+import queue
+import signal
+import socket
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from kombu import Consumer
+
+from code_battle_api import metrics
+from code_battle_api.celery import app
+from code_battle_api.judge0_async import AsyncJudge0Client
+
+from . import scheduler
+from .models import Submission
+from .progress import ProgressReporter
+from .services import CompilationError, JudgingCancelled, is_fail_fast, run_testcases_async
+from .tasks import (
+    cancel_judging,
+    finish_judging,
+    judge_task,
+    judging_cancel_check,
+    mark_judging_failed,
+    start_judging,
+)
+
+logger = logging.getLogger(__name__)
+
+JUDGE_ASYNC_MAX_SUBMISSIONS = getattr(settings, "JUDGE_ASYNC_MAX_SUBMISSIONS", 100)
+JUDGE_ASYNC_PER_USER = getattr(settings, "JUDGE_ASYNC_PER_USER", 2)
+
+STATS_FLUSH_INTERVAL = 10
+
+
+class _UserSlots:
+    """Semaphore theo user, tự xóa khi user không còn submission nào đang chờ / chấm."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.slots = {}
+
+    @asynccontextmanager
+    async def acquire(self, user_id):
+        entry = self.slots.setdefault(user_id, [asyncio.Semaphore(self.limit), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.slots[user_id]
+
+
+class AsyncJudgeWorker:
+    def __init__(self, concurrency=None, per_user=None):
+        self.concurrency = concurrency or JUDGE_ASYNC_MAX_SUBMISSIONS
+        self.user_slots = _UserSlots(per_user or JUDGE_ASYNC_PER_USER)
+        self.client = None
+        self.loop = None
+        self.inflight = set()
+        # kombu không thread-safe: ack / reject được thực hiện ở thread consumer
+        self.acks = queue.SimpleQueue()
+        self.stopping = threading.Event()
+        self.stop_requested = None
+        self.drained = threading.Event()
+
+    # ------------------------------
+    # Consumer thread (kombu)
+    # ------------------------------
+    def _flush_acks(self):
+        while True:
+            try:
+                message, ok = self.acks.get_nowait()
+            except queue.Empty:
+                return
+            if ok:
+                message.ack()
+            else:
+                message.reject(requeue=True)
+
+    def _on_message(self, body, message):
+        if message.headers.get("task") != judge_task.name:
+            logger.warning(f"⚠️ [ASYNC JUDGE] Unexpected task {message.headers.get('task')}, requeue")
+            message.reject(requeue=True)
+            return
+
+        if isinstance(body, (list, tuple)):
+            args, kwargs = body[0], body[1]
+        else:
+            args, kwargs = body.get("args", []), body.get("kwargs", {})
+        self.loop.call_soon_threadsafe(self._start, args[0], kwargs, message)
+
+    def _consume(self):
+        with app.connection_for_read() as conn:
+            with Consumer(
+                conn,
+                queues=[app.amqp.queues[name] for name in scheduler.JUDGE_QUEUES.values()],
+                callbacks=[self._on_message],
+                accept=["json"],
+                prefetch_count=self.concurrency,
+            ):
+                logger.info(
+                    f"🚀 [ASYNC JUDGE] Consuming {', '.join(scheduler.JUDGE_QUEUES.values())} "
+                    f"(max {self.concurrency} submissions)"
+                )
+                while not self.stopping.is_set():
+                    self._flush_acks()
+                    try:
+                        conn.drain_events(timeout=1)
+                    except socket.timeout:
+                        pass
+
+                # Ngừng nhận message mới, chờ các submission đang chấm để ack nốt
+                while not self.drained.wait(0.2):
+                    self._flush_acks()
+                self._flush_acks()
+
+    # ------------------------------
+    # Event loop
+    # ------------------------------
+    def _start(self, submission_id, kwargs, message):
+        task = self.loop.create_task(self._handle(submission_id, kwargs, message))
+        self.inflight.add(task)
+        task.add_done_callback(self.inflight.discard)
+
+    async def _handle(self, submission_id, kwargs, message):
+        ok = True
+        try:
+            await self.judge(submission_id, **kwargs)
+        except asyncio.CancelledError:
+            ok = False
+            raise
+        finally:
+            self.acks.put((message, ok))
+
+    async def judge(self, submission_id, priority=None, enqueued_at=None):
+        await sync_to_async(scheduler.record_wait, thread_sensitive=False)(priority, enqueued_at)
+
+        try:
+            submission, testcases = await sync_to_async(start_judging)(submission_id, priority)
+            progress = ProgressReporter.for_loop(submission, testcases, self.loop)
+
+            try:
+                async with self.user_slots.acquire(submission.user_id):
+                    details = await run_testcases_async(
+                        submission, testcases, self.client,
+                        fail_fast=is_fail_fast(submission.problem),
+                        progress=progress,
+                        cancelled=judging_cancel_check(submission, priority),
+                    )
+            except CompilationError as e:
+                await sync_to_async(finish_judging)(submission, testcases, compilation_error=e.output)
+            else:
+                progress.flush()
+                await sync_to_async(finish_judging)(submission, testcases, details)
+
+        except JudgingCancelled:
+            await sync_to_async(cancel_judging)(submission_id)
+        except Submission.DoesNotExist:
+            logger.error(f"Submission {submission_id} not found.")
+        except Exception as e:
+            logger.error(f"Judge task failed: {e}", exc_info=True)
+            await sync_to_async(mark_judging_failed)(submission_id)
+
+    def _stop(self):
+        self.stopping.set()
+        self.stop_requested.set()
+
+    def _push_stats(self, stats, inflight):
+        metrics.gauge("judge.async.inflight", inflight)
+        for name, value in stats.items():
+            metrics.incr(name, value)
+
+    async def _flush_stats(self):
+        stats, self.client.stats = self.client.stats, Counter()
+        await sync_to_async(self._push_stats, thread_sensitive=False)(stats, len(self.inflight))
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_requested = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self._stop)
+
+        async with AsyncJudge0Client() as client:
+            self.client = client
+            consumer = threading.Thread(target=self._consume, name="judge-consumer", daemon=True)
+            consumer.start()
+
+            try:
+                while not self.stop_requested.is_set() and consumer.is_alive():
+                    try:
+                        await asyncio.wait_for(self.stop_requested.wait(), STATS_FLUSH_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    await self._flush_stats()
+            finally:
+                self.stopping.set()
+                logger.info(f"🛑 [ASYNC JUDGE] Stopping, waiting for {len(self.inflight)} submissions")
+                if self.inflight:
+                    await asyncio.gather(*self.inflight, return_exceptions=True)
+                self.drained.set()
+                await asyncio.to_thread(consumer.join)
+                await self._flush_stats()
@@ -0,0 +1,314 @@
+"""
+Chấm bằng callback của Judge0 (JUDGE_MODE = "callback").
+
+judge_task gửi mọi test lên Judge0 kèm callback_url (đã ký) rồi kết thúc ngay,
+không giữ worker trong lúc code chạy. Judge0 PUT kết quả từng test về
+judge0_callback_view; kết quả được gom trong Redis theo từng lần dispatch (run):
+
+    judgecb:{id}:{run}:meta      hash: danh sách test, fail_fast, cache key, lỗi build...
+    judgecb:{id}:{run}:results   hash: testcase_id -> detail (HSETNX, callback lặp lại bị bỏ qua)
+    judgecb:{id}:{run}:pending   số test còn chờ callback
+    judgecb:{id}:{run}:lock      SETNX, chỉ một process chốt kết quả
+
+run id nằm trong token (đã ký) của callback_url và trong tham số của
+expire_callback_judging, nên rejudge cùng submission có state riêng: callback trễ
+hay expire task của lần chấm trước không chạm tới lần chấm mới.
+
+Callback cuối cùng (hoặc test sai đầu tiên khi fail-fast, hoặc lỗi build) chốt
+kết quả bằng finish_judging. Task expire_callback_judging chốt các submission
+bị thiếu callback sau JUDGE_CALLBACK_TIMEOUT giây. Callback về khi trận đã
+phân định thì submission bị hủy (cancel_judging), các callback sau bị bỏ qua.
+"""
+import json
+import logging
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from code_battle_api.judge0_service import submit_with_callbacks
+from code_battle_api.redis_client import get_redis
+from problems.models import TestCase
+
+from . import result_cache
+from . import scheduler
+from . import tasks as judge_tasks
+from .models import Submission
+from .progress import JUDGE_PROGRESS_INTERVAL, compact_result, progress_message, testcase_numbers
+from .services import (
+    COMPILATION_ERROR_STATUS,
+    CompilationError,
+    build_detail,
+    case_payload,
+    is_fail_fast,
+    lookup_cached,
+    skipped_detail,
+)
+
+logger = logging.getLogger(__name__)
+
+JUDGE0_CALLBACK_BASE_URL = getattr(settings, "JUDGE0_CALLBACK_BASE_URL", "http://backend:8000")
+JUDGE_CALLBACK_TIMEOUT = getattr(settings, "JUDGE_CALLBACK_TIMEOUT", 120)
+
+SIGNING_SALT = "submissions.judge0-callback"
+# Giữ state lâu hơn timeout để expire task luôn còn thấy dữ liệu
+STATE_TTL = JUDGE_CALLBACK_TIMEOUT * 2
+
+
+# KEYS: meta, results, pending | ARGV: testcase_id, detail, ttl, compile_failed, compile_output
+# Ghi kết quả chỉ khi meta còn (chưa chốt / hết hạn) và test chưa có kết quả, trong
+# cùng một bước với DECR, nên callback trễ / lặp lại không tạo lại key sau _clear.
+# Trả về nil nếu không còn chờ callback, {0} nếu test đã có kết quả, {1, pending} nếu ghi mới.
+RECORD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+if redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2]) == 0 then
+    return {0}
+end
+if ARGV[4] == '1' then
+    redis.call('HSETNX', KEYS[1], 'compilation_error', ARGV[5])
+end
+local pending = redis.call('DECR', KEYS[3])
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[3])
+end
+return {1, pending}
+"""
+
+
+def _key(submission_id, run_id, part):
+    return f"judgecb:{submission_id}:{run_id}:{part}"
+
+
+# ------------------------------
+# Callback URL (ký bằng SECRET_KEY)
+# ------------------------------
+def callback_url(submission_id, run_id, testcase_id):
+    token = signing.dumps([submission_id, run_id, testcase_id], salt=SIGNING_SALT)
+    return JUDGE0_CALLBACK_BASE_URL.rstrip("/") + reverse("judge0-callback", args=[token])
+
+
+def parse_token(token):
+    """Trả về (submission_id, run_id, testcase_id); raise signing.BadSignature nếu token sai / hết hạn."""
+    try:
+        submission_id, run_id, testcase_id = signing.loads(token, salt=SIGNING_SALT, max_age=STATE_TTL)
+    except (TypeError, ValueError):
+        raise signing.BadSignature("Malformed callback token")
+    return submission_id, run_id, testcase_id
+
+
+# ------------------------------
+# Dispatch
+# ------------------------------
+def dispatch(submission, testcases, cancellable=True):
+    """
+    Gửi các test chưa có trong result_cache lên Judge0 và trả về ngay.
+    Nếu không còn test nào cần chạy thì chốt kết quả luôn.
+    `cancellable`: hủy khi trận phân định trong lúc chờ callback (không áp dụng cho rejudge).
+    """
+    fail_fast = is_fail_fast(submission.problem)
+
+    try:
+        keys, details = lookup_cached(submission, testcases)
+    except CompilationError as e:
+        judge_tasks.finish_judging(submission, testcases, compilation_error=e.output)
+        return
+
+    to_run = [tc for tc in testcases if tc.id not in details]
+    cached_failure = any(d["status"] != "ACCEPTED" for d in details.values())
+
+    if not to_run or (fail_fast and cached_failure):
+        judge_tasks.finish_judging(
+            submission, testcases, [details.get(tc.id) or skipped_detail(tc) for tc in testcases]
+        )
+        return
+
+    run_id = uuid.uuid4().hex
+    r = get_redis()
+    pipe = r.pipeline()
+    pipe.hset(_key(submission.id, run_id, "meta"), mapping={
+        "match_id": submission.match_id,
+        "problem_id": submission.problem_id,
+        "username": submission.user.username,
+        "testcases": json.dumps([tc.id for tc in testcases]),
+        "keys": json.dumps({str(tc_id): key for tc_id, key in keys.items()}),
+        "fail_fast": int(fail_fast),
+        "cancellable": int(cancellable),
+    })
+    if details:
+        pipe.hset(_key(submission.id, run_id, "results"), mapping={
+            str(tc_id): json.dumps(detail) for tc_id, detail in details.items()
+        })
+    pipe.set(_key(submission.id, run_id, "pending"), len(to_run))
+    for part in ("meta", "results", "pending"):
+        pipe.expire(_key(submission.id, run_id, part), STATE_TTL)
+    pipe.execute()
+
+    judge_tasks.expire_callback_judging.apply_async(
+        (submission.id, run_id), countdown=JUDGE_CALLBACK_TIMEOUT
+    )
+
+    tokens = submit_with_callbacks(
+        submission.source_code,
+        submission.language,
+        [{**case_payload(tc), "callback_url": callback_url(submission.id, run_id, tc.id)} for tc in to_run],
+    )
+
+    logger.info(
+        f"📨 [JUDGE] Submission {submission.id}: {len(to_run)} tests sent to Judge0 (callback mode)"
+    )
+
+    # Test không gửi được thì ghi lỗi ngay, như một callback thất bại
+    for tc, token in zip(to_run, tokens):
+        if token is None:
+            record_result(submission.id, run_id, tc.id, {
+                "status": {"description": "Error submitting to Judge0"},
+            })
+
+
+# ------------------------------
+# Callback handling
+# ------------------------------
+def record_result(submission_id, run_id, testcase_id, result):
+    """
+    Ghi kết quả một test từ callback. Trả về False nếu lần chấm `run_id` không
+    còn chờ callback (đã chốt / hết hạn / callback lạ).
+    """
+    r = get_redis()
+    meta = r.hgetall(_key(submission_id, run_id, "meta"))
+    if not meta or testcase_id not in json.loads(meta["testcases"]):
+        return False
+
+    tc = TestCase.objects.filter(id=testcase_id).first()
+    if tc is None:
+        return False
+
+    if meta.get("cancellable") == "1" and scheduler.match_decided(meta["match_id"]):
+        cancel(submission_id, run_id)
+        return False
+
+    cache_key = json.loads(meta["keys"]).get(str(testcase_id))
+    result_cache.put(cache_key, int(meta["problem_id"]), result)
+
+    detail = build_detail(tc, result)
+    status_id = (result.get("status") or {}).get("id")
+    compile_failed = status_id == COMPILATION_ERROR_STATUS
+
+    recorded = r.register_script(RECORD_SCRIPT)(
+        keys=[_key(submission_id, run_id, part) for part in ("meta", "results", "pending")],
+        args=[
+            testcase_id, json.dumps(detail), STATE_TTL,
+            int(compile_failed), result.get("compile_output") or "",
+        ],
+    )
+    if recorded is None:
+        # Đã chốt / hết hạn giữa lúc đọc meta và lúc ghi
+        return False
+    if not recorded[0]:
+        return True
+
+    pending = recorded[1]
+    failed_fast = meta["fail_fast"] == "1" and detail["status"] != "ACCEPTED"
+
+    if pending <= 0 or compile_failed or failed_fast:
+        finalize(submission_id, run_id)
+    else:
+        _send_progress(submission_id, run_id, meta)
+    return True
+
+
+def _send_progress(submission_id, run_id, meta):
+    r = get_redis()
+    # Tối đa một event mỗi JUDGE_PROGRESS_INTERVAL giây cho một submission
+    if not r.set(_key(submission_id, run_id, "progress"), 1, nx=True, px=int(JUDGE_PROGRESS_INTERVAL * 1000)):
+        return
+
+    testcase_ids = json.loads(meta["testcases"])
+    numbers = testcase_numbers(testcase_ids)
+    details = [json.loads(d) for d in r.hvals(_key(submission_id, run_id, "results"))]
+    results = [{**compact_result(d), "number": numbers.get(d["testcase_id"])} for d in details]
+
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            f"match_{meta['match_id']}",
+            progress_message(submission_id, meta["username"], len(testcase_ids), len(results), results),
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ [JUDGE] Progress event for submission {submission_id} failed: {e}")
+
+
+def _clear(submission_id, run_id):
+    """Lấy quyền chốt (SETNX lock) và xóa state của lần chấm; trả về (meta, results) hoặc None."""
+    r = get_redis()
+    if not r.set(_key(submission_id, run_id, "lock"), 1, nx=True, ex=STATE_TTL):
+        return None
+
+    pipe = r.pipeline()
+    pipe.hgetall(_key(submission_id, run_id, "meta"))
+    pipe.hgetall(_key(submission_id, run_id, "results"))
+    pipe.delete(*(
+        _key(submission_id, run_id, part) for part in ("meta", "results", "pending", "progress")
+    ))
+    meta, results, _ = pipe.execute()
+    if not meta:
+        return None
+    return meta, results
+
+
+def cancel(submission_id, run_id):
+    """Trận đã phân định: bỏ các callback còn lại và hủy submission."""
+    if _clear(submission_id, run_id) is None:
+        return False
+    judge_tasks.cancel_judging(submission_id)
+    return True
+
+
+def finalize(submission_id, run_id, timed_out=False):
+    """
+    Chốt kết quả từ các callback đã nhận. Test chưa có callback là SKIPPED
+    (dừng sớm) hoặc lỗi timeout (`timed_out`). Chỉ chạy một lần cho mỗi lần chấm.
+    """
+    state = _clear(submission_id, run_id)
+    if state is None:
+        return False
+    meta, results = state
+
+    try:
+        submission = Submission.objects.select_related(
+            "match", "user", "problem"
+        ).get(pk=submission_id)
+
+        testcase_ids = json.loads(meta["testcases"])
+        by_id = TestCase.objects.in_bulk(testcase_ids)
+        testcases = [by_id[tc_id] for tc_id in testcase_ids if tc_id in by_id]
+
+        if "compilation_error" in meta:
+            judge_tasks.finish_judging(submission, testcases, compilation_error=meta["compilation_error"])
+            return True
+
+        details = []
+        for tc in testcases:
+            if str(tc.id) in results:
+                details.append(json.loads(results[str(tc.id)]))
+            elif timed_out:
+                details.append(build_detail(tc, {"status": {"description": "Judge0 callback timeout"}}))
+            else:
+                details.append(skipped_detail(tc))
+
+        if timed_out:
+            logger.warning(
+                f"⏱️ [JUDGE] Submission {submission_id}: "
+                f"{len(testcases) - len(results)} callbacks missing after {JUDGE_CALLBACK_TIMEOUT}s"
+            )
+
+        judge_tasks.finish_judging(submission, testcases, details)
+        return True
+
+    except Exception as e:
+        logger.error(f"Judge callback finalize failed: {e}", exc_info=True)
+        judge_tasks.mark_judging_failed(submission_id)
+        return False
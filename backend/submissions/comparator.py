@@ -0,0 +1,135 @@
+"""
+So sánh output của bài nộp với expected output theo chế độ của từng test case.
+
+    exact       giống hệt; nếu ignore_trailing_whitespace thì bỏ khoảng trắng / dòng
+                trống ở đầu output, khoảng trắng cuối mỗi dòng và các dòng trống ở cuối
+    whitespace  so từng token, mọi khác biệt về khoảng trắng / xuống dòng bị bỏ qua
+    float       như whitespace, token số so với sai số tuyệt đối hoặc tương đối `tolerance`
+
+Đầu vào là bytes-like (bytes, mmap của test lưu trên đĩa...). Phần đầu giống hệt
+nhau được so theo từng block (memcmp), từ chỗ khác nhau đầu tiên mới duyệt tuần tự
+từng dòng / token trên buffer gốc. Không tạo bản copy đã strip / split của cả output:
+thời gian tuyến tính, bộ nhớ thêm chỉ bằng một dòng / token.
+"""
+import math
+import re
+
+EXACT = "exact"
+WHITESPACE = "whitespace"
+FLOAT = "float"
+MODES = (EXACT, WHITESPACE, FLOAT)
+
+DEFAULT_TOLERANCE = 1e-6
+
+TOKEN = re.compile(rb"\S+")
+SPACES = b" \t\n\r\x0b\x0c"
+LEADING_SPACES = re.compile(rb"[ \t\n\r\x0b\x0c]*")
+TRAILING_SPACES = b" \t\r\x0b\x0c"
+BLOCK_SIZE = 64 * 1024
+
+
+def compare(expected, actual, mode=EXACT, ignore_trailing_whitespace=True, tolerance=DEFAULT_TOLERANCE):
+    if mode == WHITESPACE:
+        return _compare_tokens(expected, actual, None)
+    if mode == FLOAT:
+        return _compare_tokens(expected, actual, tolerance)
+    if not ignore_trailing_whitespace:
+        if len(expected) != len(actual):
+            return False
+        with memoryview(expected) as exp_view, memoryview(actual) as act_view:
+            return exp_view == act_view
+    return _compare_lines(expected, actual)
+
+
+def _equal_prefix(exp_view, act_view):
+    """Số byte đầu giống nhau, tính theo block (có thể nhỏ hơn prefix chung thật)."""
+    size = min(len(exp_view), len(act_view))
+    pos = 0
+    while pos < size:
+        end = min(pos + BLOCK_SIZE, size)
+        if exp_view[pos:end] != act_view[pos:end]:
+            break
+        pos = end
+    return pos
+
+
+# ------------------------------
+# exact (bỏ khoảng trắng cuối dòng)
+# ------------------------------
+def _lines(data, pos=0):
+    """(start, end) của từng dòng từ vị trí `pos`, end đã bỏ khoảng trắng cuối dòng."""
+    size = len(data)
+    while pos < size:
+        newline = data.find(b"\n", pos)
+        if newline < 0:
+            newline = size
+        end = newline
+        while end > pos and data[end - 1] in TRAILING_SPACES:
+            end -= 1
+        yield pos, end
+        pos = newline + 1
+
+
+def _compare_lines(expected, actual):
+    # Khoảng trắng / dòng trống ở đầu output không tính (như strip() trước đây)
+    exp_begin = LEADING_SPACES.match(expected).end()
+    act_begin = LEADING_SPACES.match(actual).end()
+    with memoryview(expected) as exp_view, memoryview(actual) as act_view:
+        # Các dòng nằm trọn trong phần giống hệt nhau không cần so lại
+        prefix = _equal_prefix(exp_view[exp_begin:], act_view[act_begin:])
+        skipped = expected.rfind(b"\n", exp_begin, exp_begin + prefix) + 1
+        if skipped:
+            skipped -= exp_begin
+        exp_lines = _lines(expected, exp_begin + skipped)
+        act_lines = _lines(actual, act_begin + skipped)
+        for exp_line in exp_lines:
+            act_line = next(act_lines, None)
+            if act_line is None:
+                # actual hết trước: phần còn lại của expected chỉ được là dòng trống
+                return _only_blank(exp_lines, exp_line)
+            (es, ee), (as_, ae) = exp_line, act_line
+            if ee - es != ae - as_ or exp_view[es:ee] != act_view[as_:ae]:
+                return False
+        return _only_blank(act_lines)
+
+
+def _only_blank(lines, first=None):
+    if first is not None and first[1] > first[0]:
+        return False
+    return all(end == start for start, end in lines)
+
+
+# ------------------------------
+# whitespace / float
+# ------------------------------
+def _compare_tokens(expected, actual, tolerance):
+    with memoryview(expected) as exp_view, memoryview(actual) as act_view:
+        start = _equal_prefix(exp_view, act_view)
+    # Lùi về khoảng trắng gần nhất: token cắt ngang ranh giới được so lại từ đầu
+    while start > 0 and expected[start - 1] not in SPACES:
+        start -= 1
+
+    exp_tokens, act_tokens = TOKEN.finditer(expected, start), TOKEN.finditer(actual, start)
+    for exp_match in exp_tokens:
+        act_match = next(act_tokens, None)
+        if act_match is None:
+            return False
+        exp_token, act_token = exp_match.group(), act_match.group()
+        if exp_token == act_token:
+            continue
+        if tolerance is None or not _close(exp_token, act_token, tolerance):
+            return False
+    return next(act_tokens, None) is None
+
+
+def _close(expected, actual, tolerance):
+    try:
+        exp_value, act_value = float(expected), float(actual)
+    except ValueError:
+        return False
+    if math.isnan(exp_value) or math.isnan(act_value):
+        return False
+    if math.isinf(exp_value) or math.isinf(act_value):
+        return exp_value == act_value
+    diff = abs(exp_value - act_value)
+    return diff <= tolerance or diff <= tolerance * abs(exp_value)
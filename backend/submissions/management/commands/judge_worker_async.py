@@ -0,0 +1,30 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from code_battle_api.executors import get_executor
+from submissions.async_worker import AsyncJudgeWorker
+
+
+class Command(BaseCommand):
+    help = "Chạy judge worker asyncio: chấm nhiều submission đồng thời trong một process."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=None,
+            help="Số submission chấm đồng thời (mặc định JUDGE_ASYNC_MAX_SUBMISSIONS)",
+        )
+        parser.add_argument(
+            "--per-user", type=int, default=None,
+            help="Số submission của một user chấm đồng thời (mặc định JUDGE_ASYNC_PER_USER)",
+        )
+
+    def handle(self, *args, **options):
+        if get_executor().name != "judge0":
+            raise CommandError("judge_worker_async chỉ hỗ trợ JUDGE_EXECUTOR=judge0")
+
+        worker = AsyncJudgeWorker(
+            concurrency=options["concurrency"],
+            per_user=options["per_user"],
+        )
+        asyncio.run(worker.run())
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from submissions import scheduler
+from submissions.models import Submission
+
+
+class Command(BaseCommand):
+    help = "Chấm lại submission qua queue rejudge (ưu tiên thấp nhất, không chặn các trận đang diễn ra)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--submission", type=int, nargs="+", default=None, help="ID submission")
+        parser.add_argument("--problem", type=int, default=None, help="Mọi submission của bài này")
+        parser.add_argument("--match", type=int, default=None, help="Mọi submission của trận này")
+        parser.add_argument(
+            "--status", choices=Submission.SubmissionStatus.values, default=None,
+            help="Chỉ chấm lại submission đang có trạng thái này",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm, không chấm lại")
+
+    def handle(self, *args, **options):
+        filters = {}
+        if options["submission"]:
+            filters["pk__in"] = options["submission"]
+        if options["problem"]:
+            filters["problem_id"] = options["problem"]
+        if options["match"]:
+            filters["match_id"] = options["match"]
+        if not filters:
+            raise CommandError("Cần ít nhất một trong --submission / --problem / --match")
+        if options["status"]:
+            filters["status"] = options["status"]
+
+        submissions = Submission.objects.filter(**filters).exclude(
+            status__in=[Submission.SubmissionStatus.PENDING, Submission.SubmissionStatus.JUDGING]
+        )
+        ids = list(submissions.order_by("pk").values_list("pk", flat=True))
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(ids)} submission sẽ được chấm lại")
+            return
+
+        Submission.objects.filter(pk__in=ids).update(status=Submission.SubmissionStatus.PENDING)
+        queued = Submission.objects.filter(pk__in=ids).only("pk", "user_id").order_by("pk")
+        for submission in queued.iterator():
+            scheduler.enqueue(submission, priority=scheduler.REJUDGE)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã đưa {len(ids)} submission vào queue {scheduler.JUDGE_QUEUES[scheduler.REJUDGE]}"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0002_alter_submission_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='detailed_results',
+            field=models.JSONField(blank=True, help_text='Kết quả chi tiết từng test case (tham chiếu test case, output rút gọn), xem submissions/results.py', null=True),
+        ),
+    ]
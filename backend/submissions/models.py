@@ -20,6 +20,7 @@ class Submission(models.Model):
         COMPILATION_ERROR = 'COMPILATION_ERROR', 'Compilation Error'
         RUNTIME_ERROR = 'RUNTIME_ERROR', 'Runtime Error'
         FAILED = 'FAILED', 'Failed'  # Thêm cho case tổng hợp (có lỗi hoặc sai bất kỳ test)
+        CANCELLED = 'CANCELLED', 'Cancelled'  # Trận đã phân định trước khi chấm xong
 
     # Liên kết
     match = models.ForeignKey(
@@ -57,7 +58,7 @@ class Submission(models.Model):
     detailed_results = models.JSONField(
         null=True,
         blank=True,
-        help_text="Kết quả chi tiết từng test case (input, output, expected, status)",
+        help_text="Kết quả chi tiết từng test case (tham chiếu test case, output rút gọn), xem submissions/results.py",
     )
 
     # Lỗi biên dịch (nếu có)
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Khoảng cách tối thiểu (giây) giữa hai event submission_progress của một submission
+JUDGE_PROGRESS_INTERVAL = getattr(settings, "JUDGE_PROGRESS_INTERVAL", 0.3)
+
+
+def compact_result(detail):
+    """Kết quả rút gọn của một test để stream / broadcast (không kèm input / output)."""
+    return {
+        "testcase_id": detail["testcase_id"],
+        "status": detail["status"],
+        "exec_time": detail["exec_time"],
+        "memory": detail["memory"],
+    }
+
+
+def testcase_numbers(testcase_ids):
+    """Số thứ tự hiển thị theo testcase_id, giống thứ tự của kết quả cuối cùng."""
+    return {tc_id: i for i, tc_id in enumerate(sorted(testcase_ids), 1)}
+
+
+def progress_message(submission_id, username, total, completed, results):
+    return {
+        "type": "submission_progress",
+        "payload": {
+            "submission_id": submission_id,
+            "username": username,
+            "total": total,
+            "completed": completed,
+            "results": results,
+        },
+    }
+
+
+class ProgressReporter:
+    """
+    Gom kết quả từng test và gửi event "submission_progress" tới match_{id}.
+
+    Mỗi submission gửi tối đa một event mỗi JUDGE_PROGRESS_INTERVAL giây;
+    kết quả đến sớm hơn được gom lại và gửi bởi timer hoặc lần report kế tiếp.
+    report() an toàn khi gọi từ nhiều thread (mode parallel).
+    """
+
+    def __init__(self, submission, testcases, send=None, interval=JUDGE_PROGRESS_INTERVAL):
+        self.room = f"match_{submission.match_id}"
+        self.submission_id = submission.id
+        self.username = submission.user.username
+        self.total = len(testcases)
+        self.numbers = testcase_numbers(tc.id for tc in testcases)
+        self.interval = interval
+        self.send = send or self._send_sync
+        self.lock = threading.Lock()
+        self.pending = []
+        self.completed = 0
+        self.last_sent = 0.0
+        self.timer = None
+
+    @classmethod
+    def for_loop(cls, submission, testcases, loop):
+        """Reporter cho judge worker asyncio: group_send được lập lịch trên `loop`."""
+        channel_layer = get_channel_layer()
+
+        def send(room, message):
+            asyncio.run_coroutine_threadsafe(channel_layer.group_send(room, message), loop)
+
+        return cls(submission, testcases, send=send)
+
+    @staticmethod
+    def _send_sync(room, message):
+        async_to_sync(get_channel_layer().group_send)(room, message)
+
+    def report(self, detail):
+        with self.lock:
+            self.pending.append({
+                **compact_result(detail),
+                "number": self.numbers.get(detail["testcase_id"]),
+            })
+            self.completed += 1
+
+            wait = self.last_sent + self.interval - time.monotonic()
+            if wait > 0:
+                if self.timer is None:
+                    self.timer = threading.Timer(wait, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            batch = self._take()
+
+        self._emit(*batch)
+
+    def report_many(self, details):
+        for detail in details:
+            self.report(detail)
+
+    def flush(self):
+        """Gửi ngay các kết quả đang gom (gọi bởi timer và khi chấm xong)."""
+        with self.lock:
+            if not self.pending:
+                return
+            batch = self._take()
+        self._emit(*batch)
+
+    def _take(self):
+        # Gọi khi đang giữ self.lock
+        results, self.pending = self.pending, []
+        self.last_sent = time.monotonic()
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return results, self.completed
+
+    def _emit(self, results, completed):
+        try:
+            self.send(self.room, progress_message(
+                self.submission_id, self.username, self.total, completed, results
+            ))
+        except Exception as e:
+            logger.warning(f"⚠️ [JUDGE] Progress event for submission {self.submission_id} failed: {e}")
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+from code_battle_api import metrics
+from code_battle_api.judge0_service import resolve_language_id
+from code_battle_api.redis_client import get_redis
+from problems import testdata
+
+logger = logging.getLogger(__name__)
+
+JUDGE_CACHE_ENABLED = getattr(settings, "JUDGE_CACHE_ENABLED", True)
+JUDGE_CACHE_TTL = getattr(settings, "JUDGE_CACHE_TTL", 3600)
+JUDGE_CACHE_MAX_ENTRIES = getattr(settings, "JUDGE_CACHE_MAX_ENTRIES", 50000)
+
+# Chỉ cache verdict ổn định: Accepted, Wrong Answer, Compilation Error.
+# TLE / Runtime Error / lỗi Judge0 có thể khác nhau giữa các lần chạy.
+CACHEABLE_STATUS_IDS = (3, 4, 6)
+MAX_CACHED_OUTPUT = 64 * 1024
+
+ENTRY_KEY = "judgecache:e:{}"
+PROBLEM_KEY = "judgecache:p:{}"
+LRU_KEY = "judgecache:lru"
+
+
+def normalize_source(source_code):
+    """
+    Chỉ bỏ khác biệt do editor / OS: CRLF và dòng trống cuối file. Khoảng trắng
+    trong dòng giữ nguyên (string literal, thụt lề... có thể đổi nghĩa chương trình).
+    """
+    return (source_code or "").replace("\r\n", "\n").rstrip("\n")
+
+
+def _sha256(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def testcase_hash(tc):
+    # Hash nội dung đã lưu sẵn trong row, không phải đọc dữ liệu test
+    if tc.input_hash and tc.output_hash:
+        return _sha256(tc.input_hash, tc.output_hash)
+    return _sha256(
+        testdata.digest(testdata.encode(tc.input_data)),
+        testdata.digest(testdata.encode(tc.expected_output)),
+    )
+
+
+def make_keys(submission, testcases):
+    """
+    Key của từng test case (theo tc.id):
+    hash(source chuẩn hoá, language id, nội dung test, time/memory limit).
+    """
+    if not JUDGE_CACHE_ENABLED:
+        return {}
+
+    problem = submission.problem
+    source_digest = _sha256(normalize_source(submission.source_code))
+    language_id = resolve_language_id(submission.language)
+
+    return {
+        tc.id: _sha256(
+            source_digest, language_id, testcase_hash(tc),
+            problem.time_limit, problem.memory_limit,
+        )
+        for tc in testcases
+    }
+
+
+def get_many(keys):
+    """Trả về dict {key: result Judge0} cho các key có trong cache."""
+    keys = list(keys)
+    if not keys:
+        return {}
+
+    try:
+        client = get_redis()
+        values = client.mget([ENTRY_KEY.format(k) for k in keys])
+        found = {k: json.loads(v) for k, v in zip(keys, values) if v is not None}
+
+        if found:
+            now = time.time()
+            client.zadd(LRU_KEY, {k: now for k in found})
+    except redis.RedisError as e:
+        logger.debug(f"judge cache get failed: {e}")
+        found = {}
+
+    metrics.incr("judge.cache.hit", len(found))
+    metrics.incr("judge.cache.miss", len(keys) - len(found))
+    return found
+
+
+def put(key, problem_id, result):
+    if not key:
+        return
+
+    status_id = (result.get("status") or {}).get("id")
+    if status_id not in CACHEABLE_STATUS_IDS:
+        return
+
+    entry = {
+        "status": result.get("status"),
+        "stdout": result.get("stdout") or "",
+        "stderr": result.get("stderr") or "",
+        "compile_output": result.get("compile_output") or "",
+        "time": result.get("time"),
+        "memory": result.get("memory"),
+    }
+    if len(entry["stdout"]) + len(entry["stderr"]) > MAX_CACHED_OUTPUT:
+        return
+
+    now = time.time()
+    try:
+        client = get_redis()
+        pipe = client.pipeline(transaction=False)
+        pipe.set(ENTRY_KEY.format(key), json.dumps(entry), ex=JUDGE_CACHE_TTL)
+        pipe.sadd(PROBLEM_KEY.format(problem_id), key)
+        pipe.expire(PROBLEM_KEY.format(problem_id), JUDGE_CACHE_TTL)
+        pipe.zadd(LRU_KEY, {key: now})
+        pipe.zremrangebyscore(LRU_KEY, "-inf", now - JUDGE_CACHE_TTL)
+        pipe.zcard(LRU_KEY)
+        size = pipe.execute()[-1]
+
+        # Vượt giới hạn → bỏ các entry lâu nhất chưa dùng (LRU)
+        overflow = size - JUDGE_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            evicted = [k for k, _ in client.zpopmin(LRU_KEY, overflow)]
+            client.delete(*[ENTRY_KEY.format(k) for k in evicted])
+            metrics.incr("judge.cache.evicted", len(evicted))
+    except redis.RedisError as e:
+        logger.debug(f"judge cache put failed: {e}")
+
+
+def invalidate_problem(problem_id):
+    """Xoá toàn bộ kết quả đã cache của một bài (khi test case / limit thay đổi)."""
+    try:
+        client = get_redis()
+        keys = client.smembers(PROBLEM_KEY.format(problem_id))
+        pipe = client.pipeline(transaction=False)
+        if keys:
+            pipe.delete(*[ENTRY_KEY.format(k) for k in keys])
+            pipe.zrem(LRU_KEY, *keys)
+        pipe.delete(PROBLEM_KEY.format(problem_id))
+        pipe.execute()
+        metrics.incr("judge.cache.invalidated", len(keys))
+    except redis.RedisError as e:
+        logger.warning(f"judge cache invalidation for problem {problem_id} failed: {e}")
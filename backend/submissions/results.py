@@ -0,0 +1,76 @@
+"""
+Lưu Submission.detailed_results dạng gọn.
+
+- Mỗi test chỉ giữ testcase_id (tham chiếu TestCase), không copy input / expected output;
+  API mở rộng lại khi cần (SubmissionDetailAPIView ?expand=1).
+- actual_output chỉ giữ JUDGE_RESULT_OUTPUT_PREFIX ký tự đầu ("truncated": true nếu bị cắt).
+- Danh sách kết quả có JSON dài từ JUDGE_RESULT_COMPRESS_MIN byte được nén zlib:
+      {"format": "zlib", "data": "<base64>"}
+
+Row cũ (list đầy đủ input / output) vẫn đọc được bình thường.
+"""
+import base64
+import json
+import zlib
+
+from django.conf import settings
+
+from code_battle_api import metrics
+from problems.models import TestCase
+
+JUDGE_RESULT_OUTPUT_PREFIX = getattr(settings, "JUDGE_RESULT_OUTPUT_PREFIX", 1024)
+JUDGE_RESULT_COMPRESS_MIN = getattr(settings, "JUDGE_RESULT_COMPRESS_MIN", 2048)
+
+ZLIB_FORMAT = "zlib"
+# Các field của row cũ, nay lấy từ TestCase khi expand
+TESTCASE_FIELDS = ("input", "expected_output")
+
+
+def truncate_output(stdout):
+    """Trả về (phần đầu của stdout, có bị cắt không)."""
+    if len(stdout) <= JUDGE_RESULT_OUTPUT_PREFIX:
+        return stdout, False
+    return stdout[:JUDGE_RESULT_OUTPUT_PREFIX], True
+
+
+def pack(details):
+    """Giá trị ghi vào Submission.detailed_results."""
+    raw = json.dumps(details, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) < JUDGE_RESULT_COMPRESS_MIN:
+        metrics.observe("submission.results.bytes", len(raw))
+        return details
+
+    data = base64.b64encode(zlib.compress(raw)).decode("ascii")
+    metrics.observe("submission.results.bytes", len(data))
+    return {"format": ZLIB_FORMAT, "data": data}
+
+
+def unpack(stored):
+    """Danh sách kết quả từng test (không kèm dữ liệu test case)."""
+    if not stored:
+        return []
+    if isinstance(stored, dict) and stored.get("format") == ZLIB_FORMAT:
+        return json.loads(zlib.decompress(base64.b64decode(stored["data"])))
+    return [
+        {key: value for key, value in detail.items() if key not in TESTCASE_FIELDS}
+        for detail in stored
+    ]
+
+
+def expand(details, include_hidden=False):
+    """
+    Gắn input / expected output (phần đầu nếu test lưu trên đĩa) từ TestCase.
+    Test ẩn chỉ được mở rộng cho admin (`include_hidden`).
+    """
+    testcases = TestCase.objects.in_bulk([d["testcase_id"] for d in details])
+    expanded = []
+    for detail in details:
+        tc = testcases.get(detail["testcase_id"])
+        detail = dict(detail)
+        if tc is not None:
+            detail["is_hidden"] = tc.is_hidden
+            if include_hidden or not tc.is_hidden:
+                detail["input"] = tc.preview_input()
+                detail["expected_output"] = tc.preview_output()
+        expanded.append(detail)
+    return expanded
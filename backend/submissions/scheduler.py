@@ -0,0 +1,371 @@
+"""
+Lập lịch chấm: lớp ưu tiên + giới hạn số submission đang chấm của mỗi user.
+
+Lớp ưu tiên (mỗi lớp một Celery queue, worker lấy theo thứ tự ưu tiên):
+    live      submission trong trận đang ACTIVE
+    practice  submission trong trận chưa bắt đầu (PENDING)
+    rejudge   chấm lại hàng loạt (manage.py rejudge)
+
+Fair queuing: mỗi user có tối đa JUDGE_USER_MAX_INFLIGHT submission live / practice
+trong queue hoặc đang chấm. Submission vượt giới hạn nằm trong backlog riêng của user
+(Redis) và chỉ được đẩy vào queue khi một submission của chính user đó chấm xong,
+nên user spam submit không chiếm chỗ trong queue của người khác.
+
+    judge:inflight:{user}          zset submission_id -> thời điểm vào queue
+    judge:backlog:{user}:{class}   list submission chờ (live được lấy trước practice)
+    judge:backlog                  hash class -> số submission đang nằm trong backlog
+
+Rejudge không tính vào giới hạn của user (đã nằm ở queue ưu tiên thấp nhất).
+Metrics: judge.queue.<class>.enqueued / .backlogged / .wait (thời gian từ lúc nộp tới lúc bắt đầu chấm),
+judge.queue.pending (dùng cho admission control, xem submissions/admission.py).
+
+Trận đã phân định (COMPLETED / CANCELLED / CHEATING) không dùng thêm judge nào
+(cancel_match, gọi từ signal post_save của Match):
+    - submission chưa chấm bị gỡ khỏi backlog, task Celery bị revoke, status CANCELLED;
+    - submission đang chấm dừng ở test kế tiếp (cờ judge:decided:{match}).
+Rejudge không bị hủy.
+"""
+import json
+import logging
+import time
+import uuid
+
+import redis
+from django.conf import settings
+
+from code_battle_api import metrics
+from code_battle_api.celery import app
+from code_battle_api.redis_client import get_redis
+from matches.models import Match
+
+from . import tasks as judge_tasks
+from .models import Submission
+
+logger = logging.getLogger(__name__)
+
+LIVE = "live"
+PRACTICE = "practice"
+REJUDGE = "rejudge"
+PRIORITY_CLASSES = (LIVE, PRACTICE, REJUDGE)
+
+JUDGE_QUEUES = getattr(settings, "JUDGE_QUEUES", {
+    LIVE: "judge.live",
+    PRACTICE: "judge.practice",
+    REJUDGE: "judge.rejudge",
+})
+JUDGE_USER_MAX_INFLIGHT = getattr(settings, "JUDGE_USER_MAX_INFLIGHT", 2)
+# Submission "đang chấm" quá lâu (worker chết) không còn giữ chỗ của user
+JUDGE_INFLIGHT_TTL = getattr(settings, "JUDGE_INFLIGHT_TTL", 600)
+# Thời gian giữ cờ "trận đã phân định" và danh sách task của trận trong Redis
+JUDGE_DECIDED_TTL = getattr(settings, "JUDGE_DECIDED_TTL", 3600)
+
+DECIDED_STATUSES = (
+    Match.MatchStatus.COMPLETED,
+    Match.MatchStatus.CANCELLED,
+    Match.MatchStatus.CHEATING,
+)
+
+BACKLOG_COUNT_KEY = "judge:backlog"
+# Tổng số submission live / practice đang chờ, cache ngắn để admission control không
+# phải hỏi broker ở mỗi lần submit
+PENDING_DEPTH_KEY = "judge:pending"
+JUDGE_PENDING_CACHE_MS = getattr(settings, "JUDGE_PENDING_CACHE_MS", 1000)
+
+# KEYS: inflight, backlog của class, backlog count | ARGV: id, now, limit, ttl, entry, class
+# Trả về 0 nếu được vào queue ngay, ngược lại là vị trí trong backlog của user
+ENQUEUE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[2]) - tonumber(ARGV[4]))
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    return 0
+end
+redis.call('RPUSH', KEYS[2], ARGV[5])
+redis.call('HINCRBY', KEYS[3], ARGV[6], 1)
+return redis.call('LLEN', KEYS[2])
+"""
+
+# KEYS: inflight, backlog live, backlog practice, backlog count | ARGV: id ('' = chỉ dọn), now, limit, ttl
+# Trả về các entry backlog vừa được nhận chỗ (live trước practice)
+RELEASE_SCRIPT = """
+if ARGV[1] ~= '' then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[2]) - tonumber(ARGV[4]))
+local released = {}
+for i = 2, 3 do
+    while redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) do
+        local entry = redis.call('LPOP', KEYS[i])
+        if not entry then break end
+        local item = cjson.decode(entry)
+        redis.call('ZADD', KEYS[1], ARGV[2], item['id'])
+        redis.call('HINCRBY', KEYS[4], item['class'], -1)
+        table.insert(released, entry)
+    end
+end
+if #released > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+return released
+"""
+
+_scripts = {}
+
+
+def run_script(source, keys, args):
+    """Chạy Lua script (EVALSHA, SHA được cache theo source) trên Redis dùng chung."""
+    if source not in _scripts:
+        _scripts[source] = get_redis().register_script(source)
+    return _scripts[source](keys=keys, args=args, client=get_redis())
+
+
+def _inflight_key(user_id):
+    return f"judge:inflight:{user_id}"
+
+
+def backlog_key(user_id, priority):
+    """List backlog của user theo lớp ưu tiên (LIVE / PRACTICE), dùng cả bởi admission."""
+    return f"judge:backlog:{user_id}:{priority}"
+
+
+def _drain_key(user_id):
+    return f"judge:drain:{user_id}"
+
+
+def _decided_key(match_id):
+    return f"judge:decided:{match_id}"
+
+
+def _tasks_key(match_id):
+    return f"judge:tasks:{match_id}"
+
+
+def priority_class(submission):
+    if submission.match.status == Match.MatchStatus.ACTIVE:
+        return LIVE
+    return PRACTICE
+
+
+def _dispatch(submission_id, priority, enqueued_at, match_id=None):
+    task_id = str(uuid.uuid4())
+    if match_id is not None:
+        # Lưu task id để revoke khi trận phân định trước lúc task được chạy
+        try:
+            pipe = get_redis().pipeline()
+            pipe.hset(_tasks_key(match_id), submission_id, task_id)
+            pipe.expire(_tasks_key(match_id), JUDGE_DECIDED_TTL)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.debug(f"Track judge task {task_id} failed: {e}")
+
+    judge_tasks.judge_task.apply_async(
+        (submission_id,),
+        {"priority": priority, "enqueued_at": enqueued_at},
+        queue=JUDGE_QUEUES[priority],
+        task_id=task_id,
+    )
+
+
+def enqueue(submission, priority=None):
+    """
+    Đưa submission vào hàng đợi chấm. Trả về 0 nếu đã vào Celery queue,
+    vị trí trong backlog của user nếu user đã đủ JUDGE_USER_MAX_INFLIGHT submission,
+    hoặc None nếu trận đã phân định (submission bị hủy, không chấm).
+    """
+    if priority != REJUDGE and submission.match.status in DECIDED_STATUSES:
+        judge_tasks.cancel_judging(submission.id)
+        return None
+
+    priority = priority or priority_class(submission)
+    now = time.time()
+    metrics.incr(f"judge.queue.{priority}.enqueued")
+
+    if priority == REJUDGE:
+        # Task live / practice cũ của submission (nếu còn) không còn đại diện cho nó
+        try:
+            get_redis().hdel(_tasks_key(submission.match_id), submission.id)
+        except redis.RedisError as e:
+            logger.debug(f"Untrack judge task of {submission.id} failed: {e}")
+        _dispatch(submission.id, priority, now)
+        return 0
+
+    try:
+        position = run_script(
+            ENQUEUE_SCRIPT,
+            keys=[_inflight_key(submission.user_id), backlog_key(submission.user_id, priority), BACKLOG_COUNT_KEY],
+            args=[
+                submission.id, now, JUDGE_USER_MAX_INFLIGHT, JUDGE_INFLIGHT_TTL,
+                json.dumps({"id": submission.id, "match": submission.match_id, "class": priority, "at": now}),
+                priority,
+            ],
+        )
+    except redis.RedisError as e:
+        # Redis lỗi thì vẫn chấm, chỉ mất giới hạn theo user
+        logger.warning(f"⚠️ [JUDGE] Scheduler unavailable, dispatching {submission.id} directly: {e}")
+        position = 0
+
+    if position == 0:
+        _dispatch(submission.id, priority, now, submission.match_id)
+        return 0
+
+    metrics.incr(f"judge.queue.{priority}.backlogged")
+    logger.info(f"⏳ [JUDGE] Submission {submission.id} backlogged ({priority}, position {position})")
+
+    _schedule_drain(submission.user_id)
+    return position
+
+
+def release(user_id, submission_id=None):
+    """
+    Trả chỗ của submission đã chấm xong và đẩy submission kế tiếp trong backlog
+    của user vào queue. submission_id=None: chỉ dọn chỗ đã hết hạn.
+    """
+    try:
+        released = run_script(
+            RELEASE_SCRIPT,
+            keys=[
+                _inflight_key(user_id),
+                backlog_key(user_id, LIVE),
+                backlog_key(user_id, PRACTICE),
+                BACKLOG_COUNT_KEY,
+            ],
+            args=[submission_id or "", time.time(), JUDGE_USER_MAX_INFLIGHT, JUDGE_INFLIGHT_TTL],
+        )
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ [JUDGE] Scheduler release for user {user_id} failed: {e}")
+        return
+
+    for entry in released:
+        item = json.loads(entry)
+        _dispatch(item["id"], item["class"], item["at"], item.get("match"))
+
+
+def _schedule_drain(user_id):
+    # Phòng khi submission đang giữ chỗ không bao giờ báo xong (worker chết):
+    # sau JUDGE_INFLIGHT_TTL chỗ đó hết hạn và backlog được đẩy tiếp
+    if get_redis().set(_drain_key(user_id), 1, nx=True, ex=JUDGE_INFLIGHT_TTL):
+        judge_tasks.drain_judge_backlog.apply_async((user_id,), countdown=JUDGE_INFLIGHT_TTL)
+
+
+def drain(user_id):
+    r = get_redis()
+    r.delete(_drain_key(user_id))
+    release(user_id)
+    if r.llen(backlog_key(user_id, LIVE)) or r.llen(backlog_key(user_id, PRACTICE)):
+        _schedule_drain(user_id)
+
+
+def match_decided(match_id):
+    """Kiểm tra giữa các test: rẻ (một EXISTS), không query DB."""
+    try:
+        return bool(get_redis().exists(_decided_key(match_id)))
+    except redis.RedisError:
+        return False
+
+
+def should_cancel(submission, priority):
+    """Kiểm tra trước khi chấm (submission đã load kèm match)."""
+    if priority == REJUDGE:
+        return False
+    return (
+        submission.status == Submission.SubmissionStatus.CANCELLED
+        or submission.match.status in DECIDED_STATUSES
+    )
+
+
+def cancel_match(match):
+    """
+    Trận đã phân định: dừng mọi submission live / practice còn lại của trận.
+    Chỉ hủy submission scheduler đã ghi nhận (task trong judge:tasks:{match} hoặc
+    nằm trong backlog), submission rejudge của trận không bị đụng tới. Submission
+    live / practice không được ghi nhận (Redis lỗi) bị hủy khi task bắt đầu (should_cancel).
+    """
+    r = get_redis()
+    submission_ids = set()
+    try:
+        pipe = r.pipeline()
+        pipe.set(_decided_key(match.id), 1, ex=JUDGE_DECIDED_TTL)
+        pipe.hgetall(_tasks_key(match.id))
+        pipe.delete(_tasks_key(match.id))
+        _, tasks, _ = pipe.execute()
+        submission_ids.update(int(submission_id) for submission_id in tasks)
+        task_ids = list(tasks.values())
+
+        # Gỡ submission của trận khỏi backlog của hai người chơi
+        for user_id in (match.player1_id, match.player2_id):
+            for priority in (LIVE, PRACTICE):
+                key = backlog_key(user_id, priority)
+                for entry in r.lrange(key, 0, -1):
+                    item = json.loads(entry)
+                    if item.get("match") == match.id and r.lrem(key, 1, entry):
+                        r.hincrby(BACKLOG_COUNT_KEY, priority, -1)
+                        submission_ids.add(item["id"])
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ [JUDGE] Cancel judging for match {match.id} failed: {e}")
+        task_ids = []
+
+    if task_ids:
+        # Worker Celery bỏ qua task đã revoke; judge worker asyncio dựa vào status CANCELLED
+        app.control.revoke(task_ids)
+
+    pending = Submission.objects.filter(
+        pk__in=submission_ids, status=Submission.SubmissionStatus.PENDING
+    ).values_list("pk", flat=True)
+    for submission_id in pending:
+        judge_tasks.cancel_judging(submission_id)
+
+
+def record_wait(priority, enqueued_at):
+    if priority in PRIORITY_CLASSES and enqueued_at:
+        metrics.observe(f"judge.queue.{priority}.wait", max(time.time() - enqueued_at, 0))
+
+
+def queue_stats():
+    """Độ dài Celery queue và backlog của từng lớp ưu tiên."""
+    stats = {}
+    try:
+        backlog = get_redis().hgetall(BACKLOG_COUNT_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"queue_stats: backlog unavailable: {e}")
+        backlog = {}
+
+    with app.connection_for_read() as conn:
+        channel = conn.default_channel
+        for priority in PRIORITY_CLASSES:
+            try:
+                depth = channel.queue_declare(queue=JUDGE_QUEUES[priority], passive=True).message_count
+            except Exception:
+                # Queue chưa từng được tạo (chưa có message nào)
+                depth = 0
+            stats[f"judge.queue.{priority}.depth"] = depth
+            stats[f"judge.queue.{priority}.backlog"] = int(backlog.get(priority, 0))
+    return stats
+
+
+def pending_depth():
+    """Số submission live + practice đang chờ chấm (Celery queue + backlog), rejudge không tính."""
+    r = get_redis()
+    try:
+        cached = r.get(PENDING_DEPTH_KEY)
+        if cached is not None:
+            return int(cached)
+    except redis.RedisError:
+        return 0
+
+    try:
+        stats = queue_stats()
+    except Exception as e:
+        logger.warning(f"⚠️ [JUDGE] Queue depth unavailable: {e}")
+        return 0
+
+    depth = sum(
+        stats[f"judge.queue.{priority}.{kind}"]
+        for priority in (LIVE, PRACTICE)
+        for kind in ("depth", "backlog")
+    )
+    try:
+        r.set(PENDING_DEPTH_KEY, depth, px=JUDGE_PENDING_CACHE_MS)
+    except redis.RedisError:
+        pass
+    metrics.gauge("judge.queue.pending", depth)
+    return depth
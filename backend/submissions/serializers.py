@@ -1,6 +1,7 @@
 # backend/submissions/serializers.py
 from rest_framework import serializers
 from .models import Submission
+from . import results
 
 class SubmissionCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,7 +9,10 @@ class SubmissionCreateSerializer(serializers.ModelSerializer):
         fields = ['match', 'problem', 'language', 'source_code']
 
 class SubmissionResultSerializer(serializers.ModelSerializer):
+    """context["expand"]: gắn input / expected output của test case vào từng kết quả."""
     user = serializers.StringRelatedField(read_only=True)
+    detailed_results = serializers.SerializerMethodField()
+
     class Meta:
         model = Submission
         fields = [
@@ -17,3 +21,10 @@ class SubmissionResultSerializer(serializers.ModelSerializer):
             'test_cases_passed', 'total_test_cases',
             'detailed_results',
         ]
+
+    def get_detailed_results(self, obj):
+        details = results.unpack(obj.detailed_results)
+        if not self.context.get("expand"):
+            return details
+        request = self.context.get("request")
+        return results.expand(details, include_hidden=bool(request and request.user.is_staff))
@@ -0,0 +1,383 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import ExpressionWrapper, F, FloatField
+
+from problems import testdata
+from problems.models import TestCase
+from code_battle_api.executors import get_executor
+from . import comparator, result_cache, results
+
+logger = logging.getLogger(__name__)
+
+JUDGE_MODE = getattr(settings, "JUDGE_MODE", "sequential")
+JUDGE_MAX_PARALLEL_TESTS = getattr(settings, "JUDGE_MAX_PARALLEL_TESTS", 4)
+JUDGE_FAIL_FAST = getattr(settings, "JUDGE_FAIL_FAST", False)
+
+COMPILATION_ERROR_STATUS = 6
+
+
+class CompilationError(Exception):
+    """Source không build được; `output` là compile_output của compiler."""
+
+    def __init__(self, output):
+        super().__init__(output)
+        self.output = output or ""
+
+
+class JudgingCancelled(Exception):
+    """Trận đã phân định trong lúc chấm: dừng, không gửi thêm test nào."""
+
+
+def check_compilation(result):
+    status = result.get("status", {}) or {}
+    if status.get("id") == COMPILATION_ERROR_STATUS:
+        raise CompilationError(result.get("compile_output"))
+
+
+# Tỉ lệ fail (làm trơn Laplace để test mới có tỉ lệ 0.5)
+FAILURE_RATE = ExpressionWrapper(
+    (F("fail_count") + 1.0) / (F("pass_count") + F("fail_count") + 2.0),
+    output_field=FloatField(),
+)
+
+
+def testcases_for_judging(problem):
+    """
+    Thứ tự chạy test: test mẫu trước, sau đó test hay fail nhất trước,
+    để bài sai bị phát hiện sớm. Chỉ đọc counter trên chính các row TestCase.
+    """
+    return list(
+        TestCase.objects.filter(problem=problem).order_by(
+            "is_hidden", FAILURE_RATE.desc(), "id"
+        )
+    )
+
+
+def record_outcomes(details):
+    """Cập nhật pass_count / fail_count của test case (bỏ qua test SKIPPED)."""
+    passed_ids = [d["testcase_id"] for d in details if d["status"] == "ACCEPTED"]
+    failed_ids = [
+        d["testcase_id"] for d in details if d["status"] not in ("ACCEPTED", "SKIPPED")
+    ]
+
+    if passed_ids:
+        TestCase.objects.filter(id__in=passed_ids).update(pass_count=F("pass_count") + 1)
+    if failed_ids:
+        TestCase.objects.filter(id__in=failed_ids).update(fail_count=F("fail_count") + 1)
+
+
+def case_payload(tc):
+    """
+    Dữ liệu gửi executor, đọc lúc test được chạy. Test lưu trên đĩa không gửi
+    expected_output (so sánh tại chỗ qua mmap trong build_detail).
+    """
+    if tc.stored_on_disk:
+        return {"input_data": tc.read_input() + "\n", "expected_output": None}
+    return {
+        "input_data": (tc.input_data or "") + "\n",
+        "expected_output": (tc.expected_output or "").strip(),
+    }
+
+
+def output_matches(tc, stdout):
+    options = {
+        "mode": tc.compare_mode,
+        "ignore_trailing_whitespace": tc.ignore_trailing_whitespace,
+        "tolerance": tc.float_tolerance,
+    }
+    actual = testdata.encode(stdout)
+    if tc.stored_on_disk:
+        with testdata.open_mapped(tc.output_hash) as expected:
+            return comparator.compare(expected, actual, **options)
+    return comparator.compare(testdata.encode(tc.expected_output), actual, **options)
+
+
+def build_detail(tc, result):
+    """
+    Chuyển result của Judge0 thành dict kết quả chi tiết (format của
+    Submission.detailed_results): chỉ tham chiếu test case, stdout bị cắt ngắn.
+    """
+    status = result.get("status", {}) or {}
+    status_id = status.get("id")
+
+    stdout = result.get("stdout") or ""
+    # Accepted / Wrong Answer của executor chỉ có nghĩa là chương trình chạy xong,
+    # kết quả đúng sai do comparator quyết định theo chế độ của test case
+    is_passed = status_id in (3, 4) and output_matches(tc, stdout)
+    stdout, truncated = results.truncate_output(stdout.strip())
+
+    detail = {
+        "testcase_id": tc.id,
+        "actual_output": stdout,
+        "status": "ACCEPTED" if is_passed else "WRONG_ANSWER",
+        "exec_time": float(result.get("time") or 0),
+        "memory": int(result.get("memory") or 0),
+    }
+    if truncated:
+        detail["truncated"] = True
+    return detail
+
+
+def skipped_detail(tc):
+    """Test không được chạy vì submission đã chắc chắn không thể ACCEPTED."""
+    return {
+        "testcase_id": tc.id,
+        "actual_output": "",
+        "status": "SKIPPED",
+        "exec_time": 0,
+        "memory": 0,
+    }
+
+
+def is_fail_fast(problem):
+    """Fail-fast bật cho bài này (Problem.fail_fast) hoặc cho mọi trận (JUDGE_FAIL_FAST)."""
+    return JUDGE_FAIL_FAST or problem.fail_fast
+
+
+def judge_testcase(submission, tc, cache_key=None):
+    """Chạy một test case trên executor đang cấu hình (Judge0 wait=true hoặc local)."""
+    result = get_executor().run(
+        source_code=submission.source_code,
+        language=submission.language,
+        time_limit=submission.problem.time_limit,
+        memory_limit=submission.problem.memory_limit,
+        **case_payload(tc),
+    )
+    result_cache.put(cache_key, submission.problem_id, result)
+    check_compilation(result)
+    return build_detail(tc, result)
+
+
+def _run_sequential(submission, testcases, keys, fail_fast, report, cancelled):
+    details = []
+    for tc in testcases:
+        if cancelled():
+            raise JudgingCancelled()
+        detail = judge_testcase(submission, tc, keys.get(tc.id))
+        details.append(detail)
+        report(detail)
+        if fail_fast and detail["status"] != "ACCEPTED":
+            break
+    return details
+
+
+def _run_parallel(submission, testcases, keys, workers, fail_fast, report, cancelled):
+    """
+    Giữ tối đa `workers` test đang chạy, nhận kết quả theo thứ tự hoàn thành.
+    Khi fail-fast và đã có test sai (hoặc trận đã phân định) thì không gửi thêm test mới.
+    """
+    details = [None] * len(testcases)
+    queue = deque(enumerate(testcases))
+    running = {}
+    stopped = False
+    aborted = False
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while running or (queue and not stopped):
+            if queue and not stopped and cancelled():
+                stopped = aborted = True
+                if not running:
+                    break
+
+            while queue and not stopped and len(running) < workers:
+                index, tc = queue.popleft()
+                running[pool.submit(judge_testcase, submission, tc, keys.get(tc.id))] = index
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                details[index] = future.result()
+                report(details[index])
+                if fail_fast and details[index]["status"] != "ACCEPTED":
+                    stopped = True
+
+    if aborted:
+        raise JudgingCancelled()
+
+    logger.info(
+        f"⚡ [JUDGE] Submission {submission.id}: {len(testcases)} tests "
+        f"judged with {workers} parallel workers"
+    )
+    return details
+
+
+def _run_batch(submission, testcases, keys, fail_fast, report, cancelled):
+    # Fail-fast: gửi từng batch nhỏ, dừng khi batch trước đã có test sai
+    chunk_size = JUDGE_MAX_PARALLEL_TESTS if fail_fast else len(testcases)
+    details = []
+
+    for start in range(0, len(testcases), max(chunk_size, 1)):
+        if cancelled():
+            raise JudgingCancelled()
+        chunk = testcases[start:start + chunk_size]
+        batch = get_executor().run_batch(
+            source_code=submission.source_code,
+            language=submission.language,
+            cases=[case_payload(tc) for tc in chunk],
+            time_limit=submission.problem.time_limit,
+            memory_limit=submission.problem.memory_limit,
+        )
+        for tc, result in zip(chunk, batch):
+            result_cache.put(keys.get(tc.id), submission.problem_id, result)
+            check_compilation(result)
+            details.append(build_detail(tc, result))
+            report(details[-1])
+
+        if fail_fast and any(d["status"] != "ACCEPTED" for d in details):
+            break
+
+    return details
+
+
+def lookup_cached(submission, testcases):
+    """Trả về (keys, details) với details chứa các test đã có verdict trong result_cache."""
+    keys = result_cache.make_keys(submission, testcases)
+    cached = result_cache.get_many(keys.values())
+
+    details = {}
+    for tc in testcases:
+        hit = cached.get(keys.get(tc.id))
+        if hit is not None:
+            check_compilation(hit)
+            details[tc.id] = build_detail(tc, hit)
+    return keys, details
+
+
+def _noop_report(detail):
+    pass
+
+
+def _never_cancelled():
+    return False
+
+
+def run_testcases(submission, testcases, fail_fast=False, progress=None, cancelled=None):
+    """
+    Chấm tất cả test case của một submission.
+
+    - mode "sequential": lần lượt từng test (mặc định).
+    - mode "parallel": gửi đồng thời tối đa JUDGE_MAX_PARALLEL_TESTS test,
+      nhận kết quả theo thứ tự hoàn thành.
+    - mode "batch": gửi toàn bộ test trong một request /submissions/batch
+      rồi poll theo token.
+
+    Với `fail_fast`, ngừng gửi test khi đã có test sai; các test chưa chạy
+    có status "SKIPPED".
+
+    Test đã có verdict trong result_cache (cùng source, ngôn ngữ, test, limit)
+    không được gửi lên Judge0 nữa.
+
+    Source được build một lần cho cả submission (executor.prepare);
+    nếu build lỗi thì raise CompilationError thay vì chấm từng test.
+
+    `progress` (ProgressReporter) nhận kết quả từng test ngay khi có.
+
+    `cancelled()` được kiểm tra trước mỗi test (mỗi batch ở mode "batch");
+    trả về True thì raise JudgingCancelled, các test đang chạy được chạy nốt.
+
+    Kết quả luôn trả về theo đúng thứ tự của `testcases`.
+    """
+    testcases = list(testcases)
+    keys, details = lookup_cached(submission, testcases)
+    report = progress.report if progress else _noop_report
+    cancelled = cancelled or _never_cancelled
+    if progress:
+        progress.report_many(details.values())
+
+    to_run = [tc for tc in testcases if tc.id not in details]
+    cached_failure = any(d["status"] != "ACCEPTED" for d in details.values())
+
+    if to_run and not (fail_fast and cached_failure):
+        workers = min(JUDGE_MAX_PARALLEL_TESTS, len(to_run))
+
+        with get_executor().prepare(submission.source_code, submission.language) as error:
+            if error is not None:
+                for tc in to_run:
+                    result_cache.put(keys.get(tc.id), submission.problem_id, error)
+                check_compilation(error)
+
+            if JUDGE_MODE == "batch":
+                ran = _run_batch(submission, to_run, keys, fail_fast, report, cancelled)
+            elif JUDGE_MODE == "parallel" and workers > 1:
+                ran = _run_parallel(submission, to_run, keys, workers, fail_fast, report, cancelled)
+            else:
+                ran = _run_sequential(submission, to_run, keys, fail_fast, report, cancelled)
+
+        for tc, detail in zip(to_run, ran):
+            if detail is not None:
+                details[tc.id] = detail
+
+    return [details.get(tc.id) or skipped_detail(tc) for tc in testcases]
+
+
+async def run_testcases_async(submission, testcases, client, fail_fast=False, progress=None, cancelled=None):
+    """
+    Phiên bản asyncio của run_testcases cho judge worker asyncio.
+
+    Mỗi test là một coroutine gọi `client` (AsyncJudge0Client); tối đa
+    JUDGE_MAX_PARALLEL_TESTS test của submission chạy cùng lúc. Giới hạn
+    theo host Judge0 nằm trong client. Cache, fail-fast, CompilationError,
+    JudgingCancelled và thứ tự kết quả giống hệt run_testcases.
+    """
+    testcases = list(testcases)
+    keys, details = await sync_to_async(lookup_cached)(submission, testcases)
+    report = progress.report if progress else _noop_report
+    is_cancelled = sync_to_async(cancelled or _never_cancelled, thread_sensitive=False)
+    if progress:
+        progress.report_many(details.values())
+
+    to_run = [tc for tc in testcases if tc.id not in details]
+    cached_failure = any(d["status"] != "ACCEPTED" for d in details.values())
+
+    if to_run and not (fail_fast and cached_failure):
+        limit = asyncio.Semaphore(JUDGE_MAX_PARALLEL_TESTS)
+        stopped = asyncio.Event()
+        aborted = asyncio.Event()
+        errors = []
+        put = sync_to_async(result_cache.put, thread_sensitive=False)
+        # Đọc test (file / mmap) và so output chạy trong thread, không chặn event loop
+        payload = sync_to_async(case_payload, thread_sensitive=False)
+        detail_of = sync_to_async(build_detail, thread_sensitive=False)
+
+        async def judge(tc):
+            async with limit:
+                if stopped.is_set():
+                    return None
+                if await is_cancelled():
+                    aborted.set()
+                    stopped.set()
+                    return None
+                result = await client.run(
+                    submission.source_code, submission.language, **await payload(tc)
+                )
+                # Verdict tính trước khi nhả slot: test sau thấy ngay fail-fast / lỗi build
+                try:
+                    check_compilation(result)
+                    detail = await detail_of(tc, result)
+                except CompilationError as e:
+                    errors.append(e)
+                    detail = None
+                if detail is None or (fail_fast and detail["status"] != "ACCEPTED"):
+                    stopped.set()
+
+            await put(keys.get(tc.id), submission.problem_id, result)
+            if detail is not None:
+                report(detail)
+            return detail
+
+        ran = await asyncio.gather(*(judge(tc) for tc in to_run))
+        if errors:
+            raise errors[0]
+        if aborted.is_set():
+            raise JudgingCancelled()
+
+        for tc, detail in zip(to_run, ran):
+            if detail is not None:
+                details[tc.id] = detail
+
+    return [details.get(tc.id) or skipped_detail(tc) for tc in testcases]
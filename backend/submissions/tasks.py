@@ -1,9 +1,21 @@
 from celery import shared_task
 from django.utils import timezone
 from .models import Submission
-from problems.models import TestCase
 from matches.models import Match
-from code_battle_api.judge0_service import run_code_with_judge0
+from . import callbacks
+from . import results
+from . import scheduler
+from .services import (
+    JUDGE_MODE,
+    CompilationError,
+    JudgingCancelled,
+    run_testcases,
+    is_fail_fast,
+    testcases_for_judging,
+    record_outcomes,
+    skipped_detail,
+)
+from .progress import ProgressReporter, compact_result
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 import logging
@@ -13,183 +25,256 @@ from matches.utils import apply_normal_match_result
 logger = logging.getLogger(__name__)
 
 
-@shared_task
-def judge_task(submission_id):
-    try:
-        submission = Submission.objects.get(pk=submission_id)
-        match = submission.match
-        user = submission.user
-        problem = submission.problem
-
-        submission.status = Submission.SubmissionStatus.JUDGING
-        submission.save(update_fields=["status"])
-
-        testcases = TestCase.objects.filter(problem=problem)
-        total = testcases.count()
-        passed = 0
-
-        details = []
-        total_time = 0
-        total_mem = 0
-
-        for tc in testcases:
-            result = run_code_with_judge0(
-                source_code=submission.source_code,
-                language=submission.language,
-                input_data=(tc.input_data or "") + "\n",
-                expected_output=(tc.expected_output or "").strip(),
-            )
-
-            status = result.get("status", {}) or {}
-            status_id = status.get("id")
-
-            stdout = (result.get("stdout") or "").strip()
-            expected = (tc.expected_output or "").strip()
+def start_judging(submission_id, priority=None):
+    """
+    Đánh dấu submission JUDGING và lấy danh sách test cần chấm.
+    Dùng chung cho judge_task (Celery) và judge worker asyncio.
+    Raise JudgingCancelled nếu trận đã phân định (trừ rejudge).
+    """
+    submission = Submission.objects.select_related("match", "user", "problem").get(pk=submission_id)
+    if scheduler.should_cancel(submission, priority):
+        raise JudgingCancelled()
+
+    submission.status = Submission.SubmissionStatus.JUDGING
+    submission.save(update_fields=["status"])
+    return submission, testcases_for_judging(submission.problem)
+
+
+def finish_judging(submission, testcases, details=None, compilation_error=None):
+    """
+    Lưu kết quả chấm, broadcast cho phòng đấu và kết thúc trận nếu đã phân định.
+    `details` là None khi source bị lỗi build (`compilation_error`).
+    """
+    match = submission.match
+    user = submission.user
+    total = len(testcases)
+
+    if compilation_error is not None:
+        # Lỗi build chỉ báo một lần, không chấm test nào
+        details = [skipped_detail(tc) for tc in testcases]
+
+    record_outcomes(details)
+    # Chạy theo tỉ lệ fail, nhưng lưu kết quả theo thứ tự test case gốc
+    details.sort(key=lambda d: d["testcase_id"])
+    passed = sum(1 for d in details if d["status"] == "ACCEPTED")
+    total_time = sum(d["exec_time"] for d in details)
+    total_mem = sum(d["memory"] for d in details)
+
+    successful_runs = sum(1 for d in details if d["exec_time"] > 0)
+    avg_time = round(total_time / successful_runs, 3) if successful_runs else 0
+    avg_mem = round(total_mem / successful_runs) if successful_runs else 0
+
+    if compilation_error is not None:
+        final_status = Submission.SubmissionStatus.COMPILATION_ERROR
+    elif passed == total and total > 0:
+        final_status = Submission.SubmissionStatus.ACCEPTED
+    else:
+        final_status = Submission.SubmissionStatus.WRONG_ANSWER
+
+    submission.status = final_status
+    submission.total_test_cases = total
+    submission.test_cases_passed = passed
+    submission.execution_time = avg_time
+    submission.memory_used = avg_mem
+    submission.detailed_results = results.pack(details)
+    submission.compilation_error = compilation_error
+    submission.save()
+
+    # Nhường chỗ cho submission kế tiếp của user trong backlog
+    scheduler.release(user.id, submission.id)
+
+    channel_layer = get_channel_layer()
+    room = f"match_{match.id}"
+
+    async_to_sync(channel_layer.group_send)(
+        room,
+        {
+            "type": "submission_update",
+            "payload": {
+                **submission.summary,
+                "username": user.username,
+                # Chi tiết từng test đã được stream qua submission_progress
+                "results": [compact_result(d) for d in details],
+                "compilation_error": compilation_error,
+            },
+        },
+    )
+
+    match.refresh_from_db()
+    if match.status in [
+        Match.MatchStatus.COMPLETED,
+        Match.MatchStatus.CANCELLED,
+        Match.MatchStatus.CHEATING,
+    ]:
+        return
+
+    p1 = match.player1
+    p2 = match.player2
+
+    latest_p1 = match.submissions.filter(user=p1).order_by("-submitted_at").first()
+    latest_p2 = match.submissions.filter(user=p2).order_by("-submitted_at").first()
+
+    winner = None
+    loser = None
+
+    if final_status == Submission.SubmissionStatus.ACCEPTED:
+        opponent = p2 if user == p1 else p1
+        winner = user
+        loser = opponent
+    else:
+        if not latest_p1 or not latest_p2:
+            return
+        if latest_p1.test_cases_passed > latest_p2.test_cases_passed:
+            winner = p1
+            loser = p2
+        elif latest_p2.test_cases_passed > latest_p1.test_cases_passed:
+            winner = p2
+            loser = p1
+
+    match.winner = winner
+    match.status = Match.MatchStatus.COMPLETED
+    match.end_time = timezone.now()
+    match.save()
+
+    p1_stats, _ = UserStats.objects.get_or_create(user=p1)
+    p2_stats, _ = UserStats.objects.get_or_create(user=p2)
+
+    p1_stats.total_battles += 1
+    p2_stats.total_battles += 1
+
+    if winner is None:
+        p1_stats.current_streak = 0
+        p2_stats.current_streak = 0
+    elif winner == p1:
+        p1_stats.wins += 1
+        p1_stats.current_streak += 1
+        p2_stats.current_streak = 0
+    elif winner == p2:
+        p2_stats.wins += 1
+        p2_stats.current_streak += 1
+        p1_stats.current_streak = 0
+
+    p1_stats.save()
+    p2_stats.save()
+
+    if winner is not None:
+        if winner == p1:
+            apply_normal_match_result(p1, p2)
+        else:
+            apply_normal_match_result(p2, p1)
+
+    reason = (
+        "Accepted solution"
+        if final_status == Submission.SubmissionStatus.ACCEPTED
+        else "Both players submitted."
+    )
+
+    async_to_sync(channel_layer.group_send)(
+        room,
+        {
+            "type": "send_group_message",
+            "event_type": "match_end",
+            "payload": {
+                "winner_username": winner.username if winner else None,
+                "loser_username": loser.username if loser else None,
+                "reason": reason,
+            },
+        },
+    )
 
-            is_passed = status_id == 3 and stdout == expected
-            if is_passed:
-                passed += 1
 
-            exec_time = float(result.get("time") or 0)
-            mem_used = int(result.get("memory") or 0)
+def mark_judging_failed(submission_id):
+    try:
+        Submission.objects.filter(pk=submission_id).update(
+            status=Submission.SubmissionStatus.RUNTIME_ERROR
+        )
+        user_id = Submission.objects.filter(pk=submission_id).values_list("user_id", flat=True).first()
+    except Exception:
+        return
+
+    if user_id is not None:
+        scheduler.release(user_id, submission_id)
+
+
+def cancel_judging(submission_id):
+    """Trận đã phân định: submission không được chấm (tiếp), báo cho phòng đấu."""
+    cancelled = Submission.objects.filter(
+        pk=submission_id,
+        status__in=[Submission.SubmissionStatus.PENDING, Submission.SubmissionStatus.JUDGING],
+    ).update(status=Submission.SubmissionStatus.CANCELLED)
+
+    submission = Submission.objects.select_related("user").get(pk=submission_id)
+    scheduler.release(submission.user_id, submission_id)
+    if not cancelled:
+        return
+
+    logger.info(f"🛑 [JUDGE] Submission {submission_id} cancelled, match {submission.match_id} is decided")
+    async_to_sync(get_channel_layer().group_send)(
+        f"match_{submission.match_id}",
+        {
+            "type": "submission_update",
+            "payload": {
+                **submission.summary,
+                "username": submission.user.username,
+                "results": [],
+                "compilation_error": None,
+            },
+        },
+    )
 
-            total_time += exec_time
-            total_mem += mem_used
 
-            details.append(
-                {
-                    "testcase_id": tc.id,
-                    "input": tc.input_data,
-                    "expected_output": expected,
-                    "actual_output": stdout,
-                    "status": "ACCEPTED" if is_passed else "WRONG_ANSWER",
-                    "exec_time": exec_time,
-                    "memory": mem_used,
-                }
-            )
+def judging_cancel_check(submission, priority):
+    """Hàm kiểm tra giữa các test cho run_testcases (None với rejudge)."""
+    if priority == scheduler.REJUDGE:
+        return None
+    return lambda: scheduler.match_decided(submission.match_id)
 
-        successful_runs = sum(1 for d in details if d["exec_time"] > 0)
-        avg_time = round(total_time / successful_runs, 3) if successful_runs else 0
-        avg_mem = round(total_mem / successful_runs) if successful_runs else 0
 
-        final_status = (
-            Submission.SubmissionStatus.ACCEPTED
-            if passed == total and total > 0
-            else Submission.SubmissionStatus.WRONG_ANSWER
-        )
+@shared_task
+def judge_task(submission_id, priority=None, enqueued_at=None):
+    """Không gọi trực tiếp: đưa submission vào hàng đợi bằng scheduler.enqueue()."""
+    scheduler.record_wait(priority, enqueued_at)
 
-        submission.status = final_status
-        submission.total_test_cases = total
-        submission.test_cases_passed = passed
-        submission.execution_time = avg_time
-        submission.memory_used = avg_mem
-        submission.detailed_results = details
-        submission.save()
-
-        channel_layer = get_channel_layer()
-        room = f"match_{match.id}"
-
-        async_to_sync(channel_layer.group_send)(
-            room,
-            {
-                "type": "submission_update",
-                "payload": {
-                    **submission.summary,
-                    "username": user.username,
-                    "detailed_results": details,
-                },
-            },
-        )
+    try:
+        submission, testcases = start_judging(submission_id, priority)
 
-        match.refresh_from_db()
-        if match.status in [
-            Match.MatchStatus.COMPLETED,
-            Match.MatchStatus.CANCELLED,
-            Match.MatchStatus.CHEATING,
-        ]:
+        if JUDGE_MODE == "callback":
+            # Kết quả được chốt khi callback cuối cùng của Judge0 về (xem callbacks.py)
+            callbacks.dispatch(submission, testcases, cancellable=priority != scheduler.REJUDGE)
             return
 
-        p1 = match.player1
-        p2 = match.player2
-
-        latest_p1 = match.submissions.filter(user=p1).order_by("-submitted_at").first()
-        latest_p2 = match.submissions.filter(user=p2).order_by("-submitted_at").first()
-
-        winner = None
-        loser = None
+        progress = ProgressReporter(submission, testcases)
 
-        if final_status == Submission.SubmissionStatus.ACCEPTED:
-            opponent = p2 if user == p1 else p1
-            winner = user
-            loser = opponent
+        try:
+            details = run_testcases(
+                submission, testcases,
+                fail_fast=is_fail_fast(submission.problem),
+                progress=progress,
+                cancelled=judging_cancel_check(submission, priority),
+            )
+        except CompilationError as e:
+            finish_judging(submission, testcases, compilation_error=e.output)
         else:
-            if not latest_p1 or not latest_p2:
-                return
-            if latest_p1.test_cases_passed > latest_p2.test_cases_passed:
-                winner = p1
-                loser = p2
-            elif latest_p2.test_cases_passed > latest_p1.test_cases_passed:
-                winner = p2
-                loser = p1
-
-        match.winner = winner
-        match.status = Match.MatchStatus.COMPLETED
-        match.end_time = timezone.now()
-        match.save()
-
-        p1_stats, _ = UserStats.objects.get_or_create(user=p1)
-        p2_stats, _ = UserStats.objects.get_or_create(user=p2)
-
-        p1_stats.total_battles += 1
-        p2_stats.total_battles += 1
-
-        if winner is None:
-            p1_stats.current_streak = 0
-            p2_stats.current_streak = 0
-        elif winner == p1:
-            p1_stats.wins += 1
-            p1_stats.current_streak += 1
-            p2_stats.current_streak = 0
-        elif winner == p2:
-            p2_stats.wins += 1
-            p2_stats.current_streak += 1
-            p1_stats.current_streak = 0
-
-        p1_stats.save()
-        p2_stats.save()
-
-        if winner is not None:
-            if winner == p1:
-                apply_normal_match_result(p1, p2)
-            else:
-                apply_normal_match_result(p2, p1)
-
-        reason = (
-            "Accepted solution"
-            if final_status == Submission.SubmissionStatus.ACCEPTED
-            else "Both players submitted."
-        )
-
-        async_to_sync(channel_layer.group_send)(
-            room,
-            {
-                "type": "send_group_message",
-                "event_type": "match_end",
-                "payload": {
-                    "winner_username": winner.username if winner else None,
-                    "loser_username": loser.username if loser else None,
-                    "reason": reason,
-                },
-            },
-        )
+            progress.flush()
+            finish_judging(submission, testcases, details)
 
+    except JudgingCancelled:
+        cancel_judging(submission_id)
     except Submission.DoesNotExist:
         logger.error(f"Submission {submission_id} not found.")
     except Exception as e:
         logger.error(f"Judge task failed: {e}", exc_info=True)
-        try:
-            Submission.objects.filter(pk=submission_id).update(
-                status=Submission.SubmissionStatus.RUNTIME_ERROR
-            )
-        except Exception:
-            pass
+        mark_judging_failed(submission_id)
+
+
+@shared_task
+def drain_judge_backlog(user_id):
+    """Đẩy tiếp backlog của user khi chỗ đang giữ đã hết hạn (xem scheduler.py)."""
+    scheduler.drain(user_id)
+
+
+@shared_task
+def expire_callback_judging(submission_id, run_id):
+    """Chốt lần chấm `run_id` ở mode callback nếu Judge0 không gửi đủ callback đúng hạn."""
+    if callbacks.finalize(submission_id, run_id, timed_out=True):
+        logger.warning(f"Submission {submission_id} finalized by callback timeout.")
@@ -0,0 +1,698 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+import fakeredis
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from code_battle_api import redis_client
+from matches.models import Match
+from problems.models import Problem, TestCase as ProblemTestCase
+
+from . import admission, async_worker, callbacks, comparator, result_cache, results, scheduler, services
+from .progress import ProgressReporter
+from .models import Submission
+
+
+class FakeRedisMixin:
+    """Thay Redis dùng chung bằng fakeredis (có Lua) cho từng test."""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch.object(redis_client, "_client", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+def make_submission(outputs, source="print(sum(map(int, input().split())))"):
+    """Submission của một trận mới, mỗi phần tử `outputs` là expected output của một test."""
+    problem = Problem.objects.create(title=f"Problem {Problem.objects.count()}", description="-")
+    for i, output in enumerate(outputs):
+        ProblemTestCase.objects.create(problem=problem, input_data=str(i), expected_output=output)
+    player1 = User.objects.create_user(f"p1-{problem.id}", password="x")
+    player2 = User.objects.create_user(f"p2-{problem.id}", password="x")
+    match = Match.objects.create(player1=player1, player2=player2, problem=problem, status="ACTIVE")
+    return Submission.objects.create(
+        match=match, user=player1, problem=problem, language="python", source_code=source,
+    )
+
+
+class EchoExecutor:
+    """Executor giả (sync): stdout = input, test sau chạy nhanh hơn test trước; đếm số test chạy cùng lúc."""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = self.max_running = self.calls = self.prepared = 0
+
+    @contextmanager
+    def prepare(self, source_code, language):
+        self.prepared += 1
+        yield None
+
+    def run(self, source_code, language, input_data, expected_output=None, time_limit=None, memory_limit=None):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay / (1 + int(input_data)))
+        with self.lock:
+            self.running -= 1
+        return {"status": {"id": 3}, "stdout": input_data, "time": "0.01", "memory": 10}
+
+    def run_batch(self, source_code, language, cases, time_limit=None, memory_limit=None):
+        return [self.run(source_code, language, case["input_data"]) for case in cases]
+
+
+class EchoClient:
+    """Client asyncio giả: stdout = input."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def run(self, source_code, language, input_data, expected_output=None):
+        self.calls += 1
+        return {"status": {"id": 3}, "stdout": input_data, "time": "0.01", "memory": 10}
+
+
+class ComparatorTests(SimpleTestCase):
+    def test_exact_ignores_surrounding_whitespace(self):
+        self.assertTrue(comparator.compare(b"3", b" 3"))
+        self.assertTrue(comparator.compare(b"3\n", b"\n\n  3  \n\n"))
+        self.assertTrue(comparator.compare(b"1 2\n3\n", b"1 2   \n3"))
+
+    def test_exact_keeps_inner_whitespace(self):
+        self.assertFalse(comparator.compare(b"1 2", b"1  2"))
+        self.assertFalse(comparator.compare(b"1\n2", b"1\n\n2"))
+        self.assertFalse(comparator.compare(b"a\nb\n", b"a\nc\n"))
+        self.assertFalse(comparator.compare(b"a\nb", b"a"))
+
+    def test_exact_strict_is_opt_in(self):
+        self.assertTrue(comparator.compare(b"3\n", b"3\n", ignore_trailing_whitespace=False))
+        self.assertFalse(comparator.compare(b"3", b" 3", ignore_trailing_whitespace=False))
+        self.assertFalse(comparator.compare(b"3", b"3\n", ignore_trailing_whitespace=False))
+
+    def test_exact_across_blocks(self):
+        line = b"x" * (comparator.BLOCK_SIZE + 10) + b"\n"
+        self.assertTrue(comparator.compare(b"\n" + line + b"1", line + b"1 "))
+        self.assertFalse(comparator.compare(line + b"1", b"  " + line + b"2"))
+
+    def test_whitespace_mode(self):
+        self.assertTrue(comparator.compare(b"1 2\n3", b"1\n2   3\n", mode=comparator.WHITESPACE))
+        self.assertFalse(comparator.compare(b"1 2", b"1 2 3", mode=comparator.WHITESPACE))
+
+    def test_float_mode(self):
+        self.assertTrue(comparator.compare(b"0.3333333", b"0.33333334", mode=comparator.FLOAT))
+        self.assertTrue(comparator.compare(b"1e9", b"1000000001", mode=comparator.FLOAT, tolerance=1e-6))
+        self.assertFalse(comparator.compare(b"1.0", b"1.1", mode=comparator.FLOAT))
+        self.assertFalse(comparator.compare(b"nan", b"1.0", mode=comparator.FLOAT))
+        self.assertFalse(comparator.compare(b"abc", b"abd", mode=comparator.FLOAT))
+
+    def test_accepts_memoryview_input(self):
+        self.assertTrue(comparator.compare(bytearray(b"ok\n"), b" ok"))
+
+
+class NormalizeSourceTests(SimpleTestCase):
+    def test_line_endings_and_final_newlines(self):
+        self.assertEqual(result_cache.normalize_source("a\r\nb\r\n\n"), "a\nb")
+        self.assertEqual(result_cache.normalize_source(None), "")
+
+    def test_keeps_whitespace_inside_lines(self):
+        source = 'print("a  ")  \n\tx = 1'
+        self.assertEqual(result_cache.normalize_source(source), source)
+        self.assertNotEqual(
+            result_cache.normalize_source('s = """x \n"""'),
+            result_cache.normalize_source('s = """x\n"""'),
+        )
+
+
+class CallbackRecordTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        problem = Problem.objects.create(title="A + B", description="-")
+        self.tcs = [
+            ProblemTestCase.objects.create(problem=problem, input_data="1 2", expected_output="3"),
+            ProblemTestCase.objects.create(problem=problem, input_data="2 2", expected_output="4"),
+        ]
+        self.redis.hset(callbacks._key(1, "r", "meta"), mapping={
+            "match_id": 1, "problem_id": problem.id, "username": "u",
+            "testcases": json.dumps([tc.id for tc in self.tcs]),
+            "keys": "{}", "fail_fast": 0, "cancellable": 0,
+        })
+        self.redis.set(callbacks._key(1, "r", "pending"), 2)
+        for patcher in (
+            mock.patch.object(callbacks, "finalize"),
+            mock.patch.object(callbacks, "_send_progress"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def result(self, stdout):
+        return {"status": {"id": 3}, "stdout": stdout, "time": "0.01", "memory": 100}
+
+    def test_duplicate_callback_is_counted_once(self):
+        self.assertTrue(callbacks.record_result(1, "r", self.tcs[0].id, self.result("3")))
+        self.assertTrue(callbacks.record_result(1, "r", self.tcs[0].id, self.result("3")))
+        self.assertEqual(self.redis.get(callbacks._key(1, "r", "pending")), "1")
+        callbacks.finalize.assert_not_called()
+
+        self.assertTrue(callbacks.record_result(1, "r", self.tcs[1].id, self.result("4")))
+        callbacks.finalize.assert_called_once_with(1, "r")
+        self.assertGreater(self.redis.ttl(callbacks._key(1, "r", "results")), 0)
+
+    def test_late_callback_does_not_recreate_state(self):
+        self.redis.delete(callbacks._key(1, "r", "meta"), callbacks._key(1, "r", "pending"))
+        self.assertFalse(callbacks.record_result(1, "r", self.tcs[0].id, self.result("3")))
+        self.assertFalse(self.redis.exists(callbacks._key(1, "r", "results"), callbacks._key(1, "r", "pending")))
+
+    def test_state_cleared_while_recording(self):
+        def clear(*args):
+            self.redis.delete(callbacks._key(1, "r", "meta"), callbacks._key(1, "r", "pending"))
+
+        with mock.patch.object(callbacks.result_cache, "put", side_effect=clear):
+            self.assertFalse(callbacks.record_result(1, "r", self.tcs[0].id, self.result("3")))
+        self.assertFalse(self.redis.exists(callbacks._key(1, "r", "results"), callbacks._key(1, "r", "pending")))
+        callbacks.finalize.assert_not_called()
+
+
+class RunTestcasesAsyncTests(FakeRedisMixin, TestCase):
+    def run_async(self, submission, **kwargs):
+        testcases = list(submission.problem.testcases.order_by("id"))
+        return async_to_sync(services.run_testcases_async)(submission, testcases, EchoClient(), **kwargs)
+
+    def test_results_in_testcase_order(self):
+        submission = make_submission(["0", "1", "x"])
+        statuses = [d["status"] for d in self.run_async(submission)]
+        self.assertEqual(statuses, ["ACCEPTED", "ACCEPTED", "WRONG_ANSWER"])
+
+    def test_fail_fast_skips_remaining(self):
+        submission = make_submission(["x"] + [str(i) for i in range(1, 6)])
+        with mock.patch.object(services, "JUDGE_MAX_PARALLEL_TESTS", 1):
+            statuses = [d["status"] for d in self.run_async(submission, fail_fast=True)]
+        self.assertEqual(statuses, ["WRONG_ANSWER"] + ["SKIPPED"] * 5)
+
+    def test_verdict_computed_outside_event_loop(self):
+        submission = make_submission(["0"])
+        threads = []
+        build_detail = services.build_detail
+
+        def record(tc, result):
+            threads.append(threading.current_thread())
+            return build_detail(tc, result)
+
+        with mock.patch.object(services, "build_detail", side_effect=record):
+            self.run_async(submission)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+
+class AsyncJudgeWorkerTests(FakeRedisMixin, TestCase):
+    def test_start_judging_error_marks_submission_failed(self):
+        worker = async_worker.AsyncJudgeWorker(concurrency=1, per_user=1)
+        with (
+            mock.patch.object(async_worker, "start_judging", side_effect=OperationalError("gone away")),
+            mock.patch.object(async_worker, "mark_judging_failed") as mark_failed,
+        ):
+            async_to_sync(worker.judge)(42)
+        mark_failed.assert_called_once_with(42)
+
+
+class AdmissionTests(FakeRedisMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        # Không hỏi Celery: độ sâu queue lấy từ cache
+        self.redis.set(scheduler.PENDING_DEPTH_KEY, 0)
+
+    def test_token_bucket(self):
+        with mock.patch.object(admission, "JUDGE_SUBMIT_BURST", 3):
+            rejections = [admission.admit(1) for _ in range(4)]
+        self.assertEqual(rejections[:3], [None] * 3)
+        self.assertEqual(rejections[3].reason, admission.RATE_LIMITED)
+        self.assertGreater(rejections[3].retry_after, 0)
+        self.assertIsNone(admission.admit(2))
+
+    def test_user_backlog_full(self):
+        for i in range(admission.JUDGE_USER_MAX_QUEUED):
+            self.redis.rpush(scheduler.backlog_key(1, scheduler.PRACTICE), json.dumps({"id": i}))
+        self.assertEqual(admission.admit(1).reason, admission.TOO_MANY_QUEUED)
+
+    def test_saturated(self):
+        self.redis.set(scheduler.PENDING_DEPTH_KEY, admission.JUDGE_MAX_PENDING)
+        self.assertEqual(admission.admit(1).reason, admission.SATURATED)
+
+
+class EchoExecutorMixin(FakeRedisMixin):
+    def setUp(self):
+        super().setUp()
+        self.executor = EchoExecutor()
+        patcher = mock.patch.object(services, "get_executor", return_value=self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def judge(self, submission, mode="sequential", **kwargs):
+        testcases = list(submission.problem.testcases.order_by("id"))
+        with mock.patch.object(services, "JUDGE_MODE", mode):
+            return services.run_testcases(submission, testcases, **kwargs)
+
+
+class RunTestcasesTests(EchoExecutorMixin, TestCase):
+    def test_parallel_runs_concurrently_and_keeps_order(self):
+        submission = make_submission(["0", "1", "x", "3", "4", "5"])
+        with mock.patch.object(services, "JUDGE_MAX_PARALLEL_TESTS", 3):
+            details = self.judge(submission, "parallel")
+
+        self.assertEqual(
+            [d["status"] for d in details],
+            ["ACCEPTED", "ACCEPTED", "WRONG_ANSWER", "ACCEPTED", "ACCEPTED", "ACCEPTED"],
+        )
+        testcase_ids = list(submission.problem.testcases.order_by("id").values_list("id", flat=True))
+        self.assertEqual([d["testcase_id"] for d in details], testcase_ids)
+        self.assertGreater(self.executor.max_running, 1)
+        self.assertLessEqual(self.executor.max_running, 3)
+        self.assertEqual(self.executor.prepared, 1)
+
+    def test_sequential_runs_one_at_a_time(self):
+        submission = make_submission(["0", "1", "2"])
+        self.judge(submission, "sequential")
+        self.assertEqual(self.executor.max_running, 1)
+
+    def test_compilation_error_reported_once(self):
+        submission = make_submission(["0", "1", "2"])
+
+        @contextmanager
+        def broken_build(source_code, language):
+            yield {"status": {"id": services.COMPILATION_ERROR_STATUS}, "compile_output": "main.py: bad"}
+
+        with mock.patch.object(self.executor, "prepare", broken_build):
+            with self.assertRaises(services.CompilationError) as raised:
+                self.judge(submission)
+        self.assertEqual(raised.exception.output, "main.py: bad")
+        self.assertEqual(self.executor.calls, 0)
+
+    def test_cancelled_before_next_test(self):
+        submission = make_submission(["0", "1", "2"])
+        checks = iter([False, True])
+        with self.assertRaises(services.JudgingCancelled):
+            self.judge(submission, cancelled=lambda: next(checks, True))
+        self.assertEqual(self.executor.calls, 1)
+
+
+class FailFastTests(EchoExecutorMixin, TestCase):
+    def statuses(self, details):
+        return [d["status"] for d in details]
+
+    def test_sequential_stops_at_first_failure(self):
+        submission = make_submission(["0", "x", "2", "3"])
+        details = self.judge(submission, fail_fast=True)
+        self.assertEqual(self.statuses(details), ["ACCEPTED", "WRONG_ANSWER", "SKIPPED", "SKIPPED"])
+        self.assertEqual(self.executor.calls, 2)
+
+    def test_parallel_stops_sending_new_tests(self):
+        submission = make_submission(["x"] + [str(i) for i in range(1, 8)])
+        with mock.patch.object(services, "JUDGE_MAX_PARALLEL_TESTS", 2):
+            details = self.judge(submission, "parallel", fail_fast=True)
+        self.assertEqual(details[0]["status"], "WRONG_ANSWER")
+        self.assertIn("SKIPPED", self.statuses(details))
+        self.assertLess(self.executor.calls, 8)
+
+    def test_batch_stops_after_failing_chunk(self):
+        submission = make_submission(["0", "x", "2", "3", "4", "5"])
+        with mock.patch.object(services, "JUDGE_MAX_PARALLEL_TESTS", 2):
+            details = self.judge(submission, "batch", fail_fast=True)
+        self.assertEqual(self.statuses(details), ["ACCEPTED", "WRONG_ANSWER"] + ["SKIPPED"] * 4)
+
+    def test_without_fail_fast_every_test_runs(self):
+        submission = make_submission(["x", "x", "x"])
+        self.assertEqual(self.statuses(self.judge(submission)), ["WRONG_ANSWER"] * 3)
+
+    def test_skipped_tests_do_not_count_as_failures(self):
+        submission = make_submission(["x", "1"])
+        services.record_outcomes(self.judge(submission, fail_fast=True))
+        counts = list(submission.problem.testcases.order_by("id").values_list("pass_count", "fail_count"))
+        self.assertEqual(counts, [(0, 1), (0, 0)])
+
+    def test_enabled_per_problem_or_globally(self):
+        problem = make_submission([]).problem
+        self.assertFalse(services.is_fail_fast(problem))
+        with mock.patch.object(services, "JUDGE_FAIL_FAST", True):
+            self.assertTrue(services.is_fail_fast(problem))
+        problem.fail_fast = True
+        self.assertTrue(services.is_fail_fast(problem))
+
+
+class TestcaseOrderTests(TestCase):
+    def test_samples_first_then_most_failing(self):
+        problem = Problem.objects.create(title="Order", description="-")
+
+        def create(is_hidden, passes, fails):
+            return ProblemTestCase.objects.create(
+                problem=problem, input_data="1", expected_output="1",
+                is_hidden=is_hidden, pass_count=passes, fail_count=fails,
+            )
+
+        rarely_fails = create(True, 90, 10)
+        sample = create(False, 0, 0)
+        often_fails = create(True, 10, 90)
+        new = create(True, 0, 0)
+
+        ordered = services.testcases_for_judging(problem)
+        self.assertEqual(ordered, [sample, often_fails, new, rarely_fails])
+
+    def test_ties_keep_creation_order(self):
+        problem = Problem.objects.create(title="Ties", description="-")
+        testcases = [
+            ProblemTestCase.objects.create(problem=problem, input_data="1", expected_output="1")
+            for _ in range(3)
+        ]
+        self.assertEqual(services.testcases_for_judging(problem), testcases)
+
+
+class ResultCacheTests(EchoExecutorMixin, TestCase):
+    def keys(self, submission):
+        return result_cache.make_keys(submission, submission.problem.testcases.order_by("id"))
+
+    def test_key_depends_on_source_language_and_limits(self):
+        submission = make_submission(["0", "1"])
+        keys = self.keys(submission)
+        self.assertEqual(len(set(keys.values())), 2)
+
+        submission.source_code = submission.source_code.replace("\n", "\r\n") + "\n\n"
+        self.assertEqual(self.keys(submission), keys)
+
+        submission.source_code += "# comment"
+        self.assertNotEqual(self.keys(submission), keys)
+
+        submission.refresh_from_db()
+        submission.language = "cpp"
+        self.assertNotEqual(self.keys(submission), keys)
+
+        submission.refresh_from_db()
+        submission.problem.time_limit += 1
+        self.assertNotEqual(self.keys(submission), keys)
+
+    def test_second_run_is_served_from_cache(self):
+        submission = make_submission(["0", "x"])
+        first = self.judge(submission)
+        self.assertEqual(self.executor.calls, 2)
+        self.assertEqual(self.judge(submission), first)
+        self.assertEqual(self.executor.calls, 2)
+
+        result_cache.invalidate_problem(submission.problem_id)
+        self.judge(submission)
+        self.assertEqual(self.executor.calls, 4)
+
+    def test_unstable_verdicts_are_not_cached(self):
+        result_cache.put("tle", 1, {"status": {"id": 5}, "stdout": ""})
+        result_cache.put("ok", 1, {"status": {"id": 3}, "stdout": "1"})
+        self.assertEqual(list(result_cache.get_many(["tle", "ok"])), ["ok"])
+
+    def test_least_recently_used_entries_evicted(self):
+        with mock.patch.object(result_cache, "JUDGE_CACHE_MAX_ENTRIES", 2):
+            for key in ("a", "b", "c"):
+                result_cache.put(key, 1, {"status": {"id": 3}, "stdout": key})
+        self.assertEqual(sorted(result_cache.get_many(["a", "b", "c"])), ["b", "c"])
+
+
+class ProgressReporterTests(TestCase):
+    def setUp(self):
+        self.submission = make_submission(["0", "1", "2"])
+        self.testcases = list(self.submission.problem.testcases.order_by("id"))
+        self.sent = []
+
+    def reporter(self, interval):
+        return ProgressReporter(
+            self.submission, self.testcases, send=lambda room, message: self.sent.append((room, message)),
+            interval=interval,
+        )
+
+    def detail(self, tc, status="ACCEPTED"):
+        return {"testcase_id": tc.id, "status": status, "exec_time": 0.01, "memory": 10, "actual_output": "x"}
+
+    def test_results_within_interval_are_coalesced(self):
+        reporter = self.reporter(interval=60)
+        for tc in reversed(self.testcases):
+            reporter.report(self.detail(tc))
+        reporter.flush()
+
+        self.assertEqual(len(self.sent), 2)
+        room, message = self.sent[-1]
+        self.assertEqual(room, f"match_{self.submission.match_id}")
+        payload = message["payload"]
+        self.assertEqual((payload["total"], payload["completed"]), (3, 3))
+        self.assertEqual([r["number"] for r in payload["results"]], [2, 1])
+        self.assertNotIn("actual_output", payload["results"][0])
+
+    def test_timer_flushes_pending_results(self):
+        reporter = self.reporter(interval=0.05)
+        reporter.report(self.detail(self.testcases[0]))
+        reporter.report(self.detail(self.testcases[1], "WRONG_ANSWER"))
+        time.sleep(0.2)
+        self.assertEqual([m["payload"]["completed"] for _, m in self.sent], [1, 2])
+
+
+class CallbackFlowTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.submission = make_submission(["0", "1", "2"])
+        self.testcases = list(self.submission.problem.testcases.order_by("id"))
+        for patcher in (
+            mock.patch.object(callbacks, "submit_with_callbacks", side_effect=lambda s, l, cases: ["t"] * len(cases)),
+            mock.patch.object(callbacks.judge_tasks, "finish_judging"),
+            mock.patch.object(callbacks.judge_tasks.expire_callback_judging, "apply_async"),
+            mock.patch.object(callbacks, "_send_progress"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.run_id = self.dispatch()
+
+    def dispatch(self):
+        """Dispatch và trả về run id (tham số của expire_callback_judging)."""
+        callbacks.dispatch(self.submission, self.testcases)
+        submission_id, run_id = callbacks.judge_tasks.expire_callback_judging.apply_async.call_args.args[0]
+        self.assertEqual(submission_id, self.submission.id)
+        return run_id
+
+    def callback(self, tc, stdout, status_id=3, run_id=None, **extra):
+        return callbacks.record_result(
+            self.submission.id, run_id or self.run_id, tc.id,
+            {"status": {"id": status_id}, "stdout": stdout, **extra},
+        )
+
+    def finished_statuses(self):
+        finish = callbacks.judge_tasks.finish_judging
+        finish.assert_called_once()
+        return [d["status"] for d in finish.call_args.args[2]]
+
+    def test_results_aggregated_in_testcase_order(self):
+        for tc, stdout in zip(reversed(self.testcases), ["2", "x", "0"]):
+            self.assertTrue(self.callback(tc, stdout))
+        self.assertEqual(self.finished_statuses(), ["ACCEPTED", "WRONG_ANSWER", "ACCEPTED"])
+        # Callback trễ sau khi đã chốt bị bỏ qua
+        self.assertFalse(self.callback(self.testcases[0], "0"))
+        self.assertEqual(self.redis.keys("judgecb:*"), [callbacks._key(self.submission.id, self.run_id, "lock")])
+
+    def test_redispatch_after_finalize(self):
+        for tc, stdout in zip(self.testcases, ["0", "1", "2"]):
+            self.callback(tc, stdout)
+        finish = callbacks.judge_tasks.finish_judging
+        finish.reset_mock()
+        # Rejudge chạy lại thật, không lấy kết quả từ result_cache
+        self.redis.delete(*self.redis.keys("judgecache:*"))
+
+        run_id = self.dispatch()
+        self.assertNotEqual(run_id, self.run_id)
+        # Expire task / callback trễ của lần chấm trước không chạm tới lần chấm mới
+        self.assertFalse(callbacks.finalize(self.submission.id, self.run_id, timed_out=True))
+        self.assertFalse(self.callback(self.testcases[0], "x"))
+
+        for tc, stdout in zip(self.testcases, ["0", "x", "2"]):
+            self.assertTrue(self.callback(tc, stdout, run_id=run_id))
+        self.assertEqual(self.finished_statuses(), ["ACCEPTED", "WRONG_ANSWER", "ACCEPTED"])
+        self.assertFalse(self.redis.keys(callbacks._key(self.submission.id, run_id, "[mrp]*")))
+
+    def test_timeout_marks_missing_callbacks_failed(self):
+        self.callback(self.testcases[0], "0")
+        self.assertTrue(callbacks.finalize(self.submission.id, self.run_id, timed_out=True))
+        self.assertEqual(self.finished_statuses(), ["ACCEPTED", "WRONG_ANSWER", "WRONG_ANSWER"])
+        self.assertFalse(callbacks.finalize(self.submission.id, self.run_id, timed_out=True))
+
+    def test_compilation_error_finishes_immediately(self):
+        self.callback(self.testcases[1], "", status_id=6, compile_output="error: x")
+        finish = callbacks.judge_tasks.finish_judging
+        finish.assert_called_once()
+        self.assertEqual(finish.call_args.kwargs["compilation_error"], "error: x")
+
+    def test_callback_token_round_trip(self):
+        url = callbacks.callback_url(self.submission.id, self.run_id, self.testcases[0].id)
+        token = url.rstrip("/").rsplit("/", 1)[1]
+        self.assertEqual(callbacks.parse_token(token), (self.submission.id, self.run_id, self.testcases[0].id))
+        with self.assertRaises(signing.BadSignature):
+            callbacks.parse_token(signing.dumps([1, 2], salt=callbacks.SIGNING_SALT))
+
+
+def resubmit(submission):
+    """Submission mới của cùng user / trận."""
+    return Submission.objects.create(
+        match=submission.match, user=submission.user, problem=submission.problem,
+        language=submission.language, source_code=submission.source_code,
+    )
+
+
+class SchedulerMixin(FakeRedisMixin):
+    def setUp(self):
+        super().setUp()
+        for name in ("judge_task", "drain_judge_backlog"):
+            patcher = mock.patch.object(getattr(scheduler.judge_tasks, name), "apply_async")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def dispatched(self):
+        return [call.args[0][0] for call in scheduler.judge_tasks.judge_task.apply_async.call_args_list]
+
+
+class SchedulerTests(SchedulerMixin, TestCase):
+    def test_per_user_inflight_limit_and_backlog(self):
+        first = make_submission(["0"])
+        second, third = resubmit(first), resubmit(first)
+
+        with mock.patch.object(scheduler, "JUDGE_USER_MAX_INFLIGHT", 2):
+            self.assertEqual(scheduler.enqueue(first), 0)
+            self.assertEqual(scheduler.enqueue(second), 0)
+            self.assertEqual(scheduler.enqueue(third), 1)
+            self.assertEqual(self.dispatched(), [first.id, second.id])
+            self.assertEqual(self.redis.hget(scheduler.BACKLOG_COUNT_KEY, scheduler.LIVE), "1")
+
+            scheduler.release(first.user_id, first.id)
+        self.assertEqual(self.dispatched(), [first.id, second.id, third.id])
+        self.assertEqual(self.redis.hget(scheduler.BACKLOG_COUNT_KEY, scheduler.LIVE), "0")
+        scheduler.judge_tasks.drain_judge_backlog.apply_async.assert_called_once()
+
+    def test_live_backlog_released_before_practice(self):
+        practice = make_submission(["0"])
+        practice.match.status = Match.MatchStatus.PENDING
+        practice.match.save()
+        live = resubmit(practice)
+
+        with mock.patch.object(scheduler, "JUDGE_USER_MAX_INFLIGHT", 1):
+            running = resubmit(practice)
+            scheduler.enqueue(running, priority=scheduler.LIVE)
+            scheduler.enqueue(practice)
+            scheduler.enqueue(live, priority=scheduler.LIVE)
+            scheduler.release(running.user_id, running.id)
+        self.assertEqual(self.dispatched()[-1], live.id)
+
+    def test_rejudge_bypasses_backlog(self):
+        submission = make_submission(["0"])
+        with mock.patch.object(scheduler, "JUDGE_USER_MAX_INFLIGHT", 0):
+            self.assertEqual(scheduler.enqueue(submission, priority=scheduler.REJUDGE), 0)
+        self.assertEqual(self.dispatched(), [submission.id])
+        call = scheduler.judge_tasks.judge_task.apply_async.call_args
+        self.assertEqual(call.kwargs["queue"], scheduler.JUDGE_QUEUES[scheduler.REJUDGE])
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class CancelOnMatchDecidedTests(SchedulerMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(scheduler.app.control, "revoke")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def decide(self, match, status=Match.MatchStatus.COMPLETED):
+        match.status = status
+        with self.captureOnCommitCallbacks(execute=True):
+            match.save()
+
+    def status(self, submission):
+        submission.refresh_from_db()
+        return submission.status
+
+    def test_queued_and_backlogged_submissions_cancelled(self):
+        running = make_submission(["0"])
+        backlogged = resubmit(running)
+        with mock.patch.object(scheduler, "JUDGE_USER_MAX_INFLIGHT", 1):
+            scheduler.enqueue(running)
+            scheduler.enqueue(backlogged)
+
+        self.decide(running.match)
+        self.assertEqual(self.status(running), Submission.SubmissionStatus.CANCELLED)
+        self.assertEqual(self.status(backlogged), Submission.SubmissionStatus.CANCELLED)
+        scheduler.app.control.revoke.assert_called_once()
+        self.assertEqual(self.redis.llen(scheduler.backlog_key(running.user_id, scheduler.LIVE)), 0)
+        self.assertTrue(scheduler.match_decided(running.match_id))
+
+    def test_rejudge_not_cancelled(self):
+        submission = make_submission(["0"])
+        scheduler.enqueue(submission)
+        scheduler.enqueue(submission, priority=scheduler.REJUDGE)
+
+        self.decide(submission.match)
+        self.assertEqual(self.status(submission), Submission.SubmissionStatus.PENDING)
+
+    def test_only_transition_into_decided_cancels(self):
+        submission = make_submission(["0"])
+        self.decide(submission.match)
+        with mock.patch.object(scheduler, "cancel_match") as cancel_match:
+            self.decide(submission.match)
+            self.decide(submission.match, Match.MatchStatus.CHEATING)
+        cancel_match.assert_not_called()
+
+    def test_status_change_detected_without_extra_query(self):
+        match = Match.objects.get(pk=make_submission(["0"]).match_id)
+        match.status = Match.MatchStatus.COMPLETED
+        with mock.patch.object(scheduler, "cancel_match") as cancel_match:
+            with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+                match.save()
+            cancel_match.assert_called_once_with(match)
+
+            # Trận đã kết thúc được đọc lại từ DB rồi save: không hủy lần nữa
+            self.decide(Match.objects.get(pk=match.pk), Match.MatchStatus.CHEATING)
+        cancel_match.assert_called_once()
+
+
+class ResultsStorageTests(TestCase):
+    def details(self, n, output="ok"):
+        return [
+            {"testcase_id": i, "actual_output": output, "status": "ACCEPTED", "exec_time": 0.01, "memory": 10}
+            for i in range(n)
+        ]
+
+    def test_small_results_stored_as_is(self):
+        details = self.details(2)
+        self.assertEqual(results.pack(details), details)
+        self.assertEqual(results.unpack(results.pack(details)), details)
+
+    def test_large_results_compressed(self):
+        details = self.details(200, output="x" * 50)
+        packed = results.pack(details)
+        self.assertEqual(packed["format"], results.ZLIB_FORMAT)
+        self.assertLess(len(packed["data"]), len(json.dumps(details)) // 4)
+        self.assertEqual(results.unpack(packed), details)
+
+    def test_legacy_rows_drop_testcase_data(self):
+        legacy = [{"testcase_id": 1, "input": "1 2", "expected_output": "3", "actual_output": "3", "status": "ACCEPTED"}]
+        self.assertEqual(results.unpack(legacy), [{"testcase_id": 1, "actual_output": "3", "status": "ACCEPTED"}])
+        self.assertEqual(results.unpack(None), [])
+
+    def test_truncate_output(self):
+        with mock.patch.object(results, "JUDGE_RESULT_OUTPUT_PREFIX", 3):
+            self.assertEqual(results.truncate_output("abcdef"), ("abc", True))
+            self.assertEqual(results.truncate_output("abc"), ("abc", False))
+
+    def test_expand_hides_hidden_testcases(self):
+        problem = Problem.objects.create(title="Expand", description="-")
+        sample = ProblemTestCase.objects.create(problem=problem, input_data="1", expected_output="2", is_hidden=False)
+        hidden = ProblemTestCase.objects.create(problem=problem, input_data="3", expected_output="4")
+        details = [{"testcase_id": sample.id}, {"testcase_id": hidden.id}]
+
+        expanded = results.expand(details)
+        self.assertEqual((expanded[0]["input"], expanded[0]["expected_output"]), ("1", "2"))
+        self.assertNotIn("input", expanded[1])
+        self.assertEqual(results.expand(details, include_hidden=True)[1]["input"], "3")
@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
     SubmissionDetailAPIView,
+    judge0_callback_view,
     languages_view,
 )
 
@@ -10,4 +11,7 @@ urlpatterns = [
 
     # 🧩 API hiện có: submission detail
     path('submissions/<int:submission_id>/', SubmissionDetailAPIView.as_view(), name='submission-detail'),
+
+    # 📨 Judge0 callback (JUDGE_MODE = "callback")
+    path('judge0/callback/<str:token>/', judge0_callback_view, name='judge0-callback'),
 ]
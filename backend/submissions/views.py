@@ -9,7 +9,11 @@ from .tasks import judge_task
 # ==========================================================
 # 🧠 API LẤY NGÔN NGỮ (cho frontend)
 # ==========================================================
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny
+from django.core import signing
+from code_battle_api.judge0_service import parse_callback
+from . import callbacks
 import json, os, logging
 
 logger = logging.getLogger(__name__)
@@ -45,5 +49,29 @@ class SubmissionDetailAPIView(APIView):
         except Submission.DoesNotExist:
             return Response({"error": "Submission not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = SubmissionResultSerializer(submission)
+        # ?expand=1: kèm input / expected output của từng test case (test ẩn chỉ cho admin)
+        serializer = SubmissionResultSerializer(submission, context={
+            "request": request,
+            "expand": request.query_params.get("expand") in ("1", "true"),
+        })
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+# ==========================================================
+# 📨 JUDGE0 CALLBACK (JUDGE_MODE = "callback")
+# ==========================================================
+@api_view(["PUT", "POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def judge0_callback_view(request, token):
+    """
+    Judge0 PUT kết quả một test về đây. Token trong URL được ký bằng SECRET_KEY
+    nên không cần đăng nhập; token sai / hết hạn bị từ chối.
+    """
+    try:
+        submission_id, run_id, testcase_id = callbacks.parse_token(token)
+    except signing.BadSignature:
+        return Response({"detail": "Invalid callback token."}, status=status.HTTP_403_FORBIDDEN)
+
+    callbacks.record_result(submission_id, run_id, testcase_id, parse_callback(request.data))
+    return Response(status=status.HTTP_204_NO_CONTENT)
@@ -4,10 +4,9 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from datetime import timedelta
 
+from users import last_seen, presence
 from users.models import UserProfile
-from users.serializers import UserProfileSerializer
 from matches.models import Match
 from problems.models import Problem
 
@@ -22,30 +21,38 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         if not self.user.is_authenticated:
             return await self.close()
 
-        self.global_group = "dashboard_global"
+        # Chỉ nhận delta của kênh mình (preferred_language / preferred_difficulty)
+        self.profile = await self._get_profile()
+        self.shard_group = presence.shard_group(
+            self.profile.preferred_language, self.profile.preferred_difficulty
+        )
         self.personal_group = f"user_{self.user.id}"
 
-        await self.channel_layer.group_add(self.global_group, self.channel_name)
+        await self.channel_layer.group_add(self.shard_group, self.channel_name)
         await self.channel_layer.group_add(self.personal_group, self.channel_name)
 
         await self.accept()
         await self._set_online(True)
 
+        # Danh sách đầy đủ chỉ gửi lúc kết nối, sau đó client nhận player_deltas
         players = await self._online_players()
         await self.send_json("player_list", {"players": players})
 
-        await self._broadcast_user_update()
+        await presence.apublish([self.user.id], presence.JOIN)
 
     async def disconnect(self, code):
-        if self.user.is_authenticated:
-            await self._set_online(False)
-            await self._broadcast_user_update()
+        if not self.user.is_authenticated:
+            return
 
-        await self.channel_layer.group_discard(self.global_group, self.channel_name)
+        await self._set_online(False)
+        await presence.apublish([self.user.id], presence.LEAVE)
+
+        await self.channel_layer.group_discard(self.shard_group, self.channel_name)
         await self.channel_layer.group_discard(self.personal_group, self.channel_name)
 
     async def receive(self, text_data):
-        await self._touch_last_seen()
+        # last_seen ghi vào Redis, flush xuống DB định kỳ (users/last_seen.py)
+        await last_seen.atouch(self.user.id)
 
         try:
             data = json.loads(text_data)
@@ -54,6 +61,10 @@ class DashboardConsumer(AsyncWebsocketConsumer):
 
         t = data.get("type")
 
+        # Heartbeat của client, chỉ để cập nhật last_seen
+        if t == "ping":
+            return
+
         if t == "send_challenge":
             return await self._send_challenge(data)
 
@@ -129,9 +140,8 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         )
 
     async def event_user_update(self, event):
-        await self.send_json("user_update", event["payload"])
-        players = await self._online_players()
-        await self.send_json("player_list", {"players": players})
+        # Delta đã được encode một lần ở nơi phát (users/presence.py)
+        await self.send(text_data=event["text"])
 
     async def event_receive_challenge(self, event):
         await self.send_json("receive_challenge", event["payload"])
@@ -148,10 +158,6 @@ class DashboardConsumer(AsyncWebsocketConsumer):
     async def send_json(self, t, payload):
         await self.send(text_data=json.dumps({"type": t, "payload": payload}))
 
-    @database_sync_to_async
-    def _touch_last_seen(self):
-        UserProfile.objects.filter(user=self.user).update(last_seen=timezone.now())
-
     @database_sync_to_async
     def _set_online(self, state):
         UserProfile.objects.filter(user=self.user).update(
@@ -160,27 +166,12 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         )
 
     @database_sync_to_async
-    def _serialize_user(self):
-        return UserProfileSerializer(self.user).data
-
-    async def _broadcast_user_update(self):
-        profile = await self._serialize_user()
-        await self.channel_layer.group_send(
-            "dashboard_global",
-            {"type": "event_user_update", "payload": profile}
-        )
+    def _get_profile(self):
+        return UserProfile.objects.get(user=self.user)
 
     @database_sync_to_async
     def _online_players(self):
-        me = UserProfile.objects.get(user=self.user)
-
-        qs = User.objects.filter(
-            userprofile__is_online=True,
-            userprofile__preferred_language=me.preferred_language,
-            userprofile__preferred_difficulty=me.preferred_difficulty
-        ).exclude(id=self.user.id)
-
-        return UserProfileSerializer(qs, many=True).data
+        return presence.online_players(self.profile, exclude_id=self.user.id)
 
     @database_sync_to_async
     def _create_match(self, p1, p2):
@@ -223,7 +214,8 @@ class AdminConsumer(AsyncWebsocketConsumer):
         if not user.is_authenticated or not user.is_staff:
             return await self.close()
 
-        self.group = "dashboard_global"
+        # Stream tổng hợp dành cho admin (users/presence.py), không nhận delta của từng kênh
+        self.group = presence.ADMIN_GROUP
         await self.channel_layer.group_add(self.group, self.channel_name)
 
         await self.accept()
@@ -232,20 +224,10 @@ class AdminConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group, self.channel_name)
 
-    async def event_user_update(self, event):
-        await self.send_stats()
+    async def event_admin_stats(self, event):
+        # Số liệu đã được tính và encode một lần ở nơi phát
+        await self.send(text_data=event["text"])
 
     async def send_stats(self):
-        count = await self._count_active_users()
-        await self.send(text_data=json.dumps({
-            "type": "stats_update",
-            "active_users": count
-        }))
-
-    @database_sync_to_async
-    def _count_active_users(self):
-        threshold = timezone.now() - timedelta(seconds=20)
-        return UserProfile.objects.filter(
-            last_seen__gte=threshold,
-            user__is_staff=False
-        ).count()
+        message = await database_sync_to_async(presence.admin_stats_message)()
+        await self.send(text_data=message["text"])
@@ -0,0 +1,84 @@
+"""
+last_seen ghi vào Redis (write-behind) thay vì UPDATE UserProfile mỗi request.
+
+    users:last_seen   zset user_id -> thời điểm hoạt động gần nhất (unix time)
+
+touch() / atouch() được gọi bởi heartbeat websocket ("ping" mỗi 10 giây của
+client), REST request (TouchLastSeenMixin) và lúc kết nối websocket
+(TokenAuthMiddleware): mỗi lần chỉ là một ZADD. flush() lấy toàn bộ zset (atomic)
+và ghi vào UserProfile.last_seen bằng bulk_update, chạy định kỳ trong vòng lặp
+cleanup của asgi.py trước cleanup_offline_users. DB chỉ trễ tối đa một chu kỳ
+flush so với Redis.
+
+Metrics: users.last_seen.flushed (số profile được ghi)
+"""
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from django.conf import settings
+from django.db import DatabaseError
+
+from code_battle_api import metrics
+from code_battle_api.redis_client import get_async_redis, get_redis
+
+from .models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+LAST_SEEN_KEY = "users:last_seen"
+LAST_SEEN_FLUSH_BATCH = getattr(settings, "LAST_SEEN_FLUSH_BATCH", 500)
+
+# KEYS: last_seen | Trả về [user_id, score, ...] và xoá zset trong cùng một bước
+TAKE_SCRIPT = """
+local entries = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+redis.call('DEL', KEYS[1])
+return entries
+"""
+
+
+def touch(user_id):
+    try:
+        get_redis().zadd(LAST_SEEN_KEY, {user_id: time.time()})
+    except redis.RedisError as e:
+        logger.debug(f"last_seen.touch({user_id}) failed: {e}")
+
+
+async def atouch(user_id):
+    try:
+        await get_async_redis().zadd(LAST_SEEN_KEY, {user_id: time.time()})
+    except redis.RedisError as e:
+        logger.debug(f"last_seen.atouch({user_id}) failed: {e}")
+
+
+def flush():
+    """Ghi last_seen đang nằm trong Redis xuống DB, trả về số profile được cập nhật."""
+    client = get_redis()
+    try:
+        entries = client.register_script(TAKE_SCRIPT)(keys=[LAST_SEEN_KEY])
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ [USERS] last_seen flush unavailable: {e}")
+        return 0
+
+    seen = {int(entries[i]): float(entries[i + 1]) for i in range(0, len(entries), 2)}
+    if not seen:
+        return 0
+
+    profiles = [
+        UserProfile(user_id=user_id, last_seen=datetime.fromtimestamp(ts, tz=dt_timezone.utc))
+        for user_id, ts in seen.items()
+    ]
+    try:
+        UserProfile.objects.bulk_update(profiles, ["last_seen"], batch_size=LAST_SEEN_FLUSH_BATCH)
+    except DatabaseError as e:
+        logger.warning(f"⚠️ [USERS] last_seen flush of {len(seen)} users failed: {e}")
+        # Trả lại để lần flush sau ghi tiếp (không đè heartbeat mới hơn)
+        try:
+            client.zadd(LAST_SEEN_KEY, seen, gt=True)
+        except redis.RedisError:
+            pass
+        return 0
+
+    metrics.incr("users.last_seen.flushed", len(seen))
+    return len(seen)
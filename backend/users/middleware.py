@@ -3,10 +3,9 @@ from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.tokens import AccessToken
 from urllib.parse import parse_qs
-from django.utils import timezone
 from django.db import close_old_connections
 from django.contrib.auth import get_user_model
-from users.models import UserProfile
+from users import last_seen
 
 User = get_user_model()
 
@@ -19,15 +18,8 @@ def get_user_from_token(token_key):
     except Exception:
         return AnonymousUser()
 
-@database_sync_to_async
-def update_last_seen(user):
-    UserProfile.objects.filter(user=user).update(
-        is_online=True,
-        last_seen=timezone.now()
-    )
-
 class TokenAuthMiddleware:
-    """Middleware xác thực WebSocket bằng JWT + cập nhật last_seen."""
+    """Middleware xác thực WebSocket bằng JWT + cập nhật last_seen (Redis, xem users/last_seen.py)."""
 
     def __init__(self, inner):
         self.inner = inner
@@ -49,6 +41,6 @@ class TokenAuthMiddleware:
             scope["user"] = AnonymousUser()
         else:
             scope["user"] = user
-            await update_last_seen(user)
+            await last_seen.atouch(user.id)
 
         return await self.inner(scope, receive, send)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_userprofile_last_seen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='losses',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,192 @@
+"""
+Cập nhật danh sách người chơi online trên dashboard dạng delta.
+
+Client nhận toàn bộ danh sách một lần khi kết nối ("player_list"), sau đó chỉ
+nhận delta khi có người vào / ra / đổi thông tin:
+
+    {"type": "player_deltas", "payload": {"deltas": [
+        {"op": "join" | "leave" | "update", "player": {...}}, ...
+    ]}}
+
+"player" là UserProfileSerializer của người đó. Các thay đổi (login / logout,
+dashboard connect / disconnect, cleanup_offline_users, kết thúc trận...) được
+PresenceBroadcaster gom theo cửa sổ thời gian; delta được query, serialize và
+encode JSON đúng một lần khi flush, các consumer chỉ chuyển tiếp nguyên văn.
+
+Group theo kênh (shard): dashboard socket chỉ join dashboard_{language}_{difficulty}
+theo preferred_language / preferred_difficulty của mình, delta của một người chơi
+chỉ gửi tới shard của người đó, nên số message mỗi event tỉ lệ với cỡ kênh chứ
+không phải tổng số user. Admin nhận số liệu tổng hợp ("stats_update") qua group
+dashboard_admin, tính một lần mỗi cửa sổ.
+"""
+import json
+import logging
+import re
+import threading
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from code_battle_api import metrics
+
+from .models import UserProfile
+from .serializers import UserProfileSerializer, with_global_rank
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+# Cửa sổ (giây) gom các thay đổi presence trước khi gửi; 0 = gửi ngay
+PRESENCE_BROADCAST_WINDOW = getattr(settings, "PRESENCE_BROADCAST_WINDOW", 0.25)
+
+ADMIN_GROUP = "dashboard_admin"
+# User có last_seen trong khoảng này được tính là đang hoạt động (stats của admin)
+ACTIVE_WINDOW = timedelta(seconds=getattr(settings, "USER_ONLINE_TIMEOUT", 30))
+
+JOIN = "join"
+LEAVE = "leave"
+UPDATE = "update"
+
+
+def shard_group(language, difficulty):
+    """Tên group của kênh (chỉ chứa ký tự hợp lệ cho group name của Channels)."""
+    name = f"dashboard_{language}_{difficulty}"
+    return re.sub(r"[^0-9A-Za-z_.-]", "-", name)[:90]
+
+
+def players(user_ids):
+    """UserProfileSerializer của các user (một query kể cả global_rank)."""
+    qs = with_global_rank(User.objects.filter(id__in=user_ids))
+    return UserProfileSerializer(qs, many=True).data
+
+
+def online_players(profile, exclude_id=None):
+    """Danh sách đầy đủ người đang online cùng kênh với `profile`."""
+    qs = User.objects.filter(
+        userprofile__is_online=True,
+        userprofile__preferred_language=profile.preferred_language,
+        userprofile__preferred_difficulty=profile.preferred_difficulty,
+    ).exclude(id=exclude_id)
+    return UserProfileSerializer(with_global_rank(qs), many=True).data
+
+
+def active_users_count():
+    return UserProfile.objects.filter(
+        last_seen__gte=timezone.now() - ACTIVE_WINDOW,
+        user__is_staff=False,
+    ).count()
+
+
+def admin_stats_message():
+    return {
+        "type": "event_admin_stats",
+        "text": json.dumps({"type": "stats_update", "active_users": active_users_count()}),
+    }
+
+
+def deltas_message(deltas):
+    return {
+        "type": "event_user_update",
+        "text": json.dumps({"type": "player_deltas", "payload": {"deltas": deltas}}),
+    }
+
+
+class PresenceBroadcaster:
+    """
+    Gom các thay đổi presence trong cửa sổ PRESENCE_BROADCAST_WINDOW giây rồi gửi
+    một lần: mỗi shard một message chứa danh sách delta, admin một message stats.
+    Nhiều thay đổi của cùng một user (cùng shard) trong một cửa sổ chỉ giữ cái
+    cuối cùng. Cửa sổ bắt đầu từ thay đổi đầu tiên, được flush bởi timer.
+
+    Metrics: presence.broadcast.updates (thay đổi nhận vào) / .messages (message
+    đã gửi lên channel layer).
+    """
+
+    def __init__(self, window=None):
+        self.window = PRESENCE_BROADCAST_WINDOW if window is None else window
+        self.lock = threading.Lock()
+        # (user_id, shard hoặc None = shard hiện tại) -> op
+        self.pending = {}
+        self.timer = None
+
+    def add(self, user_ids, op, shard=None):
+        with self.lock:
+            for user_id in user_ids:
+                # Đưa xuống cuối để thứ tự delta theo lần thay đổi cuối cùng
+                self.pending.pop((user_id, shard), None)
+                self.pending[(user_id, shard)] = op
+
+            batch = None
+            if self.window <= 0:
+                batch = self._take()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+        metrics.incr("presence.broadcast.updates", len(user_ids))
+        if batch:
+            self._emit(batch)
+
+    def flush(self):
+        """Gửi ngay các thay đổi đang gom (gọi bởi timer)."""
+        with self.lock:
+            if not self.pending:
+                return
+            batch = self._take()
+        self._emit(batch)
+
+    def _take(self):
+        # Gọi khi đang giữ self.lock
+        batch, self.pending = self.pending, {}
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return batch
+
+    def _emit(self, batch):
+        try:
+            messages = batch_messages(batch)
+            channel_layer = get_channel_layer()
+            for group, message in messages:
+                async_to_sync(channel_layer.group_send)(group, message)
+            metrics.incr("presence.broadcast.messages", len(messages))
+        except Exception as e:
+            logger.warning(f"⚠️ [PRESENCE] Broadcast of {len(batch)} updates failed: {e}")
+
+
+def batch_messages(batch):
+    """
+    [(group, message)] cho các thay đổi {(user_id, shard): op}: mỗi shard một
+    message (delta gửi tới shard hiện tại của user, hoặc `shard` nếu chỉ định,
+    vd. kênh cũ khi user đổi preferences), kèm một message stats cho admin.
+    """
+    by_id = {player["id"]: player for player in players({user_id for user_id, _ in batch})}
+    grouped = {}
+    for (user_id, shard), op in batch.items():
+        player = by_id.get(user_id)
+        if player is None:
+            continue
+        group = shard or shard_group(player["preferred_language"], player["preferred_difficulty"])
+        grouped.setdefault(group, []).append({"op": op, "player": player})
+
+    result = [(group, deltas_message(deltas)) for group, deltas in grouped.items()]
+    result.append((ADMIN_GROUP, admin_stats_message()))
+    return result
+
+
+broadcaster = PresenceBroadcaster()
+
+
+def publish(user_ids, op, shard=None):
+    """Thêm thay đổi presence vào cửa sổ hiện tại (gọi từ code sync: view, task)."""
+    broadcaster.add(user_ids, op, shard)
+
+
+async def apublish(user_ids, op, shard=None):
+    """Như publish, gọi từ consumer."""
+    await database_sync_to_async(broadcaster.add)(user_ids, op, shard)
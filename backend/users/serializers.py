@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.db.models import F, Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.timezone import localtime
 
 from .models import UserProfile, UserStats, UserActivityLog
@@ -91,6 +93,22 @@ class UserStatsSerializer(serializers.ModelSerializer):
         higher = UserProfile.objects.filter(rating__gt=p.rating).count()
         return higher + 1
 
+def with_global_rank(queryset):
+    """
+    Gắn global_rank (số profile có rating cao hơn + 1) vào queryset User bằng một
+    subquery, để serialize danh sách không tốn một COUNT cho mỗi user.
+    """
+    higher = (
+        UserProfile.objects.filter(rating__gt=OuterRef("userprofile__rating"))
+        .order_by()
+        .annotate(total=Func(F("pk"), function="COUNT"))
+        .values("total")
+    )
+    return queryset.select_related("userprofile").annotate(
+        annotated_global_rank=Coalesce(Subquery(higher), 0) + 1
+    )
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     rating = serializers.SerializerMethodField()
     rank = serializers.SerializerMethodField()
@@ -131,6 +149,9 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return p.rank if p else "Bronze"
 
     def get_global_rank(self, obj):
+        # Đã tính sẵn bởi with_global_rank()
+        if hasattr(obj, "annotated_global_rank"):
+            return obj.annotated_global_rank
         p = self._get_profile(obj)
         if not p:
             return None
@@ -1,37 +1,28 @@
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
+from users import last_seen, presence
 from users.models import UserProfile
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+
+# Không có heartbeat / request nào trong khoảng này (giây) thì coi như offline
+USER_ONLINE_TIMEOUT = getattr(settings, "USER_ONLINE_TIMEOUT", 30)
+
+
+def flush_last_seen():
+    return last_seen.flush()
 
 
 def cleanup_offline_users():
-    threshold = timezone.now() - timedelta(seconds=20)
+    threshold = timezone.now() - timedelta(seconds=USER_ONLINE_TIMEOUT)
 
     stale_users = UserProfile.objects.filter(
         last_seen__lt=threshold,
         is_online=True
     )
 
-    if not stale_users.exists():
+    stale_ids = list(stale_users.values_list("user_id", flat=True))
+    if not stale_ids:
         return
 
-    channel_layer = get_channel_layer()
-
-    for profile in stale_users:
-        # Update offline status
-        profile.is_online = False
-        profile.save(update_fields=["is_online"])
-
-        # 🔥 FIX: Change to event_user_update (consumer handler exists)
-        async_to_sync(channel_layer.group_send)(
-            "dashboard_global",
-            {
-                "type": "event_user_update",
-                "payload": {
-                    "id": profile.user.id,
-                    "username": profile.user.username,
-                    "is_online": False,
-                }
-            }
-        )
+    stale_users.filter(user_id__in=stale_ids).update(is_online=False)
+    presence.publish(stale_ids, presence.LEAVE)
@@ -0,0 +1,254 @@
+import json
+import threading
+import time
+from unittest import mock
+
+import fakeredis
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from code_battle_api import metrics, redis_client
+
+from . import last_seen, presence
+from .models import UserProfile
+from .routing import websocket_urlpatterns
+
+IN_MEMORY_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class FakeRedisMixin:
+    """Redis (metrics, last_seen) là fakeredis, client async dùng chung server với client sync."""
+
+    def setUp(self):
+        super().setUp()
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+        for patcher in (
+            mock.patch.object(redis_client, "_client", self.redis),
+            mock.patch.object(
+                last_seen, "get_async_redis",
+                lambda: fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class DashboardConsumerTests(FakeRedisMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        # Gửi ngay, không chờ timer của cửa sổ
+        patcher = mock.patch.object(presence.broadcaster, "window", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def user(self, username, online=False, language="cpp", difficulty="easy"):
+        user = User.objects.create_user(username, password="x")
+        UserProfile.objects.filter(user=user).update(
+            is_online=online, preferred_language=language, preferred_difficulty=difficulty,
+        )
+        return user
+
+    def communicator(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/dashboard/")
+        communicator.scope["user"] = user
+        return communicator
+
+    def test_full_list_on_connect_then_deltas(self):
+        alice = self.user("alice", online=True)
+        self.user("carol", online=True, language="python")
+        bob = self.user("bob")
+
+        async def scenario():
+            listener, joiner = self.communicator(bob), self.communicator(alice)
+            self.assertTrue((await listener.connect())[0])
+            player_list = await listener.receive_json_from()
+            own_join = await listener.receive_json_from()
+
+            await joiner.connect()
+            await joiner.receive_json_from()  # player_list của alice
+            alice_join = await listener.receive_json_from()
+
+            await joiner.disconnect()
+            alice_leave = await listener.receive_json_from()
+            await listener.disconnect()
+            return player_list, own_join, alice_join, alice_leave
+
+        player_list, own_join, alice_join, alice_leave = async_to_sync(scenario)()
+        self.assertEqual(player_list["type"], "player_list")
+        self.assertEqual([p["username"] for p in player_list["payload"]["players"]], ["alice"])
+
+        self.assertEqual(own_join["type"], "player_deltas")
+        self.assertEqual(own_join["payload"]["deltas"][0]["op"], presence.JOIN)
+        self.assertEqual(own_join["payload"]["deltas"][0]["player"]["username"], "bob")
+
+        [delta] = alice_join["payload"]["deltas"]
+        self.assertEqual((delta["op"], delta["player"]["username"]), (presence.JOIN, "alice"))
+        [delta] = alice_leave["payload"]["deltas"]
+        self.assertEqual((delta["op"], delta["player"]["username"]), (presence.LEAVE, "alice"))
+
+    def test_deltas_are_serialized_once_per_event(self):
+        users = [self.user(f"u{i}", online=True) for i in range(5)]
+        batch = {(user.id, None): presence.UPDATE for user in users}
+
+        with self.assertNumQueries(2):  # players + active_users_count
+            messages = presence.batch_messages(batch)
+
+        [(group, message), _] = messages
+        self.assertEqual(group, presence.shard_group("cpp", "easy"))
+        deltas = json.loads(message["text"])["payload"]["deltas"]
+        self.assertEqual([d["player"]["id"] for d in deltas], [user.id for user in users])
+
+    def test_deltas_only_reach_the_players_shard(self):
+        cpp, python = self.user("cpp"), self.user("py", language="python")
+        staff = User.objects.create_user("admin", password="x", is_staff=True)
+
+        async def scenario():
+            cpp_socket, python_socket = self.communicator(cpp), self.communicator(python)
+            admin = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/admin/dashboard/")
+            admin.scope["user"] = staff
+            await admin.connect()
+            initial_stats = await admin.receive_json_from()
+
+            await cpp_socket.connect()
+            await cpp_socket.receive_json_from()  # player_list
+            await cpp_socket.receive_json_from()  # join của chính mình
+            await python_socket.connect()
+            await python_socket.receive_json_from()
+            await python_socket.receive_json_from()
+
+            cpp_got_python_join = not await cpp_socket.receive_nothing()
+            stats = [await admin.receive_json_from() for _ in range(2)]
+            for communicator in (cpp_socket, python_socket, admin):
+                await communicator.disconnect()
+            return initial_stats, cpp_got_python_join, stats
+
+        initial_stats, cpp_got_python_join, stats = async_to_sync(scenario)()
+        self.assertFalse(cpp_got_python_join)
+        self.assertEqual(initial_stats["type"], "stats_update")
+        self.assertEqual([s["type"] for s in stats], ["stats_update"] * 2)
+
+    def test_batch_messages_group_by_shard(self):
+        cpp, python = self.user("cpp"), self.user("py", language="python", difficulty="hard")
+        old_shard = presence.shard_group("java", "easy")
+        messages = dict(presence.batch_messages({
+            (cpp.id, None): presence.JOIN,
+            (python.id, None): presence.UPDATE,
+            (python.id, old_shard): presence.LEAVE,
+        }))
+
+        def deltas(group):
+            return [(d["op"], d["player"]["id"]) for d in json.loads(messages[group]["text"])["payload"]["deltas"]]
+
+        self.assertEqual(set(messages), {
+            presence.shard_group("cpp", "easy"), presence.shard_group("python", "hard"),
+            old_shard, presence.ADMIN_GROUP,
+        })
+        self.assertEqual(deltas(presence.shard_group("cpp", "easy")), [(presence.JOIN, cpp.id)])
+        self.assertEqual(deltas(presence.shard_group("python", "hard")), [(presence.UPDATE, python.id)])
+        self.assertEqual(deltas(old_shard), [(presence.LEAVE, python.id)])
+        self.assertEqual(messages[presence.ADMIN_GROUP]["type"], "event_admin_stats")
+
+    def test_shard_group_is_a_valid_group_name(self):
+        self.assertEqual(presence.shard_group("c++", "very hard"), "dashboard_c--_very-hard")
+
+
+class PresenceBroadcasterTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.group_send = mock.AsyncMock()
+        patcher = mock.patch.object(
+            presence, "get_channel_layer", return_value=mock.Mock(group_send=self.group_send),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+
+    def sent_deltas(self):
+        return [
+            [(d["op"], d["player"]["id"]) for d in json.loads(message["text"])["payload"]["deltas"]]
+            for (group, message), _ in self.group_send.await_args_list
+            if group != presence.ADMIN_GROUP
+        ]
+
+    def test_window_keeps_last_op_per_user(self):
+        broadcaster = presence.PresenceBroadcaster(window=60)
+        self.addCleanup(broadcaster.flush)
+        broadcaster.add([self.alice.id], presence.JOIN)
+        broadcaster.add([self.bob.id], presence.JOIN)
+        broadcaster.add([self.alice.id], presence.LEAVE)
+        self.group_send.assert_not_awaited()
+
+        broadcaster.flush()
+        self.assertEqual(self.sent_deltas(), [[(presence.JOIN, self.bob.id), (presence.LEAVE, self.alice.id)]])
+        self.assertEqual(metrics.snapshot(), {
+            "presence.broadcast.updates": 3, "presence.broadcast.messages": 2,
+        })
+
+    def test_zero_window_sends_immediately(self):
+        broadcaster = presence.PresenceBroadcaster(window=0)
+        broadcaster.add([self.alice.id], presence.JOIN)
+        broadcaster.add([self.alice.id], presence.LEAVE)
+        self.assertEqual(self.sent_deltas(), [[(presence.JOIN, self.alice.id)], [(presence.LEAVE, self.alice.id)]])
+        self.assertIsNone(broadcaster.timer)
+
+    def test_timer_flushes_window(self):
+        broadcaster = presence.PresenceBroadcaster(window=0.01)
+        flushed = threading.Event()
+        # Timer chạy ở thread khác (không thấy transaction của test), chỉ kiểm tra batch được gửi
+        with mock.patch.object(broadcaster, "_emit", side_effect=lambda batch: flushed.set()) as emit:
+            broadcaster.add([self.alice.id, self.bob.id], presence.UPDATE)
+            self.assertTrue(flushed.wait(5))
+        emit.assert_called_once_with({(self.alice.id, None): presence.UPDATE, (self.bob.id, None): presence.UPDATE})
+        self.assertIsNone(broadcaster.timer)
+
+
+class LastSeenTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+
+    def last_seen_of(self, user):
+        return UserProfile.objects.get(user=user).last_seen.timestamp()
+
+    def test_touch_does_not_write_database(self):
+        with self.assertNumQueries(0):
+            last_seen.touch(self.alice.id)
+            async_to_sync(last_seen.atouch)(self.bob.id)
+        self.assertEqual(self.redis.zcard(last_seen.LAST_SEEN_KEY), 2)
+
+    def test_flush_writes_profiles_and_clears_redis(self):
+        self.redis.zadd(last_seen.LAST_SEEN_KEY, {self.alice.id: 1000, self.bob.id: 2000})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(last_seen.flush(), 2)
+
+        self.assertEqual(self.last_seen_of(self.alice), 1000)
+        self.assertEqual(self.last_seen_of(self.bob), 2000)
+        self.assertFalse(self.redis.exists(last_seen.LAST_SEEN_KEY))
+        self.assertEqual(metrics.snapshot(), {"users.last_seen.flushed": 2})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(last_seen.flush(), 0)
+
+    def test_failed_flush_keeps_newer_heartbeats(self):
+        self.redis.zadd(last_seen.LAST_SEEN_KEY, {self.alice.id: 1000, self.bob.id: 2000})
+        now = time.time()
+
+        def heartbeat_then_fail(*args, **kwargs):
+            # Heartbeat mới tới trong lúc đang flush
+            last_seen.touch(self.alice.id)
+            raise DatabaseError("gone away")
+
+        with mock.patch.object(UserProfile.objects, "bulk_update", side_effect=heartbeat_then_fail):
+            self.assertEqual(last_seen.flush(), 0)
+
+        self.assertGreaterEqual(self.redis.zscore(last_seen.LAST_SEEN_KEY, self.alice.id), now)
+        self.assertEqual(self.redis.zscore(last_seen.LAST_SEEN_KEY, self.bob.id), 2000)
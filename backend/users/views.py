@@ -6,8 +6,6 @@ from django.db import connection
 from django.db.models import Count, Window, F
 from django.db.models.functions import Rank, TruncHour
 from django.utils import timezone
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 
 from rest_framework import status, generics
 from rest_framework.decorators import api_view, permission_classes
@@ -17,9 +15,11 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.core.mail import send_mail
 
+from code_battle_api import metrics
 from code_battle_api.asgi import SERVER_START_TIME
 from problems.models import Problem
 from matches.models import Match
+from submissions import scheduler
 from .models import PasswordResetOTP
 from .models import UserProfile, UserStats, UserActivityLog
 from .serializers import (
@@ -27,18 +27,18 @@ from .serializers import (
     RegisterSerializer,
     UserProfileSerializer,
     UserStatsSerializer,
+    with_global_rank,
 )
+from . import last_seen, presence
 
 # ========================================
 # LAST SEEN UPDATE MIXIN
 # ========================================
 class TouchLastSeenMixin:
-    """Tự động update last_seen mỗi khi FE gọi API."""
+    """Tự động update last_seen mỗi khi FE gọi API (ghi vào Redis, flush định kỳ)."""
     def dispatch(self, request, *args, **kwargs):
         if request.user.is_authenticated:
-            profile = request.user.userprofile
-            profile.last_seen = timezone.now()
-            profile.save(update_fields=["last_seen"])
+            last_seen.touch(request.user.id)
         return super().dispatch(request, *args, **kwargs)
 
 
@@ -56,19 +56,7 @@ class MyTokenObtainPairView(TokenObtainPairView):
             profile.last_seen = timezone.now()
             profile.save(update_fields=["is_online", "last_seen"])
 
-            # 🔥 FIX: dùng event_user_update để tránh WS crash
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                "dashboard_global",
-                {
-                    "type": "event_user_update",
-                    "payload": {
-                        "id": user.id,
-                        "username": user.username,
-                        "is_online": True
-                    }
-                }
-            )
+            presence.publish([user.id], presence.JOIN)
 
         except Exception as e:
             print("Login online-status error:", e)
@@ -93,18 +81,7 @@ def logout_user(request):
         profile.last_seen = timezone.now()
         profile.save(update_fields=["is_online", "last_seen"])
 
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "dashboard_global",
-            {
-                "type": "event_user_update",
-                "payload": {
-                    "id": user.id,
-                    "username": user.username,
-                    "is_online": False,
-                },
-            },
-        )
+        presence.publish([user.id], presence.LEAVE)
 
         return Response({"message": "Logged out"}, status=status.HTTP_200_OK)
 
@@ -149,6 +126,7 @@ class UpdatePreferencesView(TouchLastSeenMixin, APIView):
 
     def post(self, request):
         profile = request.user.userprofile
+        old_shard = presence.shard_group(profile.preferred_language, profile.preferred_difficulty)
         lang = request.data.get("preferred_language")
         diff = request.data.get("preferred_difficulty")
 
@@ -160,6 +138,14 @@ class UpdatePreferencesView(TouchLastSeenMixin, APIView):
         profile.last_seen = timezone.now()
         profile.save()
 
+        # Đổi kênh: kênh cũ nhận leave, kênh mới nhận join
+        new_shard = presence.shard_group(profile.preferred_language, profile.preferred_difficulty)
+        if new_shard != old_shard and profile.is_online:
+            presence.publish([request.user.id], presence.LEAVE, shard=old_shard)
+            presence.publish([request.user.id], presence.JOIN)
+        else:
+            presence.publish([request.user.id], presence.UPDATE)
+
         return Response({"message": "Preferences updated"}, status=status.HTTP_200_OK)
 
 
@@ -175,7 +161,7 @@ class OnlinePlayersView(TouchLastSeenMixin, generics.ListAPIView):
         user = self.request.user
         search_term = self.request.query_params.get("search")
 
-        qs = User.objects.select_related("userprofile").filter(
+        qs = User.objects.filter(
             userprofile__is_online=True,
             is_staff=False,
             userprofile__preferred_language=user.userprofile.preferred_language,
@@ -185,7 +171,7 @@ class OnlinePlayersView(TouchLastSeenMixin, generics.ListAPIView):
         if search_term:
             qs = qs.filter(username__icontains=search_term)
 
-        return qs
+        return with_global_rank(qs)
 
 
 # ========================================
@@ -215,8 +201,7 @@ class LeaderboardView(TouchLastSeenMixin, generics.ListAPIView):
 
     def get_queryset(self):
         return (
-            User.objects.select_related("userprofile")
-            .filter(is_staff=False)
+            with_global_rank(User.objects.filter(is_staff=False))
             .annotate(
                 annotated_rank=Window(
                     expression=Rank(),
@@ -364,6 +349,18 @@ def admin_get_monitor_stats(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def admin_get_metrics(request):
+    """Counter dùng chung của hệ thống (judge0 http, judge cache, queue...)."""
+    data = metrics.snapshot()
+    try:
+        data.update(scheduler.queue_stats())
+    except Exception as e:
+        data["judge.queue.error"] = str(e)
+    return Response(data, status=status.HTTP_200_OK)
+
+
 @api_view(["GET"])
 @permission_classes([IsAdminUser])
 def admin_get_activity_log(request):
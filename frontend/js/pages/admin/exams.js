@@ -4,6 +4,8 @@
 import { apiFetch } from '../../services/api.js';
 import {
     fetchProblems,
+    fetchPage,
+    fetchProblemTestcases,
     createProblem,
     deleteProblem,
     toggleProblemActive,
@@ -36,115 +38,137 @@ export function loadExams() {
 /* ============================================================
    FETCH & RENDER
    ============================================================ */
-async function fetchAndRenderExams() {
+const DIFFICULTY_LEVELS = { easy: 1, medium: 2, hard: 3, very_hard: 4, extreme: 5 };
+
+// Link trang kế tiếp (cursor pagination), null khi đã hết
+let examsNextPage = null;
+
+function currentExamFilters() {
+    const level = document.getElementById('levelFilter')?.value;
+    return { difficulty: DIFFICULTY_LEVELS[level] };
+}
+
+async function fetchAndRenderExams({ append = false } = {}) {
     const tableBody = document.getElementById('examTableBody');
     if (!tableBody) return;
 
-    setLoadingRow(tableBody, 6);
+    if (!append) setLoadingRow(tableBody, 6);
 
     try {
-        const exams = await fetchProblems();
+        const page = append
+            ? await fetchPage(examsNextPage)
+            : await fetchProblems(currentExamFilters());
+        examsNextPage = page.next;
 
-        clearTableBody(tableBody);
+        if (!append) clearTableBody(tableBody);
 
-        if (!exams || exams.length === 0) {
+        if (!append && page.results.length === 0) {
             setNoDataRow(tableBody, 6);
-            return;
         }
 
-        exams.forEach(exam => {
-            const tr = document.createElement('tr');
-            tr.dataset.id = exam.id;
-            tr.dataset.difficulty = difficultyKey(exam.difficulty);
-
-            // ID
-            const tdId = document.createElement('td');
-            tdId.dataset.label = 'ID';
-            tdId.textContent = exam.id;
-
-            // Title
-            const tdTitle = document.createElement('td');
-            tdTitle.dataset.label = 'Tên bộ đề';
-            tdTitle.textContent = exam.title;
-
-            // Difficulty
-            const tdDiff = document.createElement('td');
-            tdDiff.dataset.label = 'Độ khó';
-            const badge = createDifficultyBadge(exam.difficulty);
-            tdDiff.appendChild(badge);
-
-            // Question Count (hiện tại 1 như file gốc)
-            const tdCount = document.createElement('td');
-            tdCount.dataset.label = 'Số câu hỏi';
-            tdCount.textContent = '1';
-
-            // Status
-            const tdStatus = document.createElement('td');
-            tdStatus.dataset.label = 'Trạng thái';
-            const spanStatus = document.createElement('span');
-            const isActive = !!exam.is_active;
-            spanStatus.classList.add('status', isActive ? 'status-active' : 'status-locked');
-            spanStatus.textContent = isActive ? 'Active' : 'Locked';
-            tdStatus.appendChild(spanStatus);
-
-            // Actions
-            const tdActions = document.createElement('td');
-            tdActions.dataset.label = 'Thao tác';
-            tdActions.classList.add('actions-col');
-
-            const btnEdit = document.createElement('button');
-            btnEdit.classList.add('btn-edit');
-            btnEdit.textContent = 'Edit';
-
-            const btnLock = document.createElement('button');
-            btnLock.classList.add('btn-lock', isActive ? 'active' : 'locked');
-            btnLock.textContent = isActive ? 'Lock' : 'Unlock';
-
-            const btnDelete = document.createElement('button');
-            btnDelete.classList.add('btn-delete');
-            btnDelete.textContent = 'Delete';
-
-            tdActions.appendChild(btnEdit);
-            tdActions.appendChild(btnLock);
-            tdActions.appendChild(btnDelete);
-
-            tr.appendChild(tdId);
-            tr.appendChild(tdTitle);
-            tr.appendChild(tdDiff);
-            tr.appendChild(tdCount);
-            tr.appendChild(tdStatus);
-            tr.appendChild(tdActions);
-
-            tableBody.appendChild(tr);
-        });
+        page.results.forEach(exam => tableBody.appendChild(createExamRow(exam)));
     } catch (error) {
         console.error('Failed to fetch exams:', error);
-        clearTableBody(tableBody);
-        setErrorRow(tableBody, 6);
+        examsNextPage = null;
+        if (!append) {
+            clearTableBody(tableBody);
+            setErrorRow(tableBody, 6);
+        }
+    }
+
+    updateLoadMoreButton(tableBody);
+}
+
+function createExamRow(exam) {
+    const tr = document.createElement('tr');
+    tr.dataset.id = exam.id;
+    tr.dataset.difficulty = difficultyKey(exam.difficulty);
+
+    // ID
+    const tdId = document.createElement('td');
+    tdId.dataset.label = 'ID';
+    tdId.textContent = exam.id;
+
+    // Title
+    const tdTitle = document.createElement('td');
+    tdTitle.dataset.label = 'Tên bộ đề';
+    tdTitle.textContent = exam.title;
+
+    // Difficulty
+    const tdDiff = document.createElement('td');
+    tdDiff.dataset.label = 'Độ khó';
+    const badge = createDifficultyBadge(exam.difficulty);
+    tdDiff.appendChild(badge);
+
+    // Question Count (hiện tại 1 như file gốc)
+    const tdCount = document.createElement('td');
+    tdCount.dataset.label = 'Số câu hỏi';
+    tdCount.textContent = '1';
+
+    // Status
+    const tdStatus = document.createElement('td');
+    tdStatus.dataset.label = 'Trạng thái';
+    const spanStatus = document.createElement('span');
+    const isActive = !!exam.is_active;
+    spanStatus.classList.add('status', isActive ? 'status-active' : 'status-locked');
+    spanStatus.textContent = isActive ? 'Active' : 'Locked';
+    tdStatus.appendChild(spanStatus);
+
+    // Actions
+    const tdActions = document.createElement('td');
+    tdActions.dataset.label = 'Thao tác';
+    tdActions.classList.add('actions-col');
+
+    const btnEdit = document.createElement('button');
+    btnEdit.classList.add('btn-edit');
+    btnEdit.textContent = 'Edit';
+
+    const btnLock = document.createElement('button');
+    btnLock.classList.add('btn-lock', isActive ? 'active' : 'locked');
+    btnLock.textContent = isActive ? 'Lock' : 'Unlock';
+
+    const btnDelete = document.createElement('button');
+    btnDelete.classList.add('btn-delete');
+    btnDelete.textContent = 'Delete';
+
+    tdActions.appendChild(btnEdit);
+    tdActions.appendChild(btnLock);
+    tdActions.appendChild(btnDelete);
+
+    tr.appendChild(tdId);
+    tr.appendChild(tdTitle);
+    tr.appendChild(tdDiff);
+    tr.appendChild(tdCount);
+    tr.appendChild(tdStatus);
+    tr.appendChild(tdActions);
+
+    return tr;
+}
+
+function updateLoadMoreButton(tableBody) {
+    const container = tableBody.closest('.table-container');
+    if (!container) return;
+
+    let btn = document.getElementById('examLoadMoreBtn');
+    if (!btn) {
+        btn = document.createElement('button');
+        btn.id = 'examLoadMoreBtn';
+        btn.type = 'button';
+        btn.textContent = 'Xem thêm';
+        btn.addEventListener('click', () => fetchAndRenderExams({ append: true }));
+        container.after(btn);
     }
+    btn.style.display = examsNextPage ? '' : 'none';
 }
 
 /* ============================================================
-   FILTER EXAMS
+   FILTER EXAMS (lọc phía server)
    ============================================================ */
 function setupFilterListeners() {
     const levelFilter = document.getElementById('levelFilter');
-    const tableBody = document.getElementById('examTableBody');
-    if (!levelFilter || !tableBody) return;
-
-    levelFilter.addEventListener('change', event => {
-        const selected = event.target.value; // "" | "easy" | "medium" | "hard"
-        const rows = tableBody.querySelectorAll('tr');
-
-        rows.forEach(row => {
-            const rowDiff = row.dataset.difficulty; // set trong fetchAndRenderExams
-            if (!selected || !rowDiff) {
-                row.style.display = '';
-            } else {
-                row.style.display = rowDiff === selected ? '' : 'none';
-            }
-        });
-    });
+    if (!levelFilter) return;
+
+    levelFilter.addEventListener('change', () => fetchAndRenderExams());
 }
 
 /* ============================================================
@@ -774,6 +798,10 @@ function renderEditTestcases(testcases) {
         const outputVal = tc.expected_output ?? tc.output ?? '';
         const isHidden = tc.is_hidden ?? true;
 
+        // Giữ nguyên các tuỳ chọn so output không có trên form khi lưu lại
+        item.dataset.ignoreTrailingWhitespace = tc.ignore_trailing_whitespace ?? true;
+        item.dataset.floatTolerance = tc.float_tolerance ?? 1e-6;
+
         item.innerHTML = `
             <label>Test Case ${index + 1}</label>
             <textarea class="edit-tc-input" rows="2">${inputVal}</textarea>
@@ -784,6 +812,8 @@ function renderEditTestcases(testcases) {
                 Hidden
             </label>
 
+            ${compareModeSelect(tc.compare_mode)}
+
             <button type="button" class="btn-delete-tc">X</button>
             <hr>
         `;
@@ -797,6 +827,20 @@ function renderEditTestcases(testcases) {
     });
 }
 
+const COMPARE_MODES = [
+    { value: 'exact', label: 'Exact' },
+    { value: 'whitespace', label: 'Ignore whitespace' },
+    { value: 'float', label: 'Float tolerance' }
+];
+
+function compareModeSelect(selected = 'exact') {
+    const options = COMPARE_MODES.map(mode =>
+        `<option value="${mode.value}" ${mode.value === selected ? 'selected' : ''}>${mode.label}</option>`
+    ).join('');
+
+    return `<label>So output <select class="edit-tc-compare">${options}</select></label>`;
+}
+
 function addEmptyEditTestcaseRow() {
     const list = document.getElementById('editTestcaseList');
     if (!list) return;
@@ -814,6 +858,8 @@ function addEmptyEditTestcaseRow() {
             Hidden
         </label>
 
+        ${compareModeSelect()}
+
         <button type="button" class="btn-delete-tc">X</button>
         <hr>
     `;
@@ -836,12 +882,16 @@ function collectEditTestcases() {
         const input = item.querySelector('.edit-tc-input').value.trim();
         const output = item.querySelector('.edit-tc-output').value.trim();
         const isHidden = item.querySelector('.edit-tc-hidden').checked;
+        const compareMode = item.querySelector('.edit-tc-compare').value;
 
         result.push({
             // backend expect keys này
             input_data: input,
             expected_output: output,
-            is_hidden: isHidden
+            is_hidden: isHidden,
+            compare_mode: compareMode,
+            ignore_trailing_whitespace: item.dataset.ignoreTrailingWhitespace !== 'false',
+            float_tolerance: Number(item.dataset.floatTolerance ?? 1e-6)
         });
     });
 
@@ -918,7 +968,10 @@ async function openEditModal(problemId) {
     modal.style.display = "block";
 
     try {
-        const problem = await apiFetch(`/api/problems/${problemId}/`);
+        const [problem, testcases] = await Promise.all([
+            apiFetch(`/api/problems/${problemId}/`),
+            fetchProblemTestcases(problemId)
+        ]);
 
         document.getElementById("editProblemTitle").value = problem.title;
         document.getElementById("editProblemDescription").value = problem.description;
@@ -926,7 +979,7 @@ async function openEditModal(problemId) {
         document.getElementById("editProblemTimeLimit").value = problem.time_limit;
         document.getElementById("editProblemMemoryLimit").value = problem.memory_limit;
 
-        renderEditTestcases(problem.test_cases);
+        renderEditTestcases(testcases);
 
     } catch (err) {
         console.error("Lỗi khi load chi tiết bộ đề:", err);
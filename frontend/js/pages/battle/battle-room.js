@@ -10,6 +10,7 @@ let LANGUAGES = [];
 let matchTimerInterval = null;
 let startTime = null;
 let matchFinished = false;
+const finishedSubmissions = new Set();
 
 
 /*-------------------------------------------
@@ -121,12 +122,15 @@ function renderMatchInfo(data) {
 /*-------------------------------------------
     UI RENDER – PROBLEM DETAILS
 -------------------------------------------*/
-function renderProblemDetails(problem) {
+async function renderProblemDetails(problem) {
     document.getElementById("problem-title").textContent = problem.title;
-    document.getElementById("problem-description").innerHTML = `<p>${problem.description}</p>`;
     document.getElementById("problem-difficulty").textContent = `Difficulty: ${problem.difficulty}`;
     document.getElementById("problem-time-limit").textContent = `⏱ Time: ${problem.timeLimit}s`;
     document.getElementById("problem-memory-limit").textContent = `💾 Memory: ${problem.memoryLimit}MB`;
+
+    // Đề bài đã render sẵn; trình duyệt tự gửi If-None-Match, đề không đổi thì nhận 304
+    const statement = await apiFetch(`/api/problems/${problem.id}/statement/`);
+    document.getElementById("problem-description").innerHTML = statement.html;
 }
 
 
@@ -161,10 +165,22 @@ function submitSolution() {
 -------------------------------------------*/
 function handleBattleSocketMessage(data) {
     switch (data.type) {
+        case "submission_progress":
+            renderSubmissionProgress(data.payload);
+            break;
+
         case "submission_update":
             renderSubmissionResult(data.payload);
             break;
 
+        case "submission.queued":
+            renderSubmissionQueued(data.payload);
+            break;
+
+        case "submission.throttled":
+            renderSubmissionThrottled(data.payload);
+            break;
+
         case "opponent_submitted":
             handleOpponentSubmitted(data.payload);
             break;
@@ -176,11 +192,89 @@ function handleBattleSocketMessage(data) {
 }
 
 
+/*-------------------------------------------
+    RENDER SUBMISSION PROGRESS (từng testcase)
+-------------------------------------------*/
+function testcaseLabel(status) {
+    return status === "ACCEPTED" ? "PASS" : status === "SKIPPED" ? "SKIP" : "FAIL";
+}
+
+function renderSubmissionProgress(progress) {
+    if (progress.username !== currentUser.username) return;
+    if (finishedSubmissions.has(progress.submission_id)) return;
+
+    const container = document.getElementById("submission-result-container");
+    let list = container.querySelector(`.testcase-list[data-submission="${progress.submission_id}"]`);
+
+    if (!list) {
+        container.innerHTML = `
+            <div class="judging-progress"></div>
+            <h4>Testcases:</h4>
+            <ul class="testcase-list" data-submission="${progress.submission_id}"></ul>
+        `;
+        list = container.querySelector(".testcase-list");
+    }
+
+    const counter = container.querySelector(".judging-progress");
+    const completed = Math.max(Number(counter.dataset.completed || 0), progress.completed);
+    counter.dataset.completed = completed;
+    counter.textContent = `Judging... ${completed}/${progress.total}`;
+
+    progress.results.forEach((tc) => {
+        const label = testcaseLabel(tc.status);
+        const li = document.createElement("li");
+        li.dataset.number = tc.number;
+        li.textContent = `Testcase ${tc.number}: ${label} (${Math.round(tc.exec_time * 1000)} ms)`;
+        li.className = label.toLowerCase();
+
+        list.querySelector(`li[data-number="${tc.number}"]`)?.remove();
+        const next = [...list.children].find((item) => Number(item.dataset.number) > tc.number);
+        list.insertBefore(li, next || null);
+    });
+}
+
+
+/*-------------------------------------------
+    BACKPRESSURE (queued / throttled)
+-------------------------------------------*/
+function renderSubmissionQueued(payload) {
+    if (finishedSubmissions.has(payload.submission_id)) return;
+
+    const container = document.getElementById("submission-result-container");
+    container.innerHTML = `<div class="judging-progress">Queued, position ${payload.position}...</div>`;
+}
+
+function renderSubmissionThrottled(payload) {
+    const container = document.getElementById("submission-result-container");
+    const btn = document.getElementById("submit-btn");
+
+    container.innerHTML = `<div class="judging-throttled"></div>`;
+    const notice = container.querySelector(".judging-throttled");
+
+    // Nút submit mở lại khi hết retry_after
+    let remaining = Math.ceil(payload.retry_after);
+    const tick = () => {
+        if (remaining <= 0) {
+            notice.textContent = payload.message;
+            btn.disabled = false;
+            btn.textContent = "Submit Solution";
+            return;
+        }
+        notice.textContent = `${payload.message} Thử lại sau ${remaining}s.`;
+        btn.textContent = `Retry in ${remaining}s`;
+        remaining -= 1;
+        setTimeout(tick, 1000);
+    };
+    tick();
+}
+
+
 /*-------------------------------------------
     RENDER SUBMISSION RESULT
 -------------------------------------------*/
 function renderSubmissionResult(result) {
     if (result.username !== currentUser.username) return;
+    finishedSubmissions.add(result.id);
 
     const container = document.getElementById("submission-result-container");
     const btn = document.getElementById("submit-btn");
@@ -190,14 +284,24 @@ function renderSubmissionResult(result) {
         <div>⏱ ${result.execution_time ?? 0}ms | 💾 ${result.memory_used ?? 0}KB</div>
     `;
 
-    if (result.detailed_results?.length) {
+    if (result.status === "CANCELLED") {
+        container.innerHTML += `<div class="judging-cancelled">Trận đã có kết quả, bài nộp này không được chấm tiếp.</div>`;
+    }
+
+    if (result.compilation_error) {
+        container.innerHTML += `<pre class="compile-error"></pre>`;
+        container.querySelector(".compile-error").textContent = result.compilation_error;
+    }
+
+    if (result.results?.length) {
         container.innerHTML += `<h4>Testcases:</h4><ul class="testcase-list"></ul>`;
         const list = container.querySelector(".testcase-list");
 
-        result.detailed_results.forEach((tc, i) => {
+        result.results.forEach((tc, i) => {
             const li = document.createElement("li");
-            li.textContent = `Testcase ${i + 1}: ${tc.status === "ACCEPTED" ? "PASS" : "FAIL"}`;
-            li.className = tc.status === "ACCEPTED" ? "pass" : "fail";
+            const label = testcaseLabel(tc.status);
+            li.textContent = `Testcase ${i + 1}: ${label}`;
+            li.className = label.toLowerCase();
             list.appendChild(li);
         });
     }
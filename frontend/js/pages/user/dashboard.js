@@ -8,6 +8,10 @@ let spaRouter = null;
 let challengeIntervalId = null;
 let socket = null;
 
+// Người chơi online (id -> player): nhận đầy đủ qua "player_list", sau đó cập nhật bằng "player_deltas"
+const onlinePlayers = new Map();
+let playerSearchTerm = "";
+
 function debounce(func, delay) {
     let timeout;
     return (...args) => {
@@ -110,6 +114,9 @@ export async function initDashboardPage(router) {
         hideChallengeToast();
         document.removeEventListener("reload_dashboard", reloadHandler);
 
+        onlinePlayers.clear();
+        playerSearchTerm = "";
+
         try {
             document.getElementById("logoutBtn").onclick = null;
             document.getElementById("searchInput").oninput = null;
@@ -173,9 +180,9 @@ function setupEventListeners(profile, router) {
 
     document.getElementById("searchInput").addEventListener(
         "input",
-        debounce(async (e) => {
-            const players = await apiFetch(`/api/online-players/?search=${e.target.value}`);
-            renderOnlinePlayers(players, profile);
+        debounce((e) => {
+            playerSearchTerm = e.target.value.trim().toLowerCase();
+            renderOnlinePlayers(profile);
         }, 300)
     );
 
@@ -212,11 +219,13 @@ function setupEventListeners(profile, router) {
 function handleWebSocketMessage(data, socket, profile) {
     switch (data.type) {
         case "player_list":
-            renderOnlinePlayers(data.payload.players, profile);
+            setOnlinePlayers(data.payload.players);
+            renderOnlinePlayers(profile);
             break;
 
-        case "user_update":
-            refreshOnlinePlayers();
+        case "player_deltas":
+            data.payload.deltas.forEach(applyPlayerDelta);
+            renderOnlinePlayers(profile);
             break;
 
         case "receive_challenge":
@@ -254,11 +263,25 @@ function handleWebSocketMessage(data, socket, profile) {
 function refreshOnlinePlayers() {
     apiFetch("/api/profile/").then(profile => {
         apiFetch("/api/online-players/").then(players => {
-            renderOnlinePlayers(players, profile);
+            setOnlinePlayers(players);
+            renderOnlinePlayers(profile);
         });
     });
 }
 
+function setOnlinePlayers(players) {
+    onlinePlayers.clear();
+    players.forEach(player => onlinePlayers.set(player.id, player));
+}
+
+function applyPlayerDelta({ op, player }) {
+    if (op === "leave" || !player.is_online) {
+        onlinePlayers.delete(player.id);
+    } else {
+        onlinePlayers.set(player.id, player);
+    }
+}
+
 async function fetchStatsAndUpdate() {
     try {
         const stats = await apiFetch("/api/stats/");
@@ -286,7 +309,7 @@ function updateStats(stats) {
     document.getElementById("rankStat").textContent = `#${stats.global_rank || "N/A"}`;
 }
 
-function renderOnlinePlayers(players, profile) {
+function renderOnlinePlayers(profile) {
     const playerList = document.getElementById("playerList");
     const onlineCount = document.getElementById("onlineCount");
     if (!playerList || !onlineCount) return;
@@ -294,9 +317,11 @@ function renderOnlinePlayers(players, profile) {
     const myLang = profile.preferred_language;
     const myDiff = profile.preferred_difficulty;
 
-    const filtered = players.filter(p =>
+    const filtered = [...onlinePlayers.values()].filter(p =>
+        p.id !== profile.id &&
         p.preferred_language === myLang &&
-        p.preferred_difficulty === myDiff
+        p.preferred_difficulty === myDiff &&
+        p.username.toLowerCase().includes(playerSearchTerm)
     );
 
     onlineCount.textContent = filtered.length;
@@ -4,8 +4,40 @@ import { getAccessToken } from './storage.js';
 /* ============================================================
    PROBLEM CRUD
    ============================================================ */
-export function fetchProblems() {
-    return apiFetch('/api/problems/');
+/**
+ * Một trang danh sách bài (tóm tắt, không description / testcases).
+ * @param {object} filters - { difficulty: '1,2', is_active: true, page_size: 50 }
+ * @returns {Promise<{next: string|null, previous: string|null, results: Array}>}
+ */
+export function fetchProblems(filters = {}) {
+    const query = new URLSearchParams();
+    Object.entries(filters).forEach(([key, value]) => {
+        if (value !== undefined && value !== null && value !== '') query.set(key, value);
+    });
+    const qs = query.toString();
+    return apiFetch(`/api/problems/${qs ? `?${qs}` : ''}`);
+}
+
+/**
+ * Trang kế tiếp theo link `next` (URL tuyệt đối) mà API trả về.
+ */
+export function fetchPage(url) {
+    const { pathname, search } = new URL(url);
+    return apiFetch(`${pathname}${search}`);
+}
+
+/**
+ * Toàn bộ testcase của một bài (admin), đọc lần lượt từng trang.
+ */
+export async function fetchProblemTestcases(id) {
+    let page = await apiFetch(`/api/problems/${id}/testcases/`);
+    const testcases = [...page.results];
+
+    while (page.next) {
+        page = await fetchPage(page.next);
+        testcases.push(...page.results);
+    }
+    return testcases;
 }
 
 export function fetchProblem(id) {
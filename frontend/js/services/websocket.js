@@ -9,6 +9,9 @@ const WS_BASE =
         ? `ws://localhost:8000`
         : `ws://${window.location.hostname}:8000`);
 
+// Heartbeat giữ last_seen / trạng thái online (phải nhỏ hơn USER_ONLINE_TIMEOUT của backend)
+const HEARTBEAT_INTERVAL = 10000;
+
 function createWebSocket(url, onMessage) {
     let socket = null;
     let pingInterval = null;
@@ -21,7 +24,7 @@ function createWebSocket(url, onMessage) {
                 if (socket.readyState === WebSocket.OPEN) {
                     socket.send(JSON.stringify({ type: "ping" }));
                 }
-            }, 10000);
+            }, HEARTBEAT_INTERVAL);
         };
 
         socket.onmessage = (event) => {